@@ -0,0 +1,127 @@
+"""
+Prueba la cola de trabajos con varios procesos worker en la misma máquina.
+
+Encola un lote en una cola SQLite, lanza varios procesos que la consumen con el
+motor HTTP contra el stub local y mata uno de ellos a mitad del lote, mientras
+tiene cédulas en mano. Al final verifica la semántica de lease/ack: todas las
+cédulas quedan confirmadas una sola vez y las que tenía el worker caído se
+volvieron a entregar cuando venció su lease.
+
+Uso:
+    python benchmarks/bench_cola.py --procesos 4 --consultas 40
+    python benchmarks/bench_cola.py --procesos 3 --sin-matar
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_webjudicial import StubConfig, start_stub
+
+
+def worker_main(cola_path, url, visibilidad, workdir):
+    """Proceso worker: consume la cola hasta vaciarla, como `--worker --motor http`."""
+    import logging
+    from consulta_antecedentes.batch import iter_batch
+    from consulta_antecedentes.jsf_client import HttpSessionPool, consultar_antecedentes_http
+    from consulta_antecedentes.work_queue import QueueWorker, SQLiteQueue
+
+    logging.basicConfig(level=logging.WARNING)
+    os.chdir(workdir)
+    cola = SQLiteQueue(cola_path, visibilidad=visibilidad)
+    worker = QueueWorker(cola).start()
+    http_pool = HttpSessionPool(size=1)
+    try:
+        for cedulas in worker.rondas():
+            for result in iter_batch(
+                cedulas, lambda c: consultar_antecedentes_http(c, pool=http_pool, base_url=url, solve=lambda *a: "token-stub"),
+            ):
+                worker.ack(result)
+    finally:
+        worker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--consultas', type=int, default=40)
+    parser.add_argument('--visibilidad', type=float, default=3.0, help="Segundos de lease de cada cédula.")
+    parser.add_argument('--latencia', type=float, default=0.05, help="Latencia por respuesta del stub.")
+    parser.add_argument('--sin-matar', action='store_true', help="No matar ningún worker a mitad del lote.")
+    args = parser.parse_args()
+
+    server, url = start_stub(config=StubConfig(latencia=args.latencia))
+    workdir = tempfile.mkdtemp(prefix="bench_cola_")
+    cola_path = os.path.join(workdir, 'cola.sqlite3')
+
+    from consulta_antecedentes.work_queue import SQLiteQueue
+    cola = SQLiteQueue(cola_path, visibilidad=args.visibilidad)
+    # Sin cédulas terminadas en 0 (error fijo del stub)
+    cedulas = [str(1001298781 + i) for i in range(args.consultas * 2) if (1001298781 + i) % 10][:args.consultas]
+    cola.enqueue(cedulas)
+
+    ctx = multiprocessing.get_context('spawn')
+    procesos = [ctx.Process(target=worker_main, args=(cola_path, url, args.visibilidad, workdir))
+                for _ in range(args.procesos)]
+    inicio = time.monotonic()
+    for p in procesos:
+        p.start()
+    en_mano_al_morir = []
+    if not args.sin_matar:
+        # Cuando va un cuarto del lote se mata el primer worker, esperando a que tenga una cédula en mano
+        while cola.stats()['estados']['hecho'] < args.consultas // 4:
+            time.sleep(0.05)
+        conn = sqlite3.connect(cola_path)
+        consulta_en_mano = "SELECT cedula FROM trabajos WHERE estado = 'en_curso' AND worker LIKE ?"
+        patron = f"%-{procesos[0].pid}"
+        while procesos[0].is_alive() and not conn.execute(consulta_en_mano, (patron,)).fetchall():
+            time.sleep(0.005)
+        procesos[0].kill()
+        procesos[0].join()
+        # Con el proceso muerto, lo que figura en su poder es exactamente lo que debe reentregarse
+        en_mano_al_morir = [fila[0] for fila in conn.execute(consulta_en_mano, (patron,))]
+        conn.close()
+        print(f"Worker {procesos[0].pid} terminado a mitad del lote con {len(en_mano_al_morir)} cédula(s) en mano.")
+    for p in procesos:
+        p.join()
+    duracion = time.monotonic() - inicio
+    server.shutdown()
+
+    estado = cola.stats()
+    conn = sqlite3.connect(cola_path)
+    reentregas = conn.execute("SELECT COUNT(*) FROM trabajos WHERE entregas > 1").fetchone()[0]
+    no_reentregadas = [
+        cedula for cedula in en_mano_al_morir
+        if conn.execute("SELECT entregas FROM trabajos WHERE cedula = ? AND estado = 'hecho'", (cedula,)).fetchone()
+        in (None, (1,))
+    ]
+    por_worker = conn.execute("SELECT worker, COUNT(*) FROM trabajos WHERE estado = 'hecho' GROUP BY worker").fetchall()
+    conn.close()
+
+    print("\n" + "=" * 64)
+    print(f"Estados: {estado['estados']}")
+    for worker, hechas in por_worker:
+        print(f"  {worker:<30} {hechas} cédulas")
+    print(f"Cédulas entregadas más de una vez: {reentregas}")
+    print(f"Tiempo: {duracion:.1f} s ({len(cedulas) / duracion * 60:.0f} consultas/min)")
+    errores = []
+    if estado['estados']['hecho'] != len(cedulas):
+        errores.append(f"{estado['estados']['hecho']} cédulas confirmadas de {len(cedulas)}")
+    if no_reentregadas:
+        errores.append(f"cédulas del worker caído sin reentregar: {', '.join(no_reentregadas)}")
+    if not args.sin_matar and not en_mano_al_morir:
+        print("El worker caído terminó sin cédulas en mano; no hubo reentregas que verificar.")
+    if errores:
+        print("FALLÓ: " + "; ".join(errores))
+        sys.exit(1)
+    print("Lease/ack correctos: cada cédula se confirmó una vez.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark de lotes completos contra el stub local de WebJudicial.
+
+Ejecuta un lote de cédulas con el motor elegido contra el stub, con la latencia
+y los fallos que se indiquen (ver `stub_webjudicial.StubConfig`) y el proveedor
+de CAPTCHA falso, y reporta consultas por minuto, latencia p50/p95 por
+consulta y RSS máximo del proceso con sus navegadores. No toca el sitio real
+ni consume créditos.
+
+Con `--json` los números quedan en un archivo y con `--min-por-minuto` o
+`--max-p95` el proceso termina con código 1 si no se cumplen, para usarlo en CI.
+
+Uso:
+    python benchmarks/bench_consultas.py --motor http --consultas 50 --workers 4
+    python benchmarks/bench_consultas.py --motor selenium --workers 2 --latencia 0.3 --tasa-boton 0.1
+    python benchmarks/bench_consultas.py --motor http --tasa-error 0.2 --semilla 1 --json bench.json --max-p95 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_memoria_pestanas import Muestreador
+from stub_webjudicial import add_config_arguments, config_from_args, start_stub
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano, como el de LatencyStats."""
+    valores = sorted(valores)
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, max(0, round(p / 100 * len(valores)) - 1))]
+
+
+def lote_http(cedulas, workers, policy, url):
+    from consulta_antecedentes.batch import iter_batch
+    from consulta_antecedentes.config import get_captcha_router
+    from consulta_antecedentes.jsf_client import HttpSessionPool, consultar_antecedentes_http
+
+    http_pool = HttpSessionPool(size=workers)
+    solve = get_captcha_router().solve
+    return list(iter_batch(
+        cedulas, lambda c: consultar_antecedentes_http(c, pool=http_pool, policy=policy, base_url=url, solve=solve),
+        workers=workers,
+    ))
+
+
+def lote_selenium(cedulas, workers, policy, url):
+    from consulta_antecedentes.batch import iter_batch
+    from consulta_antecedentes.browser import create_driver_pool
+    from consulta_antecedentes.flow import lookup
+
+    with create_driver_pool(size=workers, headless=True) as pool:
+        return list(iter_batch(
+            cedulas, lambda c: lookup(c, headless=True, pool=pool, policy=policy), workers=workers,
+        ))
+
+
+def lote_cdp(cedulas, workers, policy, url):
+    from consulta_antecedentes.cdp_engine import AsyncEngine
+
+    async def run():
+        async with AsyncEngine(tabs=workers, url=url, policy=policy) as engine:
+            return [result async for result in engine.run(cedulas)]
+
+    return asyncio.run(run())
+
+
+MOTORES = {'http': lote_http, 'selenium': lote_selenium, 'cdp': lote_cdp}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--motor', choices=sorted(MOTORES), default='http',
+                        help="http no requiere Chrome; selenium y cdp lanzan Chrome headless.")
+    parser.add_argument('--consultas', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--captcha-delay', type=float, default=0.0, help="Segundos que tarda el proveedor falso.")
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--escala-esperas', type=float, default=0.01,
+                        help="Factor sobre las esperas del backoff entre reintentos (1 = las reales).")
+    parser.add_argument('--json', help="Archivo donde guardar los resultados.")
+    parser.add_argument('--min-por-minuto', type=float, help="Falla si el lote hace menos consultas por minuto.")
+    parser.add_argument('--max-p95', type=float, help="Falla si el p95 de latencia por consulta supera estos segundos.")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    server, url = start_stub(config=config_from_args(args))
+    os.environ['URL_WEBJUDICIAL'] = url
+    os.environ['CAPTCHA_PROVIDERS'] = 'fake'
+    os.environ['FAKE_CAPTCHA_DELAY'] = str(args.captcha_delay)
+    workdir = tempfile.mkdtemp(prefix="bench_consultas_")
+    os.environ['SITEKEY_CACHE_FILE'] = os.path.join(workdir, 'sitekey_cache.json')
+    os.chdir(workdir)
+
+    from consulta_antecedentes.retry_policy import ESPERAS_BASE, RetryPolicy
+    policy = RetryPolicy(
+        max_retries=args.max_retries, esperas={k: v * args.escala_esperas for k, v in ESPERAS_BASE.items()},
+    )
+
+    # Sin cédulas terminadas en 0 (error fijo del stub): los errores del sitio sólo vienen de --tasa-error
+    cedulas = [str(1001298781 + i) for i in range(args.consultas * 2) if (1001298781 + i) % 10][:args.consultas]
+    with Muestreador() as muestreo:
+        inicio = time.monotonic()
+        resultados = MOTORES[args.motor](cedulas, max(1, args.workers), policy, url)
+        duracion = time.monotonic() - inicio
+    server.shutdown()
+
+    latencias = [r.duracion for r in resultados]
+    exitosas = sum(1 for r in resultados if r.exitoso)
+    reporte = {
+        'motor': args.motor,
+        'workers': args.workers,
+        'consultas': len(resultados),
+        'exitosas': exitosas,
+        'duracion_s': round(duracion, 2),
+        'por_minuto': round(len(resultados) / duracion * 60, 1) if duracion else 0.0,
+        'p50_s': round(percentil(latencias, 50), 3),
+        'p95_s': round(percentil(latencias, 95), 3),
+        'rss_max_mb': round(muestreo.maximo, 1),
+        'fallos_inyectados': server.state.inyectados,
+        'solicitudes_stub': server.state.requests,
+    }
+
+    print("\n" + "=" * 72)
+    print(f"{'Motor':<9} {'Workers':>7} {'Exitosas':>9} {'Consultas/min':>14} {'p50 (s)':>8} {'p95 (s)':>8} {'RSS máx (MB)':>13}")
+    print(f"{reporte['motor']:<9} {reporte['workers']:>7} {exitosas:>5}/{len(resultados):<3} {reporte['por_minuto']:>14.1f} "
+          f"{reporte['p50_s']:>8.2f} {reporte['p95_s']:>8.2f} {reporte['rss_max_mb']:>13.0f}")
+    print(f"Fallos inyectados por el stub: {reporte['fallos_inyectados']} en {reporte['solicitudes_stub']} solicitudes")
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+
+    fallas = []
+    if args.min_por_minuto is not None and reporte['por_minuto'] < args.min_por_minuto:
+        fallas.append(f"{reporte['por_minuto']} consultas/min < {args.min_por_minuto}")
+    if args.max_p95 is not None and reporte['p95_s'] > args.max_p95:
+        fallas.append(f"p95 {reporte['p95_s']} s > {args.max_p95} s")
+    if fallas:
+        print("Umbrales no cumplidos: " + "; ".join(fallas))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
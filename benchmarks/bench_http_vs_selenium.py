@@ -0,0 +1,117 @@
+"""
+Compara el motor HTTP/JSF con el motor Selenium contra el stub local de WebJudicial.
+
+Ejecuta las mismas cédulas con ambos motores, verifica que entreguen los mismos
+resultados y reporta latencia por consulta y memoria usada. Las páginas del stub
+son sintéticas: que el cliente HTTP entienda las respuestas del sitio lo prueba
+tests/test_jsf_client.py con las fixtures de tests/fixtures. No consume créditos
+de 2Captcha: el token lo entrega un solver falso que el stub acepta.
+
+Uso:
+    python benchmarks/bench_http_vs_selenium.py --consultas 10
+    python benchmarks/bench_http_vs_selenium.py --solo-http
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_webjudicial import start_stub
+
+
+def fake_solver(sitekey, url):
+    return "token-stub"
+
+
+def rss_mb(pid=None):
+    """RSS en MB de un proceso y sus hijos (Chrome y chromedriver incluidos)."""
+    try:
+        import psutil
+    except ImportError:
+        import resource
+        # Sin psutil sólo se conoce el pico del propio proceso (en KB en Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    proc = psutil.Process(pid or os.getpid())
+    procs = [proc] + proc.children(recursive=True)
+    total = 0
+    for p in procs:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def run_engine(nombre, consultar, cedulas):
+    from consulta_antecedentes.result_detector import result_stats
+
+    result_stats.reset()
+    tiempos = []
+    resultados = {}
+    memoria_max = rss_mb()
+    for cedula in cedulas:
+        inicio = time.monotonic()
+        resultados[cedula] = consultar(cedula)
+        tiempos.append(time.monotonic() - inicio)
+        memoria_max = max(memoria_max, rss_mb())
+    return {
+        'nombre': nombre,
+        'resultados': resultados,
+        'veredictos': result_stats.counts(),
+        'p50': statistics.median(tiempos),
+        'max': max(tiempos),
+        'memoria_mb': memoria_max,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--consultas', type=int, default=5)
+    parser.add_argument('--solo-http', action='store_true', help="No ejecutar el motor Selenium (no requiere Chrome).")
+    args = parser.parse_args()
+
+    server, url = start_stub()
+    os.environ['URL_WEBJUDICIAL'] = url
+    os.environ['CAPTCHA_PROVIDERS'] = 'fake'
+    workdir = tempfile.mkdtemp(prefix="bench_webjudicial_")
+    os.environ['SITEKEY_CACHE_FILE'] = os.path.join(workdir, 'sitekey_cache.json')
+    os.chdir(workdir)
+
+    # Mezcla de cédulas con y sin antecedentes y con error del sitio (ver reglas del stub)
+    cedulas = [str(1001298780 + i) for i in range(args.consultas)]
+
+    from consulta_antecedentes.jsf_client import HttpSessionPool, consultar_antecedentes_http
+    http_pool = HttpSessionPool(size=1)
+    reportes = [run_engine(
+        'http', lambda c: consultar_antecedentes_http(c, pool=http_pool, base_url=url, solve=fake_solver), cedulas,
+    )]
+
+    if not args.solo_http:
+        from consulta_antecedentes import create_driver_pool, consultar_antecedentes, TokenPrefetcher
+        prefetcher = TokenPrefetcher(fake_solver, size=1)
+        with create_driver_pool(size=1, headless=True) as pool:
+            reportes.append(run_engine(
+                'selenium', lambda c: consultar_antecedentes(c, pool=pool, prefetcher=prefetcher, headless=True),
+                cedulas,
+            ))
+        prefetcher.stop()
+
+    server.shutdown()
+    print("\n" + "=" * 64)
+    print(f"{'Motor':<10} {'p50 (s)':>9} {'máx (s)':>9} {'RSS máx (MB)':>14}  Veredictos")
+    for r in reportes:
+        print(f"{r['nombre']:<10} {r['p50']:>9.2f} {r['max']:>9.2f} {r['memoria_mb']:>14.1f}  {r['veredictos']}")
+    if len(reportes) == 2:
+        iguales = reportes[0]['resultados'] == reportes[1]['resultados'] and reportes[0]['veredictos'] == reportes[1]['veredictos']
+        print(f"Resultados equivalentes entre motores: {'sí' if iguales else 'NO'}")
+        if not iguales:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
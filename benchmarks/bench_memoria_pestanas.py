@@ -0,0 +1,122 @@
+"""
+Compara la memoria por consulta en vuelo: pestañas en un solo Chrome frente a un Chrome por consulta.
+
+Ejecuta el mismo lote contra el stub local de WebJudicial con:
+
+- `pestanas`: el motor CDP, con N contextos aislados dentro de un único Chrome.
+- `drivers`: el pool de Selenium, con N navegadores (un Chrome por consulta en vuelo).
+
+Durante cada lote se muestrea el RSS del proceso y de todos sus hijos (Chrome,
+chromedriver y renderers) y se reporta el máximo dividido por las consultas en
+vuelo. En el modo `pestanas` se divide por el máximo de consultas que el motor
+tuvo realmente en vuelo (`AsyncEngine.en_vuelo_max`), no por el configurado: si
+la entrada no alcanza a alimentar todas las pestañas, la cifra lo refleja. El
+CAPTCHA lo resuelve el proveedor falso que el stub acepta.
+
+Uso:
+    python benchmarks/bench_memoria_pestanas.py --en-vuelo 4 --consultas 12
+    python benchmarks/bench_memoria_pestanas.py --solo-pestanas
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_webjudicial import start_stub
+
+
+class Muestreador:
+    """Toma el RSS máximo del árbol de procesos en un hilo de fondo."""
+
+    def __init__(self, intervalo=0.5):
+        from consulta_antecedentes.metrics import process_tree_rss_mb
+        self.medir = process_tree_rss_mb
+        self.intervalo = intervalo
+        self.maximo = 0.0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._run, name="muestreo-rss", daemon=True)
+
+    def _run(self):
+        while not self._parar.is_set():
+            self.maximo = max(self.maximo, self.medir() or 0.0)
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self.base = self.medir() or 0.0
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+
+
+def lote_pestanas(cedulas, en_vuelo):
+    from consulta_antecedentes.cdp_engine import AsyncEngine
+
+    async def run():
+        exitosas = 0
+        async with AsyncEngine(tabs=en_vuelo, en_vuelo=en_vuelo) as engine:
+            async for result in engine.run(cedulas):
+                exitosas += bool(result)
+        return exitosas, engine.en_vuelo_max
+
+    return asyncio.run(run())
+
+
+def lote_drivers(cedulas, en_vuelo):
+    from consulta_antecedentes.batch import iter_batch
+    from consulta_antecedentes.browser import create_driver_pool
+    from consulta_antecedentes.flow import consultar_antecedentes
+
+    with create_driver_pool(size=en_vuelo, headless=True) as pool:
+        exitosas = sum(r.exitoso for r in iter_batch(
+            cedulas, lambda c: consultar_antecedentes(c, pool=pool, headless=True), workers=en_vuelo,
+        ))
+    return exitosas, en_vuelo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--en-vuelo', type=int, default=4)
+    parser.add_argument('--consultas', type=int, default=12)
+    parser.add_argument('--solo-pestanas', action='store_true', help="No ejecutar el modo de un Chrome por consulta.")
+    args = parser.parse_args()
+
+    server, url = start_stub()
+    os.environ['URL_WEBJUDICIAL'] = url
+    os.environ['CAPTCHA_PROVIDERS'] = 'fake'
+    workdir = tempfile.mkdtemp(prefix="bench_memoria_")
+    os.environ['SITEKEY_CACHE_FILE'] = os.path.join(workdir, 'sitekey_cache.json')
+    os.chdir(workdir)
+
+    # Sin cédulas terminadas en 0 (error del sitio en el stub) para comparar lotes completos
+    cedulas = [str(1001298781 + i) for i in range(args.consultas * 2) if (1001298781 + i) % 10][:args.consultas]
+    modos = [('pestanas', lote_pestanas)]
+    if not args.solo_pestanas:
+        modos.append(('drivers', lote_drivers))
+
+    filas = []
+    for nombre, lote in modos:
+        with Muestreador() as muestreo:
+            inicio = time.monotonic()
+            exitosas, en_vuelo = lote(cedulas, args.en_vuelo)
+            duracion = time.monotonic() - inicio
+        extra = muestreo.maximo - muestreo.base
+        filas.append((nombre, en_vuelo, exitosas, duracion, muestreo.maximo, extra / max(1, en_vuelo)))
+
+    server.shutdown()
+    print("\n" + "=" * 72)
+    print(f"{'Modo':<10} {'En vuelo':>9} {'Exitosas':>9} {'Tiempo (s)':>11} {'RSS máx (MB)':>13} {'MB/consulta':>12}")
+    for nombre, en_vuelo, exitosas, duracion, maximo, por_consulta in filas:
+        print(f"{nombre:<10} {en_vuelo:>9} {exitosas:>9} {duracion:>11.1f} {maximo:>13.0f} {por_consulta:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
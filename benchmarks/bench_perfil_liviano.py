@@ -0,0 +1,132 @@
+"""
+Mide el perfil liviano de Chrome: tiempo y bytes transferidos por consulta, antes y después.
+
+Ejecuta el mismo lote contra el stub local de WebJudicial, cuyas páginas
+enlazan una hoja de estilos, una imagen y una fuente como las del sitio real,
+en estos modos:
+
+- `normal`: Chrome como hasta ahora.
+- `liviano`: flags de `lean_profile` y bloqueo de imágenes, fuentes y
+  terceros con Network.setBlockedURLs.
+- `liviano-cache` (sólo selenium): un segundo pool liviano que hereda los
+  directorios de cache en disco que dejó el anterior.
+
+Los bytes y las solicitudes los cuenta el stub, así que no incluyen lo que se
+bloqueó ni lo que salió del cache del navegador. El CAPTCHA lo resuelve el
+proveedor falso.
+
+Uso:
+    python benchmarks/bench_perfil_liviano.py --motor cdp --consultas 20 --workers 2
+    python benchmarks/bench_perfil_liviano.py --motor selenium --latencia 0.1 --json liviano.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_consultas import percentil
+from stub_webjudicial import add_config_arguments, config_from_args, start_stub
+
+
+def lote_selenium(cedulas, workers, policy, url, liviano):
+    from consulta_antecedentes.batch import iter_batch
+    from consulta_antecedentes.browser import create_driver_pool
+    from consulta_antecedentes.flow import lookup
+
+    with create_driver_pool(size=workers, headless=True, liviano=liviano) as pool:
+        return list(iter_batch(
+            cedulas, lambda c: lookup(c, headless=True, pool=pool, policy=policy, guardar_pdf=False),
+            workers=workers,
+        ))
+
+
+def lote_cdp(cedulas, workers, policy, url, liviano):
+    from consulta_antecedentes.cdp_engine import AsyncEngine
+
+    async def run():
+        async with AsyncEngine(tabs=workers, url=url, policy=policy, guardar_pdf=False, liviano=liviano) as engine:
+            return [result async for result in engine.run(cedulas)]
+
+    return asyncio.run(run())
+
+
+MODOS = {
+    'selenium': (lote_selenium, [('normal', False), ('liviano', True), ('liviano-cache', True)]),
+    'cdp': (lote_cdp, [('normal', False), ('liviano', True)]),
+}
+
+
+def medir(lote, cedulas, workers, policy, url, liviano, state):
+    """Ejecuta un lote y devuelve lo que el stub sirvió por consulta."""
+    bytes_antes, recursos_antes, paginas_antes = state.bytes_enviados, state.recursos, state.requests
+    inicio = time.monotonic()
+    resultados = lote(cedulas, workers, policy, url, liviano)
+    duracion = time.monotonic() - inicio
+    n = max(1, len(resultados))
+    latencias = [r.duracion for r in resultados]
+    return {
+        'consultas': len(resultados),
+        'exitosas': sum(1 for r in resultados if r.exitoso),
+        'duracion_s': round(duracion, 2),
+        'p50_s': round(percentil(latencias, 50), 3),
+        'p95_s': round(percentil(latencias, 95), 3),
+        'kb_por_consulta': round((state.bytes_enviados - bytes_antes) / 1024 / n, 1),
+        'paginas_por_consulta': round((state.requests - paginas_antes) / n, 2),
+        'recursos_por_consulta': round((state.recursos - recursos_antes) / n, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--motor', choices=sorted(MODOS), default='cdp')
+    parser.add_argument('--consultas', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--json', help="Archivo donde guardar los resultados.")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    server, url = start_stub(config=config_from_args(args))
+    os.environ['URL_WEBJUDICIAL'] = url
+    os.environ['CAPTCHA_PROVIDERS'] = 'fake'
+    workdir = tempfile.mkdtemp(prefix="bench_liviano_")
+    os.environ['SITEKEY_CACHE_FILE'] = os.path.join(workdir, 'sitekey_cache.json')
+    os.environ['CHROME_CACHE_DIR'] = os.path.join(workdir, 'chrome_cache')
+    os.chdir(workdir)
+
+    from consulta_antecedentes.retry_policy import ESPERAS_BASE, RetryPolicy
+    policy = RetryPolicy(max_retries=2, esperas={k: v * 0.01 for k, v in ESPERAS_BASE.items()})
+
+    cedulas = [str(1001298781 + i) for i in range(args.consultas * 2) if (1001298781 + i) % 10][:args.consultas]
+    lote, modos = MODOS[args.motor]
+    reporte = {'motor': args.motor, 'workers': args.workers, 'modos': {}}
+    for modo, liviano in modos:
+        print(f"Modo {modo}...")
+        reporte['modos'][modo] = medir(lote, cedulas, max(1, args.workers), policy, url, liviano, server.state)
+    server.shutdown()
+
+    print("\n" + "=" * 86)
+    print(f"{'Modo':<15} {'Exitosas':>9} {'p50 (s)':>8} {'p95 (s)':>8} {'KB/consulta':>12} "
+          f"{'Páginas/consulta':>17} {'Recursos/consulta':>18}")
+    for modo, r in reporte['modos'].items():
+        print(f"{modo:<15} {r['exitosas']:>5}/{r['consultas']:<3} {r['p50_s']:>8.2f} {r['p95_s']:>8.2f} "
+              f"{r['kb_por_consulta']:>12.1f} {r['paginas_por_consulta']:>17.2f} {r['recursos_por_consulta']:>18.2f}")
+    normal = reporte['modos']['normal']
+    for modo, r in reporte['modos'].items():
+        if modo != 'normal' and normal['kb_por_consulta']:
+            ahorro = 1 - r['kb_por_consulta'] / normal['kb_por_consulta']
+            print(f"{modo}: {ahorro:.0%} menos bytes por consulta que normal, p50 {r['p50_s'] - normal['p50_s']:+.2f} s")
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Mide el tiempo de arranque del paquete frente al de las dependencias pesadas.
+
+Cada importación se ejecuta en un intérprete nuevo (sin caché de módulos en
+memoria) y se reporta la mediana de varias repeticiones. Sirve para comprobar
+que importar `consulta_antecedentes` y los comandos de la CLI que no abren un
+navegador no cargan selenium, undetected-chromedriver ni los clientes de los
+proveedores de CAPTCHA.
+
+Uso:
+    python benchmarks/bench_startup.py --repeticiones 7
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PESADOS = ('undetected_chromedriver', 'selenium', 'twocaptcha', 'python_anticaptcha', 'capsolver')
+
+CASOS = [
+    ("intérprete vacío", "pass"),
+    ("import consulta_antecedentes", "import consulta_antecedentes"),
+    ("import consulta_antecedentes.cli", "import consulta_antecedentes.cli"),
+    ("import consulta_antecedentes.flow", "import consulta_antecedentes.flow"),
+    ("import selenium.webdriver", "import selenium.webdriver"),
+    ("import undetected_chromedriver", "import undetected_chromedriver"),
+    ("import twocaptcha", "import twocaptcha"),
+]
+
+# Verifica que el paquete y su CLI no arrastren las dependencias pesadas
+_CHEQUEO = (
+    "import sys, consulta_antecedentes, consulta_antecedentes.cli, consulta_antecedentes.flow\n"
+    f"print(','.join(m for m in {PESADOS!r} if m in sys.modules))"
+)
+
+
+def medir(codigo, repeticiones, cwd=None, args=None):
+    """Mediana en ms de ejecutar `codigo` (o `args`) en un intérprete nuevo, o None si falla."""
+    comando = [sys.executable] + (args or ['-c', codigo])
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        proceso = subprocess.run(comando, cwd=cwd or ROOT, env=env, capture_output=True, text=True)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if proceso.returncode != 0:
+            return None
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    casos = list(CASOS)
+    comandos = [
+        ("CLI --validar", ['-m', 'consulta_antecedentes', '--validar', '1001298785,1001298786']),
+        ("CLI --reporte-indice", ['-m', 'consulta_antecedentes', '--reporte-indice']),
+    ]
+
+    print(f"{'Caso':<38} {'Mediana (ms)':>13}")
+    for nombre, codigo in casos:
+        ms = medir(codigo, args.repeticiones)
+        print(f"{nombre:<38} {('no instalado' if ms is None else f'{ms:.0f}'):>13}")
+    for nombre, argumentos in comandos:
+        ms = medir(None, args.repeticiones, cwd=workdir, args=argumentos)
+        print(f"{nombre:<38} {('falló' if ms is None else f'{ms:.0f}'):>13}")
+
+    proceso = subprocess.run([sys.executable, '-c', _CHEQUEO], cwd=ROOT, capture_output=True, text=True,
+                             env=dict(os.environ, PYTHONPATH=ROOT))
+    cargados = proceso.stdout.strip()
+    if proceso.returncode != 0:
+        print(f"\nNo se pudo importar el paquete: {proceso.stderr.strip().splitlines()[-1]}")
+        sys.exit(1)
+    if cargados:
+        print(f"\nEl paquete importó dependencias pesadas: {cargados}")
+        sys.exit(1)
+    print("\nEl paquete y la CLI no importan dependencias pesadas hasta que se abre un navegador.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Graba las respuestas del sitio real que usan las pruebas del cliente HTTP.
+
+Recorre el flujo con WebJudicialClient y guarda el cuerpo de cada respuesta en
+tests/fixtures: la página de términos y el <partial-response> con el formulario.
+Con --cedula también resuelve el reCAPTCHA (consume un crédito del proveedor)
+y guarda el <partial-response> con el resultado.
+
+Después de grabar hay que revisar las fixtures: tests/test_jsf_client.py
+compara los ViewState, el sitekey y el resultado con los valores grabados, y
+la respuesta del resultado trae el nombre de la persona consultada.
+
+Uso:
+    python benchmarks/grabar_respuestas_jsf.py
+    python benchmarks/grabar_respuestas_jsf.py --cedula 1234567890
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from consulta_antecedentes.config import get_captcha_router, url_webjudicial
+from consulta_antecedentes.jsf_client import HttpSessionPool, WebJudicialClient
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+NOMBRES = ['webjudicial_terminos.html', 'webjudicial_parcial_formulario.xml', 'webjudicial_parcial_resultado.xml']
+
+
+class SesionGrabadora:
+    """Envuelve una sesión de requests y guarda el cuerpo de cada respuesta en orden."""
+
+    def __init__(self, session, destino):
+        self.session = session
+        self.destino = destino
+        self.grabadas = 0
+
+    def _grabar(self, response):
+        ruta = os.path.join(self.destino, NOMBRES[self.grabadas])
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f"{response.request.method} {response.url} -> HTTP {response.status_code}, {ruta}")
+        self.grabadas += 1
+        return response
+
+    def get(self, url, **kwargs):
+        return self._grabar(self.session.get(url, **kwargs))
+
+    def post(self, url, **kwargs):
+        return self._grabar(self.session.post(url, **kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graba las respuestas de WebJudicial para las pruebas.")
+    parser.add_argument('--cedula', help="Cédula a consultar para grabar también la respuesta del resultado.")
+    parser.add_argument('--destino', default=FIXTURES, help="Carpeta de las fixtures.")
+    args = parser.parse_args()
+
+    pool = HttpSessionPool(size=1)
+    sesion = SesionGrabadora(pool.new_session(), args.destino)
+    try:
+        client = WebJudicialClient(url_webjudicial(), sesion, ajax=True)
+        page = client.accept_terms()
+        print(f"sitekey: {page.sitekey}, ViewState: {client.viewstate}")
+        if args.cedula:
+            token = get_captcha_router().solve(page.sitekey, page.url)
+            client.submit_cedula(page, args.cedula, token)
+            print(f"ViewState del resultado: {client.viewstate}")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Servidor local que imita el flujo JSF de WebJudicial.
+
+Sirve las mismas páginas que recorren los scripts (términos con
+`aceptaOption:0` y `continuarBtn`, formulario con `cedulaInput`, reCAPTCHA con
+`data-sitekey`, botón `j_idt17` y página de resultados), validando cookies de
+sesión y el `javax.faces.ViewState` como lo hace el sitio real. Los envíos
+AJAX de PrimeFaces (cabecera `Faces-Request: partial/ajax`) reciben la página
+dentro de un `<partial-response>`; los POST normales, la página completa. Las
+respuestas son sintéticas, no grabadas del sitio real. Permite probar
+el motor HTTP y el de Selenium sin tocar antecedentes.policia.gov.co ni pagar
+2Captcha.
+
+Reglas de las respuestas:
+    - Cédulas terminadas en 7: registran antecedentes.
+    - Cédulas terminadas en 0: el sitio responde "servicio no disponible".
+    - Token de reCAPTCHA vacío o igual a "rechazado": CAPTCHA no válido.
+    - Cualquier otra cédula: no registra antecedentes.
+
+Además, un StubConfig permite simular un sitio degradado: latencia por
+respuesta, duración del preloader y una probabilidad de error del sitio, de
+rechazo del CAPTCHA o de que `continuarBtn` no se habilite al aceptar los
+términos (este último sólo afecta a los motores con navegador).
+
+Cada página enlaza una hoja de estilos, una imagen y una fuente servidas con
+cache de un día; `state.recursos` y `state.bytes_enviados` permiten medir lo
+que transfiere un navegador por consulta (ver bench_perfil_liviano.py).
+
+Uso:
+    python benchmarks/stub_webjudicial.py --port 8765
+    python benchmarks/stub_webjudicial.py --latencia 0.5 --tasa-error 0.1 --tasa-boton 0.05
+"""
+import argparse
+import html
+import random
+import secrets
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+SITEKEY = "6LcStubSitekeyWebJudicialLocal000000000000"
+BASE_PATH = "/WebJudicial/"
+ACTION = "/WebJudicial/index.xhtml"
+RECURSOS_PATH = "/WebJudicial/javax.faces.resource/"
+
+# Recursos estáticos de cada página, con URLs como las de JSF y un tamaño
+# parecido al del sitio real: el perfil liviano bloquea la imagen y la fuente
+RECURSOS = {
+    'estilos.css.xhtml': ('text/css', (
+        "@font-face { font-family: 'Institucional'; src: url('fuente.woff2.xhtml?ln=fonts') format('woff2'); }\n"
+        "body { font-family: 'Institucional', sans-serif; }\n" + "/* reglas */\n" * 200
+    ).encode('utf-8')),
+    'escudo.png.xhtml': ('image/png', random.Random(1).randbytes(60 * 1024)),
+    'fuente.woff2.xhtml': ('font/woff2', random.Random(2).randbytes(40 * 1024)),
+}
+
+_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Antecedentes Judiciales</title>
+<link rel="stylesheet" href="/WebJudicial/javax.faces.resource/estilos.css.xhtml?ln=css" /></head>
+<body>
+<img src="/WebJudicial/javax.faces.resource/escudo.png.xhtml?ln=img" alt="Policía Nacional" width="120" />
+<div class="preloader" style="position:fixed;inset:0;background:#fff">Cargando...</div>
+<script>setTimeout(function () {{ document.querySelector('.preloader').style.display = 'none'; }}, {preloader_ms});</script>
+{body}
+</body></html>"""
+
+_TERMINOS = """<form id="aceptaForm" name="aceptaForm" method="post" action="{action}">
+<input type="hidden" name="aceptaForm" value="aceptaForm" />
+<p>Términos y condiciones de uso de la consulta de antecedentes judiciales.</p>
+<input type="radio" id="aceptaOption:0" name="aceptaOption" value="true"
+       onclick="{habilitar}" /><label for="aceptaOption:0">Acepto</label>
+<input type="radio" id="aceptaOption:1" name="aceptaOption" value="false" /><label for="aceptaOption:1">No acepto</label>
+<button type="submit" id="continuarBtn" name="continuarBtn" value="continuarBtn" disabled>Enviar</button>
+<input type="hidden" name="javax.faces.ViewState" id="j_id1:javax.faces.ViewState:0" value="{viewstate}" />
+</form>"""
+
+_FORMULARIO = """<form id="form" name="form" method="post" action="{action}">
+<input type="hidden" name="form" value="form" />
+<label for="cedulaInput">Cédula de ciudadanía</label>
+<input type="text" id="cedulaInput" name="cedulaInput" value="" />
+<div class="g-recaptcha" data-sitekey="{sitekey}"></div>
+<textarea id="g-recaptcha-response" name="g-recaptcha-response" style="display:none"></textarea>
+{mensaje}
+<button type="submit" id="j_idt17" name="j_idt17" value="j_idt17">Consultar</button>
+<input type="hidden" name="javax.faces.ViewState" id="j_id1:javax.faces.ViewState:0" value="{viewstate}" />
+</form>"""
+
+_RESULTADO = """<div id="form:mensajeCiudadano" class="resultado">
+<p>La Policía Nacional de Colombia informa que siendo las {hora} el ciudadano identificado con
+Cédula de Ciudadanía Nº {cedula} y nombres CIUDADANO DE PRUEBA</p>
+<p><b>{veredicto}</b></p>
+<p>Consecutivo No. {certificado}</p>
+</div>"""
+
+_HABILITAR = "document.getElementById('continuarBtn').disabled = false;"
+
+_ERROR = """<div class="ui-messages-error">Servicio no disponible, intente más tarde.</div>"""
+
+_PARCIAL = """<?xml version="1.0" encoding="UTF-8"?>
+<partial-response id="j_id1"><changes><update id="javax.faces.ViewRoot"><![CDATA[{page}]]></update></changes></partial-response>"""
+
+
+class StubConfig:
+    """
+    Escenario del stub: latencia y fallos inyectados.
+
+    Args:
+        latencia: Segundos de espera antes de cada respuesta
+        jitter: Variación aleatoria (±) de la latencia
+        preloader: Segundos que el preloader tapa la página
+        tasa_error: Probabilidad de responder "servicio no disponible" al consultar
+        tasa_captcha: Probabilidad de rechazar un token válido
+        tasa_boton: Probabilidad de que `continuarBtn` no se habilite al aceptar los términos
+        semilla: Semilla del generador aleatorio, para repetir el mismo escenario
+    """
+
+    def __init__(self, latencia=0.0, jitter=0.0, preloader=0.2, tasa_error=0.0, tasa_captcha=0.0, tasa_boton=0.0,
+                 semilla=None):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.preloader = preloader
+        self.tasa_error = tasa_error
+        self.tasa_captcha = tasa_captcha
+        self.tasa_boton = tasa_boton
+        self._random = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def sortear(self, tasa):
+        with self._lock:
+            return tasa > 0 and self._random.random() < tasa
+
+    def demora(self):
+        with self._lock:
+            return max(0.0, self.latencia + self._random.uniform(-self.jitter, self.jitter))
+
+
+class StubState:
+    """Sesiones JSF activas y contadores de solicitudes y de fallos inyectados del servidor."""
+
+    def __init__(self, config=None):
+        self.lock = threading.Lock()
+        self.config = config or StubConfig()
+        self.sessions = {}
+        self.requests = 0
+        # Recursos estáticos servidos y bytes enviados en total (páginas y recursos)
+        self.recursos = 0
+        self.bytes_enviados = 0
+        self.inyectados = {'error': 0, 'captcha': 0, 'boton': 0}
+
+    def inyectar(self, fallo, tasa):
+        """Sortea un fallo inyectado y lo cuenta si ocurre."""
+        if not self.config.sortear(tasa):
+            return False
+        with self.lock:
+            self.inyectados[fallo] += 1
+        return True
+
+    def new_session(self):
+        session_id = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[session_id] = {'viewstate': None, 'paso': 'terminos'}
+        return session_id
+
+    def next_viewstate(self, session_id):
+        viewstate = f"{secrets.randbelow(10 ** 18)}:{secrets.randbelow(10 ** 18)}"
+        with self.lock:
+            self.sessions[session_id]['viewstate'] = viewstate
+        return viewstate
+
+
+def veredicto(cedula):
+    if cedula.endswith('0'):
+        return None
+    if cedula.endswith('7'):
+        return "REGISTRA ANTECEDENTES. TIENE ASUNTOS PENDIENTES CON LAS AUTORIDADES JUDICIALES"
+    return "NO TIENE ASUNTOS PENDIENTES CON LAS AUTORIDADES JUDICIALES"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None
+    sitekey = SITEKEY
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        session_id = cookie['JSESSIONID'].value if 'JSESSIONID' in cookie else None
+        if session_id not in self.state.sessions:
+            return None
+        return session_id
+
+    def _send(self, body, session_id=None, status=200):
+        demora = self.state.config.demora()
+        if demora:
+            time.sleep(demora)
+        preloader_ms = int(self.state.config.preloader * 1000)
+        data = _PAGE.format(body=body, preloader_ms=preloader_ms)
+        tipo = 'text/html; charset=utf-8'
+        if self.headers.get('Faces-Request') == 'partial/ajax':
+            data = _PARCIAL.format(page=data)
+            tipo = 'text/xml; charset=utf-8'
+        data = data.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(data)))
+        if session_id:
+            self.send_header('Set-Cookie', f'JSESSIONID={session_id}; Path={BASE_PATH}; HttpOnly')
+        self.end_headers()
+        self.wfile.write(data)
+        with self.state.lock:
+            self.state.bytes_enviados += len(data)
+
+    def _recurso(self):
+        nombre = self.path[len(RECURSOS_PATH):].split('?', 1)[0]
+        if nombre not in RECURSOS:
+            self.send_error(404)
+            return
+        tipo, data = RECURSOS[nombre]
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'public, max-age=86400')
+        self.end_headers()
+        self.wfile.write(data)
+        with self.state.lock:
+            self.state.recursos += 1
+            self.state.bytes_enviados += len(data)
+
+    def do_GET(self):
+        if self.path.startswith(RECURSOS_PATH):
+            self._recurso()
+            return
+        with self.state.lock:
+            self.state.requests += 1
+        if not self.path.startswith(BASE_PATH):
+            self.send_error(404)
+            return
+        session_id = self.state.new_session()
+        self._send(self._terminos(session_id), session_id)
+
+    def _terminos(self, session_id):
+        # Con el botón "desactivado" aceptar los términos no habilita continuarBtn
+        habilitar = '' if self.state.inyectar('boton', self.state.config.tasa_boton) else _HABILITAR
+        return _TERMINOS.format(action=ACTION, habilitar=habilitar, viewstate=self.state.next_viewstate(session_id))
+
+    def do_POST(self):
+        with self.state.lock:
+            self.state.requests += 1
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8'), keep_blank_values=True).items()}
+        session_id = self._session()
+        if not session_id:
+            self._send("<p>Ha ocurrido un error: la sesión expiró.</p>", status=500)
+            return
+        sesion = self.state.sessions[session_id]
+        if form.get('javax.faces.ViewState') != sesion['viewstate']:
+            self._send("<p>Ha ocurrido un error: javax.faces.application.ViewExpiredException</p>", status=500)
+            return
+
+        if 'aceptaForm' in form and sesion['paso'] == 'terminos':
+            if form.get('aceptaOption') != 'true':
+                self._send(self._terminos(session_id))
+                return
+            sesion['paso'] = 'formulario'
+            body = _FORMULARIO.format(action=ACTION, sitekey=self.sitekey, mensaje='',
+                                      viewstate=self.state.next_viewstate(session_id))
+            self._send(body)
+        elif 'form' in form and sesion['paso'] == 'formulario':
+            token = form.get('g-recaptcha-response', '')
+            if not token or token == 'rechazado' or self.state.inyectar('captcha', self.state.config.tasa_captcha):
+                mensaje = '<div class="ui-messages-error">Captcha no válido.</div>'
+                body = _FORMULARIO.format(action=ACTION, sitekey=self.sitekey, mensaje=mensaje,
+                                          viewstate=self.state.next_viewstate(session_id))
+                self._send(body)
+                return
+            cedula = form.get('cedulaInput', '').strip()
+            texto = veredicto(cedula)
+            if texto is None or self.state.inyectar('error', self.state.config.tasa_error):
+                self._send(_ERROR, status=503)
+                return
+            sesion['paso'] = 'resultado'
+            certificado = f"{secrets.randbelow(10 ** 8):08d}"
+            self._send(_RESULTADO.format(hora="10:00:00", cedula=html.escape(cedula), veredicto=texto,
+                                         certificado=certificado))
+        else:
+            self._send("<p>Ha ocurrido un error: solicitud fuera de secuencia.</p>", status=500)
+
+
+def start_stub(port=0, config=None):
+    """
+    Arranca el servidor en un hilo de fondo.
+
+    Args:
+        port: Puerto (0 = uno libre)
+        config: StubConfig con la latencia y los fallos a inyectar
+
+    Returns:
+        tuple: (servidor, URL de la página inicial). `servidor.state` lleva los contadores.
+    """
+    state = StubState(config)
+    handler = type('Handler', (StubHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="stub-webjudicial", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}{BASE_PATH}"
+
+
+def add_config_arguments(parser):
+    """Agrega al parser las opciones del StubConfig (las usan también los benchmarks)."""
+    grupo = parser.add_argument_group("escenario del stub")
+    grupo.add_argument('--latencia', type=float, default=0.0, help="Segundos de espera antes de cada respuesta.")
+    grupo.add_argument('--jitter', type=float, default=0.0, help="Variación aleatoria (±) de la latencia.")
+    grupo.add_argument('--preloader', type=float, default=0.2, help="Segundos que el preloader tapa la página.")
+    grupo.add_argument('--tasa-error', type=float, default=0.0, help="Probabilidad de error del sitio al consultar.")
+    grupo.add_argument('--tasa-captcha', type=float, default=0.0, help="Probabilidad de rechazar el token del reCAPTCHA.")
+    grupo.add_argument('--tasa-boton', type=float, default=0.0,
+                       help="Probabilidad de que continuarBtn no se habilite al aceptar los términos.")
+    grupo.add_argument('--semilla', type=int, help="Semilla para repetir el mismo escenario.")
+
+
+def config_from_args(args):
+    return StubConfig(
+        latencia=args.latencia, jitter=args.jitter, preloader=args.preloader, tasa_error=args.tasa_error,
+        tasa_captcha=args.tasa_captcha, tasa_boton=args.tasa_boton, semilla=args.semilla,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita WebJudicial.")
+    parser.add_argument('--port', type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    server, url = start_stub(args.port, config_from_args(args))
+    print(f"Stub de WebJudicial escuchando en {url} (Ctrl+C para terminar)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
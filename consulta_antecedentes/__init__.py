@@ -0,0 +1,39 @@
+"""
+Consulta automatizada de antecedentes judiciales en WebJudicial.
+
+Uso como librería:
+
+    from consulta_antecedentes import lookup
+
+    resultado = lookup("1001298785", headless=True)
+    if resultado:
+        print(resultado.resultado, resultado.archivo)
+
+Los nombres públicos se resuelven al primer uso para que importar el paquete
+no cargue selenium ni undetected-chromedriver.
+"""
+
+_EXPORTS = {
+    'lookup': '.flow',
+    'Result': '.flow',
+    'consultar_antecedentes': '.flow',
+    'consultar_antecedentes_http': '.jsf_client',
+    'create_driver_pool': '.browser',
+    'AsyncEngine': '.cdp_engine',
+    'ResultIndex': '.result_index',
+    'ArtifactWriter': '.artifacts',
+    'ManualQueue': '.manual_queue',
+    'TokenPrefetcher': '.captcha_prefetch',
+    'main': '.cli',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
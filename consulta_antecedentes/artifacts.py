@@ -0,0 +1,331 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import io
+import logging
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+
+# Separador entre la ruta de un archivo tar/zip y el nombre del artefacto dentro de él
+SEPARADOR_MIEMBRO = '::'
+
+# Extensiones de tar comprimido: no admiten agregar miembros a un archivo existente
+EXTENSIONES_TAR_GZ = ('.tar.gz', '.tgz')
+
+# Contenedores que algún ArtifactWriter de este proceso tiene abiertos para escritura
+_contenedores_abiertos = set()
+_contenedores_lock = threading.Lock()
+
+
+def container_open(ruta):
+    """
+    True si `ruta` es un miembro de un tar/zip que se está escribiendo.
+
+    Mientras el escritor no lo cierra, un zip abierto con 'a' no tiene
+    directorio central válido y un tar no tiene su marca de fin, así que sus
+    miembros no se pueden leer todavía.
+    """
+    if SEPARADOR_MIEMBRO not in ruta:
+        return False
+    contenedor = os.path.abspath(ruta.split(SEPARADOR_MIEMBRO, 1)[0])
+    with _contenedores_lock:
+        return contenedor in _contenedores_abiertos
+
+
+def _nombre_por_lote(archivo):
+    """
+    Nombre libre para un `.tar.gz` del lote.
+
+    Un tar comprimido no se puede abrir para agregar: si ya existe, el lote se
+    escribe en `<nombre>_<fecha>.tar.gz` para no truncar los artefactos que el
+    índice de resultados registró en lotes anteriores.
+    """
+    if not os.path.exists(archivo):
+        return archivo
+    extension = next(e for e in EXTENSIONES_TAR_GZ if archivo.endswith(e))
+    base = f"{archivo[:-len(extension)]}_{time.strftime('%Y%m%d-%H%M%S')}"
+    candidato, n = f"{base}{extension}", 1
+    while os.path.exists(candidato):
+        candidato, n = f"{base}_{n}{extension}", n + 1
+    return candidato
+
+
+def read_artifact(ruta):
+    """
+    Lee los bytes de un artefacto tal como quedaron guardados.
+
+    `ruta` puede ser un archivo normal o `lote.zip::antecedentes_<cedula>.pdf`
+    para un artefacto dentro de un archivo tar o zip.
+    """
+    if SEPARADOR_MIEMBRO not in ruta:
+        with open(ruta, 'rb') as f:
+            return f.read()
+    contenedor, miembro = ruta.split(SEPARADOR_MIEMBRO, 1)
+    try:
+        if contenedor.endswith('.zip'):
+            with zipfile.ZipFile(contenedor) as z:
+                return z.read(miembro)
+        with tarfile.open(contenedor) as t:
+            f = t.extractfile(miembro)
+            if f is None:
+                raise KeyError(miembro)
+            return f.read()
+    except (KeyError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise OSError(f"{miembro} no está en {contenedor}") from e
+
+
+class ArtifactWriter:
+    """
+    Etapa de escritura de los PDFs, HTMLs y capturas de error.
+
+    Las consultas entregan los bytes (o el base64 de CDP) y siguen: una cola
+    acotada los pasa a un hilo de fondo que decodifica, comprime y escribe, así
+    que el navegador se devuelve al pool sin esperar al disco. Si la cola se
+    llena, `submit` espera, lo que frena a los workers en vez de acumular
+    memoria.
+
+    Opciones:
+        comprimir: gzip por archivo (`.gz`), o deflate dentro del zip. Un tar
+            se comprime sólo si su nombre termina en `.tar.gz` o `.tgz`
+        dedup: no vuelve a escribir un contenido con el mismo SHA-256; la
+            consulta queda apuntando al artefacto que ya existía
+        archivo: ruta de un `.zip`, `.tar` o `.tar.gz` donde se agregan todos
+            los artefactos del lote en lugar de miles de archivos sueltos. Un
+            `.tar.gz` existente no se trunca: el lote va a uno nuevo con la fecha.
+            Si el `.zip` o `.tar` ya tiene un miembro con el mismo nombre (por
+            ejemplo al repetir una cédula con --force), el nuevo se agrega como
+            `<nombre>_2.pdf`, `<nombre>_3.pdf`...
+        background: False escribe en el hilo que llama (uso fuera de un lote)
+    """
+
+    def __init__(self, max_pendientes=64, comprimir=False, dedup=False, archivo=None, background=True):
+        if archivo and archivo.endswith(EXTENSIONES_TAR_GZ):
+            archivo = _nombre_por_lote(archivo)
+        self.comprimir = comprimir
+        self.dedup = dedup
+        self.archivo = archivo
+        self.background = background
+        self.stats = {'escritos': 0, 'duplicados': 0, 'bytes': 0, 'errores': 0}
+        self._hashes = {}
+        self._subdirectorios = set()
+        self._contenedor = None
+        self._miembros = None
+        self._lock = threading.Lock()
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._hilo = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Lee ARTEFACTOS_ARCHIVO, ARTEFACTOS_COMPRIMIR, ARTEFACTOS_DEDUP y ARTEFACTOS_COLA."""
+        opciones = {
+            'archivo': os.getenv('ARTEFACTOS_ARCHIVO') or None,
+            'comprimir': os.getenv('ARTEFACTOS_COMPRIMIR', '0') == '1',
+            'dedup': os.getenv('ARTEFACTOS_DEDUP', '0') == '1',
+            'max_pendientes': int(os.getenv('ARTEFACTOS_COLA', '64')),
+        }
+        opciones.update({k: v for k, v in kwargs.items() if v is not None})
+        return cls(**opciones)
+
+    def start(self):
+        if self.background and self._hilo is None:
+            self._hilo = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+            self._hilo.start()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ruta(self, subdirectorio, nombre):
+        """Ruta con la que quedará guardado el artefacto (antes de una posible deduplicación)."""
+        if self.archivo:
+            return f"{self.archivo}{SEPARADOR_MIEMBRO}{subdirectorio}/{nombre}"
+        ruta = os.path.join(subdirectorio, nombre)
+        return f"{ruta}.gz" if self.comprimir else ruta
+
+    def submit(self, subdirectorio, nombre, data=None, data_b64=None, callback=None):
+        """
+        Encola un artefacto para escribirlo.
+
+        Args:
+            subdirectorio: Carpeta del artefacto ('antecedentes', 'errors')
+            nombre: Nombre del archivo
+            data: Bytes del artefacto
+            data_b64: Alternativa a `data`: el base64 tal como lo entrega CDP
+            callback: Función (ruta, sha256) llamada cuando el artefacto quedó escrito
+
+        Returns:
+            str: Ruta con la que se guardará
+        """
+        nombre = self._nombre_libre(subdirectorio, nombre)
+        item = (subdirectorio, nombre, data, data_b64, callback)
+        if self.background and self._hilo is not None:
+            self._cola.put(item)
+        else:
+            self._escribir(*item)
+        return self.ruta(subdirectorio, nombre)
+
+    async def submit_async(self, subdirectorio, nombre, data=None, data_b64=None, callback=None):
+        """Igual que `submit`, sin bloquear el loop de asyncio cuando la cola está llena."""
+        nombre = self._nombre_libre(subdirectorio, nombre)
+        item = (subdirectorio, nombre, data, data_b64, callback)
+        loop = asyncio.get_running_loop()
+        if self.background and self._hilo is not None:
+            try:
+                self._cola.put_nowait(item)
+            except queue.Full:
+                await loop.run_in_executor(None, self._cola.put, item)
+        else:
+            await loop.run_in_executor(None, self._escribir, *item)
+        return self.ruta(subdirectorio, nombre)
+
+    def _nombre_libre(self, subdirectorio, nombre):
+        """
+        Reserva el nombre del artefacto dentro del tar/zip del lote.
+
+        Un zip o tar abierto con 'a' acepta dos miembros con el mismo nombre y
+        al leerlo no se sabe cuál se obtiene: si el nombre ya está en el
+        contenedor (de este lote o de uno anterior) se numera el nuevo.
+        """
+        if not self.archivo:
+            return nombre
+        with self._lock:
+            if self._miembros is None:
+                self._miembros = self._miembros_existentes()
+            base, extension = os.path.splitext(nombre)
+            libre, n = nombre, 2
+            while f"{subdirectorio}/{libre}" in self._miembros:
+                libre, n = f"{base}_{n}{extension}", n + 1
+            self._miembros.add(f"{subdirectorio}/{libre}")
+        return libre
+
+    def _miembros_existentes(self):
+        if not os.path.exists(self.archivo) or self.archivo.endswith(EXTENSIONES_TAR_GZ):
+            return set()
+        try:
+            if self.archivo.endswith('.zip'):
+                with zipfile.ZipFile(self.archivo) as z:
+                    return set(z.namelist())
+            with tarfile.open(self.archivo) as t:
+                return set(t.getnames())
+        except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+            logging.warning(f"No se pudieron leer los miembros de {self.archivo}: {e}")
+            return set()
+
+    def _run(self):
+        while True:
+            item = self._cola.get()
+            try:
+                if item is None:
+                    return
+                self._escribir(*item)
+            finally:
+                self._cola.task_done()
+
+    def _escribir(self, subdirectorio, nombre, data, data_b64, callback):
+        try:
+            if data is None:
+                data = base64.b64decode(data_b64)
+            with self._lock:
+                ruta, sha256 = self._guardar(subdirectorio, nombre, data)
+            if callback:
+                callback(ruta, sha256)
+        except Exception as e:
+            with self._lock:
+                self.stats['errores'] += 1
+            logging.error(f"No se pudo guardar el artefacto {nombre}: {e}")
+
+    def _guardar(self, subdirectorio, nombre, data):
+        contenido_sha = hashlib.sha256(data).hexdigest()
+        if self.dedup and contenido_sha in self._hashes:
+            self.stats['duplicados'] += 1
+            ruta, sha256 = self._hashes[contenido_sha]
+            logging.info(f"Artefacto {nombre} idéntico a {ruta}; no se vuelve a escribir.")
+            return ruta, sha256
+        ruta = self.ruta(subdirectorio, nombre)
+        if self.archivo:
+            self._agregar_al_contenedor(f"{subdirectorio}/{nombre}", data)
+            # Dentro de un tar/zip el hash es el del contenido sin comprimir
+            sha256 = contenido_sha
+        else:
+            os.makedirs(subdirectorio, exist_ok=True)
+            self._subdirectorios.add(subdirectorio)
+            if self.comprimir:
+                data = gzip.compress(data)
+            tmp_path = f"{ruta}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, ruta)
+            sha256 = hashlib.sha256(data).hexdigest()
+        self.stats['escritos'] += 1
+        self.stats['bytes'] += len(data)
+        self._hashes[contenido_sha] = (ruta, sha256)
+        logging.info(f"Artefacto guardado en: {ruta}")
+        return ruta, sha256
+
+    def _agregar_al_contenedor(self, miembro, data):
+        if self._contenedor is None:
+            directorio = os.path.dirname(self.archivo)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            if self.archivo.endswith('.zip'):
+                compresion = zipfile.ZIP_DEFLATED if self.comprimir else zipfile.ZIP_STORED
+                self._contenedor = zipfile.ZipFile(self.archivo, 'a', compression=compresion)
+            elif self.archivo.endswith(EXTENSIONES_TAR_GZ):
+                # _nombre_por_lote ya garantizó que el archivo no existe
+                self._contenedor = tarfile.open(self.archivo, 'w:gz')
+            else:
+                if self.comprimir:
+                    logging.warning(f"{self.archivo} es un tar sin comprimir; use .tar.gz para comprimirlo.")
+                self._contenedor = tarfile.open(self.archivo, 'a')
+            with _contenedores_lock:
+                _contenedores_abiertos.add(os.path.abspath(self.archivo))
+        if isinstance(self._contenedor, zipfile.ZipFile):
+            self._contenedor.writestr(miembro, data)
+        else:
+            info = tarfile.TarInfo(miembro)
+            info.size = len(data)
+            info.mtime = time.time()
+            self._contenedor.addfile(info, io.BytesIO(data))
+
+    def flush(self):
+        """Espera a que se escriban todos los artefactos encolados."""
+        if self._hilo is not None:
+            self._cola.join()
+
+    def close(self):
+        """Escribe lo pendiente, detiene el hilo y cierra el tar/zip del lote."""
+        if self._hilo is not None:
+            self._cola.put(None)
+            self._hilo.join()
+            self._hilo = None
+        with self._lock:
+            if self._contenedor is not None:
+                self._contenedor.close()
+                self._contenedor = None
+                with _contenedores_lock:
+                    _contenedores_abiertos.discard(os.path.abspath(self.archivo))
+
+    def report(self):
+        s = self.stats
+        destino = self.archivo or ', '.join(sorted(self._subdirectorios)) or '-'
+        return (f"Artefactos: {s['escritos']} escritos ({s['bytes'] / (1024 * 1024):.1f} MB) en {destino}, "
+                f"{s['duplicados']} duplicados omitidos, {s['errores']} errores.")
+
+
+_default_writer = None
+
+
+def default_writer():
+    """Escritor síncrono para las consultas que se hacen fuera de un lote."""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = ArtifactWriter(background=False)
+    return _default_writer
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+
+
+class RateLimiter:
+    """
+    Limita la frecuencia de consultas espaciándolas un intervalo mínimo.
+
+    Un límite de 0 (o None) desactiva la restricción.
+    """
+
+    def __init__(self, per_minute=None):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """Bloquea hasta que haya un turno libre según el límite configurado."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class BatchResult:
+    """Resultado de la consulta de una cédula dentro de un lote."""
+
+    def __init__(self, cedula, exitoso, duracion, error=None, registro=None, clase=None, captura=None):
+        self.cedula = cedula
+        self.exitoso = exitoso
+        self.duracion = duracion
+        self.error = error
+        self.registro = registro
+        self.clase = clase
+        self.captura = captura
+
+
+def iter_batch(cedulas, consultar, workers=1, rate_global=None, rate_worker=None):
+    """
+    Consulta un lote de cédulas en paralelo, entregando los resultados a medida que terminan.
+
+    Las cédulas se leen de forma perezosa: nunca hay más de 2 * `workers`
+    consultas enviadas al pool, así que la memoria no depende del tamaño del lote.
+
+    Args:
+        cedulas: Iterable de cédulas a consultar (puede ser un generador)
+        consultar: Función cedula -> bool (o Result) que realiza una consulta completa
+        workers: Número de consultas simultáneas (cada una con su navegador)
+        rate_global: Máximo de consultas por minuto hacia el sitio, sumando todos los workers
+        rate_worker: Máximo de consultas por minuto de cada worker
+
+    Yields:
+        BatchResult: Resultado de cada cédula, en el orden en que terminan
+    """
+    global_limiter = RateLimiter(rate_global)
+    local = threading.local()
+
+    def worker(cedula):
+        if not hasattr(local, 'limiter'):
+            local.limiter = RateLimiter(rate_worker)
+        local.limiter.wait()
+        global_limiter.wait()
+        print(f"\nConsultando antecedentes para la cédula: {cedula}")
+        inicio = time.monotonic()
+        try:
+            resultado = consultar(cedula)
+            # `consultar` puede devolver un bool o un Result con el registro de la página
+            return BatchResult(
+                cedula, bool(resultado), time.monotonic() - inicio,
+                error=getattr(resultado, 'error', None), registro=getattr(resultado, 'registro', None),
+                clase=getattr(resultado, 'clase', None), captura=getattr(resultado, 'captura', None),
+            )
+        except Exception as e:
+            logging.error(f"Error no controlado consultando la cédula {cedula}: {e}")
+            return BatchResult(cedula, False, time.monotonic() - inicio, error=str(e))
+
+    cedulas = iter(cedulas)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="consulta") as executor:
+        en_curso = set()
+        agotadas = False
+        while True:
+            while not agotadas and len(en_curso) < 2 * workers:
+                cedula = next(cedulas, None)
+                if cedula is None:
+                    agotadas = True
+                else:
+                    en_curso.add(executor.submit(worker, cedula))
+            if not en_curso:
+                return
+            hechas, en_curso = wait_futures(en_curso, return_when=FIRST_COMPLETED)
+            for future in hechas:
+                yield future.result()
+
+
+class BatchSummary:
+    """
+    Acumula los resultados de un lote para el resumen final.
+
+    Guarda el detalle de todas las cédulas mientras el lote tenga hasta
+    `max_filas`; en lotes más grandes sólo conserva las fallidas, para que la
+    memoria no crezca con el tamaño de la entrada.
+    """
+
+    def __init__(self, max_filas=100):
+        self.max_filas = max_filas
+        self.exitosos = 0
+        self.fallidos = 0
+        self.filas = []
+
+    def add(self, result):
+        if result.exitoso:
+            self.exitosos += 1
+        else:
+            self.fallidos += 1
+        total = self.exitosos + self.fallidos
+        if total == self.max_filas + 1:
+            # El lote superó el límite: desde aquí sólo se listan las fallidas
+            self.filas = [r for r in self.filas if not r.exitoso]
+        if total <= self.max_filas or not result.exitoso:
+            self.filas.append(result)
+
+    def print(self, elapsed=None):
+        """Imprime una tabla con el resultado de cada cédula del lote."""
+        total = self.exitosos + self.fallidos
+        print("\n" + "=" * 60)
+        if total > self.max_filas:
+            print(f"Lote de {total} cédulas: sólo se listan las fallidas.")
+        print(f"{'Cédula':<15} {'Estado':<10} {'Duración (s)':>14}  Detalle")
+        print("-" * 60)
+        for r in self.filas:
+            estado = "OK" if r.exitoso else "FALLÓ"
+            print(f"{r.cedula:<15} {estado:<10} {r.duracion:>14.1f}  {r.error or ''}")
+        print("-" * 60)
+        print(f"Exitosas: {self.exitosos}  Fallidas: {self.fallidos}  Total: {total}")
+        if elapsed is not None:
+            print(f"Tiempo total del lote: {elapsed:.1f} s")
+        print("=" * 60)
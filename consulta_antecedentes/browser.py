@@ -0,0 +1,240 @@
+"""
+Funciones de navegador compartidas por el modo visible y el modo headless.
+
+selenium y undetected-chromedriver se importan dentro de cada función: importar
+este módulo no carga ninguna de las dos librerías.
+"""
+import logging
+import os
+import re
+
+from .artifacts import default_writer
+from .config import url_webjudicial, get_cache_slots, get_sitekey_cache
+from .driver_pool import DriverPool
+
+
+def save_result_as_pdf(driver, cedula, writer=None, callback=None):
+    """
+    Guarda la página de resultados como PDF en la carpeta 'antecedentes'. Devuelve la ruta o None.
+
+    Sólo se espera a Chrome: el base64 de Page.printToPDF se entrega al
+    `writer` (por defecto uno síncrono), que lo decodifica y escribe, y llama a
+    `callback(ruta, sha256)` cuando el archivo quedó en disco.
+    """
+    writer = writer or default_writer()
+    try:
+        print_options = {
+            'landscape': False, 'displayHeaderFooter': False, 'printBackground': True,
+        }
+        result = driver.execute_cdp_cmd('Page.printToPDF', print_options)
+        filepath = writer.submit("antecedentes", f"antecedentes_{cedula}.pdf", data_b64=result['data'], callback=callback)
+        logging.info(f"Antecedentes de la cédula {cedula} enviados a guardar en: {filepath}")
+        return filepath
+    except Exception as e:
+        logging.error(f"No se pudo guardar el archivo PDF: {e}")
+        return None
+
+
+def save_error_screenshot(driver, cedula, intento, writer=None):
+    """Guarda una captura de pantalla en la carpeta 'errors' si el driver sigue vivo. Devuelve la ruta o None."""
+    from selenium.common.exceptions import NoSuchWindowException
+
+    writer = writer or default_writer()
+    try:
+        if is_driver_alive(driver):
+            error_filepath = writer.submit(
+                "errors", f"error_{cedula}_intento_{intento}.png", data_b64=driver.get_screenshot_as_base64(),
+            )
+            logging.info(f"Captura de error enviada a guardar en: {error_filepath}")
+            return error_filepath
+    except NoSuchWindowException as save_err:
+        logging.error(f"NoSuchWindowException al guardar la captura de error: {save_err}")
+    except Exception as save_err:
+        logging.error(f"No se pudo guardar la captura de error: {save_err}")
+
+
+def is_driver_alive(driver):
+    """Verifica si el driver está vivo y la sesión es válida."""
+    try:
+        # Un comando simple que falla si la sesión está cerrada
+        return driver is not None and driver.session_id and driver.title is not None
+    except Exception:
+        return False
+
+
+def extract_recaptcha_sitekey(driver, wait, cache=None):
+    """
+    Extrae el sitekey del reCAPTCHA usando múltiples estrategias.
+
+    Si hay un sitekey cacheado y sigue presente en la página se devuelve sin
+    recorrer las estrategias; el resultado de la búsqueda completa se guarda
+    en el cache para las siguientes consultas.
+
+    Args:
+        driver: Instancia del WebDriver
+        wait: Instancia de WebDriverWait
+        cache: SitekeyCache a consultar y actualizar (por defecto el del proceso; False para desactivarlo)
+
+    Returns:
+        str: El sitekey encontrado
+
+    Raises:
+        Exception: Si no se puede encontrar el sitekey
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+    if cache is None:
+        cache = get_sitekey_cache()
+
+    strategies = [
+        # Estrategia 1: Buscar elementos con data-sitekey
+        {
+            'selector': '[data-sitekey]',
+            'attribute': 'data-sitekey',
+            'description': 'Elemento con atributo data-sitekey'
+        },
+        # Estrategia 2: Buscar iframe de reCAPTCHA
+        {
+            'selector': 'iframe[src*="recaptcha"]',
+            'attribute': 'src',
+            'description': 'iframe de reCAPTCHA',
+            'extract_from_src': True
+        },
+        # Estrategia 3: Buscar div con clase g-recaptcha
+        {
+            'selector': '.g-recaptcha',
+            'attribute': 'data-sitekey',
+            'description': 'Div con clase g-recaptcha'
+        },
+        # Estrategia 4: Buscar script de reCAPTCHA
+        {
+            'selector': 'script[src*="recaptcha"]',
+            'attribute': 'src',
+            'description': 'Script de reCAPTCHA',
+            'extract_from_src': True
+        }
+    ]
+
+    if cache:
+        sitekey = cache.validate(driver)
+        if sitekey:
+            logging.info(f"Sitekey tomado del cache: {sitekey}")
+            return sitekey
+
+    def found(sitekey, estrategia):
+        if cache:
+            cache.store(sitekey, driver.current_url, estrategia)
+        return sitekey
+
+    for i, strategy in enumerate(strategies, 1):
+        try:
+            logging.info(f"Estrategia {i}: Buscando {strategy['description']}")
+
+            # Esperar a que aparezca el elemento
+            element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, strategy['selector'])))
+
+            if strategy.get('extract_from_src'):
+                # Extraer sitekey de la URL del src
+                src = element.get_attribute(strategy['attribute'])
+                if src and 'k=' in src:
+                    sitekey = src.split('k=')[1].split('&')[0]
+                    logging.info(f"Sitekey extraído de URL: {sitekey}")
+                    return found(sitekey, strategy['description'])
+            else:
+                # Extraer directamente del atributo
+                sitekey = element.get_attribute(strategy['attribute'])
+                if sitekey:
+                    logging.info(f"Sitekey encontrado: {sitekey}")
+                    return found(sitekey, strategy['description'])
+
+        except (TimeoutException, NoSuchElementException) as e:
+            logging.warning(f"Estrategia {i} falló: {e}")
+            continue
+
+    # Estrategia final: Buscar en el código JavaScript de la página
+    try:
+        logging.info("Estrategia final: Buscando en JavaScript de la página")
+        page_source = driver.page_source
+
+        # Buscar patrones comunes de sitekey en el código
+        patterns = [
+            r'data-sitekey=["\']([^"\']+)["\']',
+            r'sitekey["\']?\s*:\s*["\']([^"\']+)["\']',
+            r'k=([a-zA-Z0-9_-]+)',
+            r'recaptcha.*?["\']([a-zA-Z0-9_-]{40})["\']'
+        ]
+
+        for pattern in patterns:
+            matches = re.findall(pattern, page_source)
+            if matches:
+                sitekey = matches[0]
+                logging.info(f"Sitekey encontrado en JavaScript: {sitekey}")
+                return found(sitekey, f"Patrón en JavaScript: {pattern}")
+
+    except Exception as e:
+        logging.error(f"Error en estrategia final: {e}")
+
+    raise Exception("No se pudo encontrar el sitekey del reCAPTCHA en ninguna estrategia")
+
+
+def create_new_driver(headless=False, liviano=False):
+    """
+    Lanza un nuevo navegador Chrome, visible o headless.
+
+    Con `liviano` se agregan los flags de `lean_profile`, el cache en disco
+    se toma de un slot compartido (ver CacheSlots) y se bloquean imágenes,
+    fuentes y recursos de terceros sin tocar reCAPTCHA.
+    """
+    import undetected_chromedriver as uc
+
+    options = uc.ChromeOptions()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument("--window-size=1920,1080")
+    if not liviano:
+        return uc.Chrome(options=options)
+
+    from .lean_profile import CHROME_ARGS_LIVIANO, apply_blocking
+
+    slots = get_cache_slots()
+    cache_dir = slots.acquire()
+    for arg in CHROME_ARGS_LIVIANO:
+        options.add_argument(arg)
+    options.add_argument(f'--disk-cache-dir={cache_dir}')
+    try:
+        driver = uc.Chrome(options=options)
+    except Exception:
+        slots.release(cache_dir)
+        raise
+    driver.cache_dir = cache_dir
+    try:
+        patrones = apply_blocking(driver.execute_cdp_cmd)
+        logging.info(f"Perfil liviano: {len(patrones)} patrones bloqueados, cache en {cache_dir}")
+    except Exception as e:
+        logging.warning(f"No se pudo activar el bloqueo de recursos: {e}")
+    return driver
+
+
+def release_driver_cache(driver):
+    """Devuelve el slot de cache de un driver liviano ya cerrado."""
+    get_cache_slots().release(getattr(driver, 'cache_dir', None))
+
+
+def create_driver_pool(size=None, headless=False, liviano=None):
+    """
+    Crea el pool de navegadores calientes. El tamaño se toma de DRIVER_POOL_SIZE
+    y el perfil liviano de NAVEGADOR_LIVIANO si no se indican.
+    """
+    from .lean_profile import lean_enabled
+
+    size = size or int(os.getenv('DRIVER_POOL_SIZE', '1'))
+    liviano = lean_enabled() if liviano is None else liviano
+    return DriverPool(
+        lambda: create_new_driver(headless=headless, liviano=liviano),
+        size=size, start_url=url_webjudicial(), health_check=is_driver_alive,
+        on_quit=release_driver_cache if liviano else None,
+    )
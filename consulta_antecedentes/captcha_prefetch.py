@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from collections import deque
+
+# Los tokens de reCAPTCHA caducan a los ~120 s; se descartan con margen.
+TOKEN_TTL = 110
+
+
+class TokenPrefetcher:
+    """
+    Mantiene una pequeña cola de tokens de reCAPTCHA resueltos por adelantado.
+
+    El sitekey del sitio es estable entre consultas, así que la resolución del
+    CAPTCHA (20-60 s) se hace en segundo plano mientras el navegador navega.
+    Cuando el formulario está listo, el worker toma un token de la cola en
+    lugar de esperar al proveedor. Los tokens vencidos se descartan.
+
+    Si nadie toma un token durante un TTL (un worker esperando la siguiente
+    ronda de la cola, o un límite de consultas por minuto más lento que el
+    proveedor), la resolución se pausa hasta el siguiente `get` para no pagar
+    tokens que vencerían sin usarse.
+    """
+
+    def __init__(self, solve, size=1, ttl=TOKEN_TTL):
+        """
+        Args:
+            solve: Función (sitekey, url) -> token que resuelve un reCAPTCHA
+            size: Número de tokens a mantener listos (y de resoluciones en paralelo)
+            ttl: Segundos que un token se considera válido desde que se obtuvo
+        """
+        self.solve = solve
+        self.size = size
+        self.ttl = ttl
+        self.sitekey = None
+        self.url = None
+        self._tokens = deque()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+        self._ultimo_uso = time.monotonic()
+        self._pausado = False
+
+    def _evict_expired(self):
+        limite = time.monotonic() - self.ttl
+        vencidos = 0
+        while self._tokens and self._tokens[0][0] < limite:
+            self._tokens.popleft()
+            vencidos += 1
+            logging.info("Token de reCAPTCHA pre-resuelto vencido. Se descarta.")
+        return vencidos
+
+    def _inactivo(self):
+        """True si ningún worker tomó un token durante el último TTL."""
+        inactivo = time.monotonic() - self._ultimo_uso > self.ttl
+        if inactivo and not self._pausado:
+            logging.info("Ningún worker tomó tokens de reCAPTCHA en el último TTL. Se pausa la pre-resolución.")
+        self._pausado = inactivo
+        return inactivo
+
+    def _start(self, sitekey, url):
+        self.sitekey = sitekey
+        self.url = url
+        self._ultimo_uso = time.monotonic()
+        for i in range(self.size):
+            thread = threading.Thread(target=self._fill, name=f"captcha-prefetch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Pre-resolución de reCAPTCHA iniciada con {self.size} token(s) en cola.")
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (len(self._tokens) + self._pending >= self.size or self._inactivo()):
+                    self._cond.wait(timeout=5)
+                    self._evict_expired()
+                if self._stopped:
+                    return
+                self._pending += 1
+                sitekey, url = self.sitekey, self.url
+            try:
+                token = self.solve(sitekey, url)
+            except Exception as e:
+                logging.warning(f"Falló la pre-resolución del reCAPTCHA: {e}")
+                token = None
+            with self._cond:
+                self._pending -= 1
+                if token and sitekey == self.sitekey:
+                    self._tokens.append((time.monotonic(), token))
+                self._cond.notify_all()
+            if not token:
+                # Pausa antes de reintentar para no saturar al proveedor
+                time.sleep(5)
+
+    def warm(self, sitekey, url):
+        """Arranca la resolución en segundo plano antes de la primera consulta."""
+        with self._cond:
+            if self.sitekey is None:
+                self._start(sitekey, url)
+
+    def get(self, sitekey, url, timeout=None):
+        """
+        Entrega un token vigente, esperando a que se resuelva uno si la cola está vacía.
+
+        La primera llamada fija el sitekey y arranca la resolución en segundo plano.
+
+        Raises:
+            Exception: Si no hay un token disponible dentro del timeout
+        """
+        return self.get_timed(sitekey, url, timeout)[0]
+
+    def get_timed(self, sitekey, url, timeout=None):
+        """
+        Igual que `get`, pero devuelve `(token, resuelto_en)`, con el
+        `time.monotonic()` del momento en que el proveedor lo resolvió. Un token
+        pre-resuelto puede llevar casi todo su TTL en la cola.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            # Reanuda la pre-resolución si estaba en pausa
+            self._ultimo_uso = time.monotonic()
+            self._cond.notify_all()
+            if self.sitekey is None:
+                self._start(sitekey, url)
+            elif sitekey != self.sitekey:
+                logging.warning(f"El sitekey cambió ({self.sitekey} -> {sitekey}). Se descartan los tokens en cola.")
+                self.sitekey = sitekey
+                self.url = url
+                self._tokens.clear()
+            while True:
+                if self._evict_expired():
+                    # Los huecos de los tokens vencidos se vuelven a llenar de inmediato
+                    self._cond.notify_all()
+                if self._tokens:
+                    resuelto_en, token = self._tokens.popleft()
+                    # Libera un hueco para que se resuelva el siguiente token
+                    self._cond.notify_all()
+                    return token, resuelto_en
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise Exception("No hay tokens de reCAPTCHA disponibles dentro del tiempo de espera")
+                self._cond.wait(timeout=remaining)
+
+    def stop(self):
+        """Detiene la pre-resolución. Los tokens en curso se descartan."""
+        with self._cond:
+            self._stopped = True
+            self._tokens.clear()
+            self._cond.notify_all()
@@ -0,0 +1,380 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+
+from .retry_policy import captcha_timeout
+
+
+class CaptchaSolver:
+    """Interfaz común de los proveedores que resuelven reCAPTCHA v2."""
+
+    name = 'base'
+
+    def solve(self, sitekey, url):
+        """Resuelve el reCAPTCHA y devuelve el token g-recaptcha-response."""
+        raise NotImplementedError
+
+    async def solve_async(self, sitekey, url):
+        """
+        Versión para asyncio de `solve`.
+
+        Por defecto ejecuta `solve` en el executor del loop; los proveedores que
+        permiten consultar el estado de la tarea la sobrescriben para esperar con
+        `asyncio.sleep` sin ocupar un hilo durante la resolución.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.solve, sitekey, url)
+
+
+class TwoCaptchaSolver(CaptchaSolver):
+    name = '2captcha'
+    polling_interval = 5
+
+    def __init__(self, api_key, timeout=None):
+        from twocaptcha import TwoCaptcha
+        self.timeout = timeout or captcha_timeout()
+        self.client = TwoCaptcha(api_key, recaptchaTimeout=int(self.timeout))
+
+    def solve(self, sitekey, url):
+        result = self.client.recaptcha(sitekey=sitekey, url=url)
+        g_response = result.get('code') or result.get('token') or result.get('gRecaptchaResponse')
+        if not g_response:
+            raise Exception(f"Respuesta inesperada de 2Captcha: {result}")
+        return g_response
+
+    async def solve_async(self, sitekey, url):
+        from twocaptcha import NetworkException
+
+        loop = asyncio.get_running_loop()
+        captcha_id = await loop.run_in_executor(
+            None, lambda: self.client.send(method='userrecaptcha', googlekey=sitekey, pageurl=url),
+        )
+        limite = loop.time() + self.timeout
+        while loop.time() < limite:
+            await asyncio.sleep(self.polling_interval)
+            try:
+                return await loop.run_in_executor(None, self.client.get_result, captcha_id)
+            except NetworkException:
+                # CAPCHA_NOT_READY: la tarea sigue en cola en 2Captcha
+                continue
+        raise Exception(f"2Captcha no resolvió la tarea {captcha_id} en {self.timeout} s")
+
+
+class AntiCaptchaSolver(CaptchaSolver):
+    name = 'anticaptcha'
+    polling_interval = 3
+
+    def __init__(self, api_key, timeout=None):
+        from python_anticaptcha import AnticaptchaClient
+        self.timeout = timeout or captcha_timeout()
+        self.client = AnticaptchaClient(api_key)
+
+    def solve(self, sitekey, url):
+        from python_anticaptcha import NoCaptchaTaskProxylessTask
+        job = self.client.createTask(NoCaptchaTaskProxylessTask(website_url=url, website_key=sitekey))
+        job.join(maximum_time=int(self.timeout))
+        g_response = job.get_solution_response()
+        if not g_response:
+            raise Exception("Respuesta vacía de Anti-Captcha")
+        return g_response
+
+    async def solve_async(self, sitekey, url):
+        from python_anticaptcha import NoCaptchaTaskProxylessTask
+
+        loop = asyncio.get_running_loop()
+        task = NoCaptchaTaskProxylessTask(website_url=url, website_key=sitekey)
+        job = await loop.run_in_executor(None, self.client.createTask, task)
+        limite = loop.time() + self.timeout
+        while loop.time() < limite:
+            await asyncio.sleep(self.polling_interval)
+            if await loop.run_in_executor(None, job.check_is_ready):
+                g_response = job.get_solution_response()
+                if not g_response:
+                    raise Exception("Respuesta vacía de Anti-Captcha")
+                return g_response
+        raise Exception(f"Anti-Captcha no resolvió la tarea en {self.timeout} s")
+
+
+class CapSolverSolver(CaptchaSolver):
+    name = 'capsolver'
+
+    def __init__(self, api_key, timeout=None):
+        import capsolver
+        # La librería de CapSolver no admite un timeout; en asyncio lo aplica quien llama
+        self.timeout = timeout or captcha_timeout()
+        self.api_key = api_key
+        self.client = capsolver
+
+    def solve(self, sitekey, url):
+        self.client.api_key = self.api_key
+        solution = self.client.solve({
+            'type': 'ReCaptchaV2TaskProxyLess',
+            'websiteURL': url,
+            'websiteKey': sitekey,
+        })
+        g_response = solution.get('gRecaptchaResponse')
+        if not g_response:
+            raise Exception(f"Respuesta inesperada de CapSolver: {solution}")
+        return g_response
+
+
+class FakeSolver(CaptchaSolver):
+    """
+    Proveedor falso para pruebas sin conexión.
+
+    Devuelve `token` tras `delay` segundos (con una variación aleatoria de
+    `jitter`) y falla con probabilidad `failure_rate`.
+    """
+
+    def __init__(self, name='fake', token='token-falso', delay=0.0, jitter=0.0, failure_rate=0.0):
+        self.name = name
+        self.token = token
+        self.delay = delay
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    def solve(self, sitekey, url):
+        time.sleep(max(0.0, self.delay + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.failure_rate:
+            raise Exception(f"Fallo simulado del proveedor {self.name}")
+        return self.token
+
+    async def solve_async(self, sitekey, url):
+        await asyncio.sleep(max(0.0, self.delay + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.failure_rate:
+            raise Exception(f"Fallo simulado del proveedor {self.name}")
+        return self.token
+
+
+class _ProviderStats:
+    """Ventana móvil de latencias y aciertos de un proveedor."""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+
+    def record(self, ok, latency):
+        self.samples.append((ok, latency))
+
+    @property
+    def success_rate(self):
+        if not self.samples:
+            return 1.0
+        return sum(1 for ok, _ in self.samples if ok) / len(self.samples)
+
+    @property
+    def latency(self):
+        latencias = [lat for ok, lat in self.samples if ok]
+        return sum(latencias) / len(latencias) if latencias else None
+
+
+class SolverRouter(CaptchaSolver):
+    """
+    Enruta cada resolución al proveedor más rápido que esté sano.
+
+    Lleva, por proveedor, la latencia media y la tasa de acierto de las últimas
+    `window` resoluciones. Un proveedor con tasa de acierto menor a
+    `min_success_rate` se considera caído mientras haya otros sanos. Los
+    proveedores sin historial se prueban primero para medirlos.
+    """
+
+    name = 'router'
+
+    def __init__(self, solvers, window=20, min_success_rate=0.5, race=False, race_deadline=None):
+        """
+        Args:
+            solvers: Lista de CaptchaSolver disponibles
+            window: Número de resoluciones recientes consideradas por proveedor
+            min_success_rate: Tasa de acierto mínima para considerar sano a un proveedor
+            race: Si es True, cada resolución compite entre los dos mejores proveedores
+            race_deadline: Segundos máximos de espera en modo carrera
+        """
+        self.solvers = list(solvers)
+        self.min_success_rate = min_success_rate
+        self.race_enabled = race
+        self.race_deadline = race_deadline
+        self._stats = {s.name: _ProviderStats(window) for s in self.solvers}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def ranking(self):
+        """Devuelve los proveedores ordenados del más conveniente al menos conveniente."""
+        with self._lock:
+            def key(solver):
+                stats = self._stats[solver.name]
+                sano = stats.success_rate >= self.min_success_rate
+                latencia = stats.latency
+                # Sanos primero; dentro de ellos, sin historial y luego por latencia
+                return (not sano, latencia is not None, latencia or 0.0)
+            return sorted(self.solvers, key=key)
+
+    def _solve_with(self, solver, sitekey, url):
+        inicio = time.monotonic()
+        try:
+            token = solver.solve(sitekey, url)
+        except Exception:
+            with self._lock:
+                self._stats[solver.name].record(False, time.monotonic() - inicio)
+            raise
+        latencia = time.monotonic() - inicio
+        with self._lock:
+            self._stats[solver.name].record(True, latencia)
+        logging.info(f"reCAPTCHA resuelto por {solver.name} en {latencia:.1f} s")
+        return token
+
+    async def _solve_with_async(self, solver, sitekey, url):
+        inicio = time.monotonic()
+        try:
+            token = await solver.solve_async(sitekey, url)
+        except Exception:
+            with self._lock:
+                self._stats[solver.name].record(False, time.monotonic() - inicio)
+            raise
+        latencia = time.monotonic() - inicio
+        with self._lock:
+            self._stats[solver.name].record(True, latencia)
+        logging.info(f"reCAPTCHA resuelto por {solver.name} en {latencia:.1f} s")
+        return token
+
+    def solve(self, sitekey, url):
+        if not self.solvers:
+            raise Exception("No hay proveedores de CAPTCHA configurados")
+        if self.race_enabled and len(self.solvers) > 1:
+            return self.race(sitekey, url)
+        errores = []
+        for solver in self.ranking():
+            try:
+                return self._solve_with(solver, sitekey, url)
+            except Exception as e:
+                logging.warning(f"El proveedor {solver.name} no resolvió el reCAPTCHA: {e}")
+                errores.append(f"{solver.name}: {e}")
+        raise Exception(f"Ningún proveedor resolvió el reCAPTCHA ({'; '.join(errores)})")
+
+    async def solve_async(self, sitekey, url):
+        """Igual que `solve`, pero espera a los proveedores sin bloquear el loop de asyncio."""
+        if not self.solvers:
+            raise Exception("No hay proveedores de CAPTCHA configurados")
+        if self.race_enabled and len(self.solvers) > 1:
+            return await self.race_async(sitekey, url)
+        errores = []
+        for solver in self.ranking():
+            try:
+                return await self._solve_with_async(solver, sitekey, url)
+            except Exception as e:
+                logging.warning(f"El proveedor {solver.name} no resolvió el reCAPTCHA: {e}")
+                errores.append(f"{solver.name}: {e}")
+        raise Exception(f"Ningún proveedor resolvió el reCAPTCHA ({'; '.join(errores)})")
+
+    async def race_async(self, sitekey, url, contendientes=2, deadline=None):
+        """Versión para asyncio de `race`: las tareas perdedoras siguen corriendo en el loop."""
+        deadline = deadline or self.race_deadline
+        candidatos = self.ranking()[:contendientes]
+        pendientes = {
+            asyncio.ensure_future(self._solve_with_async(s, sitekey, url)): s for s in candidatos
+        }
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + deadline if deadline else None
+        errores = []
+        while pendientes:
+            restante = limite - loop.time() if limite else None
+            if restante is not None and restante <= 0:
+                break
+            hechos, _ = await asyncio.wait(pendientes, timeout=restante, return_when=asyncio.FIRST_COMPLETED)
+            if not hechos:
+                break
+            for tarea in hechos:
+                solver = pendientes.pop(tarea)
+                try:
+                    return tarea.result()
+                except Exception as e:
+                    errores.append(f"{solver.name}: {e}")
+        raise Exception(f"Ningún proveedor resolvió el reCAPTCHA a tiempo ({'; '.join(errores) or 'sin respuesta'})")
+
+    def race(self, sitekey, url, contendientes=2, deadline=None):
+        """
+        Lanza la resolución en los `contendientes` mejores proveedores y devuelve el primer token.
+
+        Las resoluciones perdedoras terminan en segundo plano (y se cobran),
+        pero su resultado alimenta las estadísticas de latencia.
+        """
+        deadline = deadline or self.race_deadline
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(thread_name_prefix="captcha-race")
+        candidatos = self.ranking()[:contendientes]
+        pendientes = {self._executor.submit(self._solve_with, s, sitekey, url): s for s in candidatos}
+        limite = time.monotonic() + deadline if deadline else None
+        errores = []
+        while pendientes:
+            restante = limite - time.monotonic() if limite else None
+            if restante is not None and restante <= 0:
+                break
+            hechos, _ = wait_futures(pendientes, timeout=restante, return_when=FIRST_COMPLETED)
+            if not hechos:
+                break
+            for future in hechos:
+                solver = pendientes.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errores.append(f"{solver.name}: {e}")
+        raise Exception(f"Ningún proveedor resolvió el reCAPTCHA a tiempo ({'; '.join(errores) or 'sin respuesta'})")
+
+    def report(self):
+        """Devuelve una tabla de texto con la latencia y tasa de acierto de cada proveedor."""
+        lines = [f"{'Proveedor':<12} {'N':>4} {'Acierto':>8} {'Latencia (s)':>13}"]
+        with self._lock:
+            for solver in self.solvers:
+                stats = self._stats[solver.name]
+                latencia = f"{stats.latency:.1f}" if stats.latency is not None else "-"
+                lines.append(f"{solver.name:<12} {len(stats.samples):>4} {stats.success_rate:>8.0%} {latencia:>13}")
+        return "\n".join(lines)
+
+
+PROVIDERS = {
+    '2captcha': ('API_KEY_2CAPTCHA', TwoCaptchaSolver),
+    'anticaptcha': ('API_KEY_ANTICAPTCHA', AntiCaptchaSolver),
+    'capsolver': ('API_KEY_CAPSOLVER', CapSolverSolver),
+}
+
+
+def build_router_from_env():
+    """
+    Crea el SolverRouter con los proveedores configurados en las variables de entorno.
+
+    Se usan los proveedores de CAPTCHA_PROVIDERS (por defecto todos) que tengan
+    una API key configurada. `fake` agrega el proveedor falso para pruebas, con
+    la demora de FAKE_CAPTCHA_DELAY (± FAKE_CAPTCHA_JITTER) segundos y una tasa
+    de fallos de FAKE_CAPTCHA_FALLOS.
+    CAPTCHA_RACE=1 activa el modo carrera con un límite de CAPTCHA_RACE_DEADLINE segundos.
+    """
+    nombres = [n.strip() for n in os.getenv('CAPTCHA_PROVIDERS', ','.join(PROVIDERS)).split(',') if n.strip()]
+    solvers = []
+    for nombre in nombres:
+        if nombre == 'fake':
+            solvers.append(FakeSolver(
+                delay=float(os.getenv('FAKE_CAPTCHA_DELAY', '0')),
+                jitter=float(os.getenv('FAKE_CAPTCHA_JITTER', '0')),
+                failure_rate=float(os.getenv('FAKE_CAPTCHA_FALLOS', '0')),
+            ))
+            continue
+        if nombre not in PROVIDERS:
+            logging.warning(f"Proveedor de CAPTCHA desconocido: {nombre}")
+            continue
+        env_var, cls = PROVIDERS[nombre]
+        api_key = os.getenv(env_var, '')
+        if not api_key or 'TU_API_KEY' in api_key.upper():
+            continue
+        try:
+            solvers.append(cls(api_key))
+        except ImportError as e:
+            logging.warning(f"El proveedor {nombre} tiene API key pero su librería no está instalada: {e}")
+    return SolverRouter(
+        solvers,
+        race=os.getenv('CAPTCHA_RACE', '0') == '1',
+        race_deadline=float(os.getenv('CAPTCHA_RACE_DEADLINE', '120')),
+    )
@@ -0,0 +1,680 @@
+"""
+Motor asíncrono que maneja Chrome directamente por el protocolo DevTools (CDP).
+
+En lugar de un hilo bloqueado por consulta (`wait.until`, `time.sleep`, sondeo
+síncrono del proveedor de CAPTCHA), un solo loop de asyncio multiplexa muchas
+cédulas en vuelo sobre un número acotado de pestañas:
+
+- Cada pestaña vive en su propio contexto de navegador (cookies aisladas), así
+  que varias sesiones JSF conviven en un solo Chrome. Cada contexto conserva
+  su sesión entre consultas y sólo acepta los términos si el sitio los pide.
+- Las esperas del DOM son promesas con un MutationObserver evaluadas con
+  `Runtime.evaluate(awaitPromise)`: no hay sondeo desde Python.
+- El token del reCAPTCHA se resuelve antes de tomar una pestaña (el sitekey se
+  toma del cache), así que las cédulas que esperan al proveedor no ocupan
+  ninguna pestaña. Si el token envejece esperando una pestaña libre, se
+  resuelve otro antes de insertarlo.
+
+Requiere la librería `websockets` y un Chrome/Chromium instalado (CHROME_PATH
+si no está en el PATH).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from .artifacts import default_writer
+from .captcha_prefetch import TOKEN_TTL
+from .config import url_webjudicial, get_captcha_router, get_sitekey_cache
+from .flow import Result
+from .lean_profile import CHROME_ARGS_LIVIANO, blocked_patterns, lean_enabled
+from .metrics import metrics, process_tree_rss_mb
+from .navigation import BOTON_HABILITADO_EXPR, CEDULA_VISIBLE_EXPR, ESPERAR_JS, PANTALLA_EXPR, PRELOADER_OCULTO
+from .result_detector import (
+    CLASIFICAR_EXPR, DetectionResult, SIN_RESPUESTA, result_stats,
+)
+from .result_record import TEXTO_RESULTADO_JS, extract_record
+from .retry_policy import (
+    BOTON_DESACTIVADO, CAPTCHA, SITIO_CAIDO, TIMEOUT_PAGINA, SIN_CIRCUITO, ConsultaError, RetryPolicy,
+    captcha_timeout, classify_failure, error_de_resultado,
+)
+
+CHROME_CANDIDATOS = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+
+_SITEKEY_EXPR = (
+    "(() => { const el = document.querySelector('[data-sitekey]');"
+    " if (el) return el.getAttribute('data-sitekey');"
+    " const f = document.querySelector('iframe[src*=\"recaptcha\"]');"
+    " const m = f && f.src.match(/[?&]k=([^&]+)/);"
+    " return m ? m[1] : null; })()"
+)
+
+
+class CDPError(Exception):
+    """Error devuelto por Chrome a un comando del protocolo DevTools."""
+
+
+class CDPConnection:
+    """
+    Conexión websocket al endpoint DevTools del navegador.
+
+    Los comandos de todas las pestañas comparten la conexión (sesiones
+    "flatten"): cada respuesta se entrega a su futuro por `id`.
+    """
+
+    def __init__(self, ws_url):
+        self.ws_url = ws_url
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._pendientes = {}
+        self._lector = None
+        # Función (method, params, session_id) que recibe los eventos de Chrome
+        self.on_event = None
+
+    async def connect(self):
+        import websockets
+
+        self._ws = await websockets.connect(self.ws_url, max_size=None)
+        self._lector = asyncio.ensure_future(self._leer())
+
+    async def _leer(self):
+        try:
+            async for mensaje in self._ws:
+                datos = json.loads(mensaje)
+                if 'method' in datos and 'id' not in datos:
+                    if self.on_event:
+                        self.on_event(datos['method'], datos.get('params', {}), datos.get('sessionId'))
+                    continue
+                futuro = self._pendientes.pop(datos.get('id'), None)
+                if futuro is None or futuro.done():
+                    continue
+                if 'error' in datos:
+                    futuro.set_exception(CDPError(datos['error'].get('message', datos['error'])))
+                else:
+                    futuro.set_result(datos.get('result', {}))
+        except Exception as e:
+            logging.error(f"Se cerró la conexión DevTools: {e}")
+        finally:
+            for futuro in self._pendientes.values():
+                if not futuro.done():
+                    futuro.set_exception(CDPError("Conexión DevTools cerrada"))
+            self._pendientes.clear()
+
+    async def send(self, method, params=None, session_id=None, timeout=30):
+        """Envía un comando y espera su respuesta sin bloquear el loop."""
+        comando_id = next(self._ids)
+        mensaje = {'id': comando_id, 'method': method, 'params': params or {}}
+        if session_id:
+            mensaje['sessionId'] = session_id
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes[comando_id] = futuro
+        await self._ws.send(json.dumps(mensaje))
+        try:
+            return await asyncio.wait_for(futuro, timeout)
+        finally:
+            self._pendientes.pop(comando_id, None)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._lector is not None:
+            await asyncio.gather(self._lector, return_exceptions=True)
+
+
+class ChromeProcess:
+    """Proceso de Chrome con el puerto de depuración remota abierto."""
+
+    def __init__(self, process, ws_url, user_data_dir):
+        self.process = process
+        self.ws_url = ws_url
+        self.user_data_dir = user_data_dir
+        self._drenaje = None
+
+    @classmethod
+    async def launch(cls, headless=True, chrome_path=None, timeout=30, extra_args=()):
+        path = chrome_path or os.getenv('CHROME_PATH') or next(filter(None, map(shutil.which, CHROME_CANDIDATOS)), None)
+        if not path:
+            raise Exception("No se encontró Chrome/Chromium. Indique la ruta en CHROME_PATH.")
+        user_data_dir = tempfile.mkdtemp(prefix="cdp_chrome_")
+        args = [
+            path, '--remote-debugging-port=0', f'--user-data-dir={user_data_dir}',
+            '--no-first-run', '--no-default-browser-check', '--no-sandbox',
+            '--disable-dev-shm-usage', '--window-size=1920,1080',
+        ]
+        if headless:
+            args.append('--headless=new')
+        args.extend(extra_args)
+        args.append('about:blank')
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        ws_url = None
+        limite = time.monotonic() + timeout
+        while ws_url is None:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                process.kill()
+                raise Exception(f"Chrome no abrió el puerto DevTools en {timeout} s")
+            linea = await asyncio.wait_for(process.stderr.readline(), restante)
+            if not linea:
+                raise Exception("Chrome terminó antes de abrir el puerto DevTools")
+            texto = linea.decode('utf-8', 'replace').strip()
+            if texto.startswith('DevTools listening on '):
+                ws_url = texto[len('DevTools listening on '):]
+        chrome = cls(process, ws_url, user_data_dir)
+        # Se sigue leyendo stderr para que el pipe no se llene y bloquee a Chrome
+        chrome._drenaje = asyncio.ensure_future(process.stderr.read())
+        return chrome
+
+    async def close(self):
+        if self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), 10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+        if self._drenaje is not None:
+            await asyncio.gather(self._drenaje, return_exceptions=True)
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+
+class Tab:
+    """Pestaña en su propio contexto de navegador, controlada por una sesión CDP."""
+
+    def __init__(self, connection, context_id, target_id, session_id):
+        self.connection = connection
+        self.context_id = context_id
+        self.target_id = target_id
+        self.session_id = session_id
+        # True si la última consulta de la pestaña terminó bien y su sesión JSF puede reutilizarse
+        self.sesion_activa = False
+        # True si Chrome avisó que el target se cayó o se desconectó
+        self.caida = False
+
+    async def send(self, method, params=None, timeout=30):
+        return await self.connection.send(method, params, session_id=self.session_id, timeout=timeout)
+
+    async def evaluate(self, expression, await_promise=False, timeout=30):
+        respuesta = await self.send('Runtime.evaluate', {
+            'expression': expression, 'awaitPromise': await_promise, 'returnByValue': True,
+        }, timeout=timeout)
+        if 'exceptionDetails' in respuesta:
+            raise CDPError(respuesta['exceptionDetails'].get('text', 'Error de JavaScript'))
+        return respuesta.get('result', {}).get('value')
+
+    async def wait_for(self, expression, timeout=20):
+        """
+        Espera a que `expression` sea verdadera en la página y devuelve su valor (None si vence).
+
+        Las navegaciones destruyen el contexto de JavaScript en el que corre la
+        promesa; en ese caso se vuelve a evaluar en el documento nuevo.
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return None
+            try:
+                return await self.evaluate(
+                    ESPERAR_JS % (expression, int(restante * 1000)), await_promise=True, timeout=restante + 5,
+                )
+            except CDPError as e:
+                logging.debug(f"Reintentando la espera tras una navegación: {e}")
+                await asyncio.sleep(0.1)
+
+    async def click(self, element_id):
+        encontrado = await self.evaluate(
+            f"(() => {{ const el = document.getElementById({json.dumps(element_id)});"
+            f" if (!el) return false; el.click(); return true; }})()"
+        )
+        if not encontrado:
+            raise Exception(f"No se encontró el elemento '{element_id}'")
+
+    async def navigate(self, url):
+        respuesta = await self.send('Page.navigate', {'url': url})
+        if respuesta.get('errorText'):
+            raise ConsultaError(SITIO_CAIDO, f"No se pudo abrir {url}: {respuesta['errorText']}")
+
+    async def reset(self, url):
+        """Borra las cookies del contexto de la pestaña y vuelve a la página inicial."""
+        await self.connection.send('Storage.clearCookies', {'browserContextId': self.context_id})
+        await self.navigate(url)
+
+    async def alive(self):
+        """True si el target sigue conectado y su página responde."""
+        if self.caida:
+            return False
+        try:
+            return await self.evaluate('1', timeout=5) == 1
+        except Exception:
+            return False
+
+    async def print_pdf(self):
+        """Imprime la página y devuelve el PDF en base64, tal como lo entrega Chrome."""
+        respuesta = await self.send('Page.printToPDF', {
+            'landscape': False, 'displayHeaderFooter': False, 'printBackground': True,
+        }, timeout=60)
+        return respuesta['data']
+
+
+class TabPool:
+    """Conjunto acotado de pestañas aisladas que se prestan por consulta."""
+
+    def __init__(self, connection, size, bloqueadas=None):
+        self.connection = connection
+        self.size = size
+        # Patrones de Network.setBlockedURLs que se aplican a cada pestaña (perfil liviano)
+        self.bloqueadas = bloqueadas
+        self._libres = asyncio.Queue()
+        self._tabs = []
+
+    async def start(self):
+        self.connection.on_event = self._on_event
+        for _ in range(self.size):
+            tab = await self._open()
+            self._tabs.append(tab)
+            self._libres.put_nowait(tab)
+        logging.info(f"Pool de pestañas listo con {self.size} contexto(s) aislado(s).")
+
+    def _on_event(self, method, params, session_id):
+        if method == 'Inspector.targetCrashed':
+            caidas = [t for t in self._tabs if t.session_id == session_id]
+        elif method == 'Target.detachedFromTarget':
+            caidas = [t for t in self._tabs if t.session_id == params.get('sessionId')]
+        else:
+            return
+        for tab in caidas:
+            logging.warning(f"La pestaña {tab.target_id} se cayó o se desconectó ({method}).")
+            tab.caida = True
+
+    async def _open(self, context_id=None):
+        """Abre una pestaña en `context_id`, o en un contexto aislado nuevo."""
+        if context_id is None:
+            contexto = await self.connection.send('Target.createBrowserContext', {'disposeOnDetach': True})
+            context_id = contexto['browserContextId']
+        target = await self.connection.send('Target.createTarget', {
+            'url': 'about:blank', 'browserContextId': context_id,
+        })
+        sesion = await self.connection.send('Target.attachToTarget', {
+            'targetId': target['targetId'], 'flatten': True,
+        })
+        tab = Tab(self.connection, context_id, target['targetId'], sesion['sessionId'])
+        if self.bloqueadas:
+            await tab.send('Network.enable')
+            await tab.send('Network.setBlockedURLs', {'urls': self.bloqueadas})
+        return tab
+
+    async def acquire(self):
+        return await self._libres.get()
+
+    def en_uso(self):
+        """Pestañas prestadas en este momento."""
+        return len(self._tabs) - self._libres.qsize()
+
+    async def release(self, tab, verificar=False):
+        """
+        Devuelve la pestaña al pool. Si se cayó (o, con `verificar`, si ya no
+        responde), se cierra y se devuelve una nueva en su mismo contexto.
+        """
+        if tab.caida or (verificar and not await tab.alive()):
+            tab = await self._replace(tab)
+        self._libres.put_nowait(tab)
+
+    async def _replace(self, tab):
+        try:
+            await self.connection.send('Target.closeTarget', {'targetId': tab.target_id}, timeout=5)
+        except Exception as e:
+            logging.debug(f"No se pudo cerrar el target {tab.target_id}: {e}")
+        try:
+            nueva = await self._open(tab.context_id)
+        except Exception as e:
+            # El contexto tampoco sirve: se descarta y se abre otro aislado
+            logging.warning(f"No se pudo abrir una pestaña en el contexto {tab.context_id}: {e}")
+            try:
+                await self.connection.send('Target.disposeBrowserContext', {'browserContextId': tab.context_id})
+            except Exception:
+                pass
+            nueva = await self._open()
+        self._tabs[self._tabs.index(tab)] = nueva
+        metrics.incr('pestanas_reemplazadas')
+        logging.info(f"Pestaña {tab.target_id} reemplazada por {nueva.target_id}.")
+        return nueva
+
+    async def close(self):
+        for tab in self._tabs:
+            try:
+                await self.connection.send('Target.disposeBrowserContext', {'browserContextId': tab.context_id})
+            except Exception as e:
+                logging.debug(f"No se pudo cerrar el contexto {tab.context_id}: {e}")
+
+
+class AsyncEngine:
+    """
+    Orquestador de consultas sobre Chrome por CDP.
+
+    Uso:
+
+        async with AsyncEngine(tabs=4, en_vuelo=32) as engine:
+            async for result in engine.run(cedulas):
+                ...
+    """
+
+    def __init__(self, tabs=4, en_vuelo=None, headless=True, url=None, solver=None, index=None,
+                 policy=None, breaker=None, rate_global=0, reusar_sesion=True, writer=None, guardar_pdf=True,
+                 liviano=None):
+        """
+        Args:
+            tabs: Pestañas (sesiones JSF simultáneas) abiertas en Chrome
+            en_vuelo: Cédulas procesándose a la vez, incluidas las que esperan al CAPTCHA
+            headless: Ejecutar Chrome sin ventana visible
+            url: URL de la página inicial (por defecto URL_WEBJUDICIAL)
+            solver: Objeto con `solve_async(sitekey, url)` (por defecto el router de proveedores)
+            index: ResultIndex opcional donde registrar los resultados
+            policy: RetryPolicy para los reintentos (por defecto la de MAX_RETRIES)
+            breaker: CircuitBreaker que pausa el lote si el sitio está degradado
+            rate_global: Máximo de consultas por minuto hacia el sitio (0 = sin límite)
+            reusar_sesion: Conservar las cookies de cada contexto entre consultas para no
+                aceptar los términos otra vez si el sitio mantiene la sesión
+            writer: ArtifactWriter que decodifica y escribe los PDFs fuera del loop
+            guardar_pdf: False para no imprimir el PDF y quedarse sólo con `Result.registro`
+            liviano: Perfil liviano (ver lean_profile); por defecto NAVEGADOR_LIVIANO
+        """
+        self.tabs = tabs
+        self.en_vuelo = en_vuelo or tabs * 4
+        self.headless = headless
+        self.url = url or url_webjudicial()
+        self.solver = solver
+        self.index = index
+        self.policy = policy or RetryPolicy.from_env()
+        self.breaker = breaker or SIN_CIRCUITO
+        self.intervalo = 60.0 / rate_global if rate_global > 0 else 0.0
+        self.reusar_sesion = reusar_sesion
+        self.writer = writer or default_writer()
+        self.guardar_pdf = guardar_pdf
+        self.liviano = lean_enabled() if liviano is None else liviano
+        self._chrome = None
+        self._connection = None
+        self._pool = None
+        self._sitekey_lock = None
+        self._rate_lock = None
+        self._siguiente_envio = 0.0
+        self._muestreo = None
+        self.memoria = {'muestras': 0, 'rss_max': None, 'en_uso_max': 0, 'mb_por_pestana': None}
+        # Máximo de cédulas que estuvieron realmente en vuelo a la vez
+        self.en_vuelo_max = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        self.solver = self.solver or get_captcha_router()
+        self._sitekey_lock = asyncio.Lock()
+        self._rate_lock = asyncio.Lock()
+        extra_args, bloqueadas = (), None
+        if self.liviano:
+            # Cada pestaña es un contexto aislado con cache en memoria: aquí no hay cache en disco que compartir
+            extra_args, bloqueadas = CHROME_ARGS_LIVIANO, blocked_patterns(self.url)
+            logging.info(f"Perfil liviano: {len(bloqueadas)} patrones bloqueados")
+        with metrics.span('inicio_chrome', motor='cdp'):
+            self._chrome = await ChromeProcess.launch(headless=self.headless, extra_args=extra_args)
+            self._connection = CDPConnection(self._chrome.ws_url)
+            await self._connection.connect()
+            self._pool = TabPool(self._connection, self.tabs, bloqueadas=bloqueadas)
+            await self._pool.start()
+        self._muestreo = asyncio.ensure_future(self._muestrear_memoria())
+
+    async def close(self):
+        if self._muestreo:
+            self._muestreo.cancel()
+            await asyncio.gather(self._muestreo, return_exceptions=True)
+        if self._pool:
+            await self._pool.close()
+        if self._connection:
+            await self._connection.close()
+        if self._chrome:
+            await self._chrome.close()
+
+    async def _muestrear_memoria(self, intervalo=1.0):
+        """Registra el RSS de Chrome (con sus renderers) y las pestañas ocupadas en ese momento."""
+        while True:
+            rss = process_tree_rss_mb(self._chrome.process.pid)
+            if rss is not None:
+                en_uso = self._pool.en_uso()
+                self.memoria['muestras'] += 1
+                self.memoria['rss_max'] = max(self.memoria['rss_max'] or 0.0, rss)
+                self.memoria['en_uso_max'] = max(self.memoria['en_uso_max'], en_uso)
+                if en_uso:
+                    por_pestana = rss / en_uso
+                    # Se reporta el costo con más pestañas ocupadas, que es el que escala
+                    if en_uso == self.memoria['en_uso_max']:
+                        self.memoria['mb_por_pestana'] = por_pestana
+            await asyncio.sleep(intervalo)
+
+    def reporte_memoria(self):
+        """Devuelve un texto con el RSS máximo de Chrome y el costo por consulta en vuelo."""
+        m = self.memoria
+        if m['rss_max'] is None:
+            return "Memoria de Chrome: no se pudo medir en este sistema."
+        texto = f"Memoria de Chrome: {m['rss_max']:.0f} MB máx. con {self.tabs} pestaña(s)"
+        if m['mb_por_pestana'] is not None:
+            texto += f"; {m['mb_por_pestana']:.0f} MB por consulta en vuelo ({m['en_uso_max']} pestañas ocupadas)"
+        return texto
+
+    async def _esperar_turno(self):
+        """Espacia los envíos al sitio según `rate_global`."""
+        if not self.intervalo:
+            return
+        async with self._rate_lock:
+            ahora = time.monotonic()
+            espera = self._siguiente_envio - ahora
+            self._siguiente_envio = max(ahora, self._siguiente_envio) + self.intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    async def _abrir_formulario(self, tab, cedula):
+        """
+        Acepta los términos y escribe la cédula en el formulario.
+
+        Si la pestaña conserva una sesión JSF válida y el sitio muestra el
+        formulario directamente, la aceptación de términos se omite.
+        """
+        if self.reusar_sesion and tab.sesion_activa:
+            await tab.navigate(self.url)
+        else:
+            await tab.reset(self.url)
+        if not await tab.wait_for(PRELOADER_OCULTO):
+            raise ConsultaError(TIMEOUT_PAGINA, "La página inicial no terminó de cargar")
+        pantalla = await tab.wait_for(PANTALLA_EXPR)
+        if pantalla == 'formulario':
+            metrics.incr('terminos_reutilizados', cedula=cedula, motor='cdp')
+        elif pantalla == 'terminos':
+            await self._aceptar_terminos(tab)
+        else:
+            raise ConsultaError(TIMEOUT_PAGINA, "No apareció la aceptación de términos")
+        await tab.evaluate(
+            f"(() => {{ const c = document.getElementById('cedulaInput'); c.value = {json.dumps(cedula)};"
+            " c.dispatchEvent(new Event('input', {bubbles: true})); c.dispatchEvent(new Event('change', {bubbles: true})); })()"
+        )
+
+    async def _aceptar_terminos(self, tab):
+        await tab.click('aceptaOption:0')
+        if not await tab.wait_for(BOTON_HABILITADO_EXPR, timeout=5):
+            raise ConsultaError(BOTON_DESACTIVADO, "El botón 'Enviar' está desactivado")
+        await tab.click('continuarBtn')
+        if not await tab.wait_for(CEDULA_VISIBLE_EXPR):
+            raise ConsultaError(TIMEOUT_PAGINA, "No apareció el campo de la cédula")
+
+    async def _sitekey(self, tab=None):
+        """
+        Devuelve (sitekey, url) del cache. Si no hay uno cacheado, la primera
+        consulta lo lee del formulario abierto en `tab` y lo guarda.
+        """
+        cache = get_sitekey_cache()
+        entrada = cache.get()
+        if entrada or tab is None:
+            return (entrada['sitekey'], entrada['url']) if entrada else None
+        sitekey = await tab.wait_for(_SITEKEY_EXPR)
+        if not sitekey:
+            raise ConsultaError(CAPTCHA, "No se pudo encontrar el sitekey del reCAPTCHA")
+        url = await tab.evaluate("location.href")
+        cache.store(sitekey, url, 'CDP: data-sitekey o iframe de reCAPTCHA')
+        return sitekey, url
+
+    async def _resolver(self, sitekey, url):
+        try:
+            return await asyncio.wait_for(self.solver.solve_async(sitekey, url), captcha_timeout())
+        except asyncio.TimeoutError:
+            raise ConsultaError(CAPTCHA, f"El reCAPTCHA no se resolvió en {captcha_timeout():.0f} s")
+
+    async def _intento(self, cedula, intento):
+        timer = metrics.timer(cedula=cedula, intento=intento, motor='cdp')
+        # Con el sitekey cacheado el token se pide antes de ocupar una pestaña
+        token = None
+        async with self._sitekey_lock:
+            conocido = await self._sitekey()
+        if conocido:
+            token = await self._resolver(*conocido)
+            resuelto_en = time.monotonic()
+            timer.lap('captcha')
+        # La espera del límite de envíos no retiene ninguna pestaña
+        await self._esperar_turno()
+        tab = await self._pool.acquire()
+        timer.lap('prestamo_pestana')
+        # Si el intento falla, la próxima consulta de la pestaña empieza con cookies limpias
+        tab.sesion_activa = False
+        completo = False
+        try:
+            await self._abrir_formulario(tab, cedula)
+            timer.lap('terminos')
+            if token is not None and time.monotonic() - resuelto_en > TOKEN_TTL:
+                logging.warning(f"El token de la cédula {cedula} venció esperando una pestaña. Se resuelve otro.")
+                metrics.incr('tokens_vencidos', cedula=cedula, motor='cdp')
+                token = None
+            if token is None:
+                async with self._sitekey_lock:
+                    sitekey, url = await self._sitekey(tab)
+                timer.lap('sitekey')
+                token = await self._resolver(sitekey, url)
+                timer.lap('captcha')
+            await tab.evaluate(
+                "(() => { const r = document.getElementById('g-recaptcha-response');"
+                f" r.style.display = 'block'; r.value = {json.dumps(token)};"
+                " r.dispatchEvent(new Event('change')); })()"
+            )
+            inicio = time.monotonic()
+            await tab.click('j_idt17')
+            timer.lap('envio')
+            clasificacion = await tab.wait_for(CLASIFICAR_EXPR, timeout=60)
+            outcome, marcador = clasificacion or (SIN_RESPUESTA, None)
+            resultado = DetectionResult(outcome, time.monotonic() - inicio, marcador)
+            result_stats.record(resultado)
+            timer.lap('resultado', ok=resultado.exitoso)
+            logging.info(f"Resultado detectado: {outcome} en {resultado.elapsed:.1f} s")
+            if not resultado.exitoso:
+                raise error_de_resultado(outcome)
+            texto = await tab.evaluate(TEXTO_RESULTADO_JS)
+            timer.lap('extraccion')
+            filepath = None
+            if self.guardar_pdf:
+                filepath = await self._guardar_pdf(await tab.print_pdf(), cedula, outcome)
+                timer.lap('pdf', ok=filepath is not None)
+            elif self.index:
+                self.index.record(cedula, outcome)
+            tab.sesion_activa = True
+            completo = True
+            return outcome, filepath, extract_record(texto, cedula, outcome, filepath)
+        finally:
+            # Tras un fallo se comprueba que la pestaña siga viva antes de prestarla otra vez
+            await self._pool.release(tab, verificar=not completo)
+
+    async def _guardar_pdf(self, pdf_b64, cedula, outcome):
+        """Entrega el PDF al writer; la pestaña se libera sin esperar al disco."""
+        registrar = None
+        if self.index:
+            registrar = lambda ruta, sha256: self.index.record(cedula, outcome, ruta, sha256=sha256)
+        try:
+            filepath = await self.writer.submit_async(
+                "antecedentes", f"antecedentes_{cedula}.pdf", data_b64=pdf_b64, callback=registrar,
+            )
+            logging.info(f"Antecedentes de la cédula {cedula} enviados a guardar en: {filepath}")
+            return filepath
+        except Exception as e:
+            logging.error(f"No se pudo guardar el archivo PDF: {e}")
+            return None
+
+    async def lookup(self, cedula):
+        """Consulta una cédula con reintentos. Devuelve un Result."""
+        inicio = time.monotonic()
+        result = Result(cedula, False)
+        reintentos = self.policy.start()
+        intento = 0
+        while True:
+            intento += 1
+            result.intentos = intento
+            if intento > 1:
+                metrics.incr('reintentos', cedula=cedula, motor='cdp')
+            prueba = await self.breaker.wait_async()
+            try:
+                logging.info(f"--- Cédula {cedula}: intento CDP #{intento} de {reintentos.intentos_max} ---")
+                result.resultado, result.archivo, result.registro = await self._intento(cedula, intento)
+                result.exitoso = True
+                result.error = result.clase = None
+                self.breaker.record(prueba=prueba)
+                break
+            except Exception as e:
+                logging.error(f"Ocurrió un error en el intento CDP #{intento} de la cédula {cedula}: {e}")
+                result.error = str(e)
+                clase = result.clase = classify_failure(e)
+                self.breaker.record(clase, prueba)
+                metrics.incr(f'fallo_{clase}', cedula=cedula, motor='cdp')
+                espera = reintentos.siguiente(clase)
+                if espera is None:
+                    break
+                logging.info(f"Cédula {cedula}: fallo '{clase}', se reintenta en {espera:.1f} s.")
+                await asyncio.sleep(espera)
+        result.duracion = time.monotonic() - inicio
+        metrics.incr('consultas_exitosas' if result.exitoso else 'consultas_fallidas', cedula=cedula, motor='cdp')
+        return result
+
+    async def run(self, cedulas):
+        """
+        Consulta las cédulas con hasta `en_vuelo` consultas simultáneas.
+
+        Las cédulas se toman de forma perezosa y los resultados se entregan en
+        orden de finalización, como `iter_batch`. Tomar la siguiente cédula
+        puede bloquear (lectura de un archivo o de stdin, lease de la cola de
+        trabajos), así que se pide en un hilo mientras las consultas en vuelo
+        siguen avanzando.
+        """
+        loop = asyncio.get_running_loop()
+        cedulas = iter(cedulas)
+        en_curso = set()
+        pedido = None
+        agotadas = False
+        while True:
+            if pedido is None and not agotadas and len(en_curso) < self.en_vuelo:
+                pedido = loop.run_in_executor(None, next, cedulas, None)
+            if pedido is None and not en_curso:
+                return
+            esperando = en_curso | {pedido} if pedido is not None else en_curso
+            hechos, _ = await asyncio.wait(esperando, return_when=asyncio.FIRST_COMPLETED)
+            if pedido in hechos:
+                hechos.discard(pedido)
+                cedula = pedido.result()
+                pedido = None
+                if cedula is None:
+                    agotadas = True
+                else:
+                    en_curso.add(asyncio.ensure_future(self.lookup(cedula)))
+                    self.en_vuelo_max = max(self.en_vuelo_max, len(en_curso))
+            en_curso -= hechos
+            for tarea in hechos:
+                yield tarea.result()
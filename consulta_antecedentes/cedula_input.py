@@ -0,0 +1,97 @@
+import csv
+import logging
+import sys
+from contextlib import contextmanager
+
+
+def normalize_cedula(valor):
+    """Limpia una cédula (espacios y puntos de miles) y la devuelve si es válida, o None."""
+    cedula = valor.strip().replace('.', '').replace(' ', '')
+    return cedula if cedula.isdigit() else None
+
+
+@contextmanager
+def open_source(fuente):
+    """Abre un archivo de entrada, o stdin si `fuente` es '-'."""
+    if fuente == '-':
+        yield sys.stdin
+    else:
+        with open(fuente, encoding='utf-8-sig', newline='') as f:
+            yield f
+
+
+def _iter_csv(f, columna):
+    reader = csv.reader(f)
+    indice = None
+    for numero, fila in enumerate(reader, 1):
+        if not fila:
+            continue
+        if indice is None:
+            encabezado = [c.strip().lower() for c in fila]
+            if columna is not None and not str(columna).isdigit():
+                if columna.lower() not in encabezado:
+                    raise ValueError(f"La columna '{columna}' no existe en el CSV: {fila}")
+                indice = encabezado.index(columna.lower())
+                continue
+            if columna is None and 'cedula' in encabezado:
+                indice = encabezado.index('cedula')
+                continue
+            indice = int(columna or 0)
+            # Sin nombre de columna: la primera fila es un encabezado si no trae una cédula
+            if indice < len(fila) and not normalize_cedula(fila[indice]):
+                continue
+        yield numero, fila[indice] if indice < len(fila) else ''
+
+
+def _iter_lines(f):
+    # Cada línea puede traer una cédula o varias separadas por coma
+    for numero, linea in enumerate(f, 1):
+        for valor in linea.split(','):
+            if valor.strip():
+                yield numero, valor
+
+
+def iter_cedulas(lineas=None, fuente=None, columna=None, dedup=True):
+    """
+    Genera las cédulas válidas de la entrada, leyéndola de forma perezosa.
+
+    La entrada puede ser una secuencia de líneas (`lineas`) o un archivo
+    (`fuente`): un CSV, un archivo de texto con una cédula por línea, o '-'
+    para leer de stdin. Los valores inválidos se reportan y se omiten.
+
+    Con `dedup` las cédulas repetidas se entregan una sola vez; para eso se
+    guardan en memoria todas las cédulas vistas, así que la memoria crece con
+    el tamaño de la entrada. Con `dedup=False` la lectura usa memoria
+    constante y los repetidos se entregan de nuevo (en un lote, el checkpoint
+    o el índice los omiten si la primera consulta ya terminó).
+
+    Args:
+        lineas: Iterable de textos con cédulas separadas por coma
+        fuente: Ruta del archivo de entrada o '-' para stdin
+        columna: Nombre o posición de la columna con la cédula (sólo CSV)
+        dedup: False para no quitar las cédulas repetidas
+
+    Yields:
+        str: Cédula normalizada
+    """
+    vistas = set()
+
+    def validar(items):
+        for numero, valor in items:
+            cedula = normalize_cedula(valor)
+            if not cedula:
+                logging.warning(f"Línea {numero}: valor de cédula inválido omitido: {valor.strip()!r}")
+                continue
+            # Se compara la cédula normalizada: '0123' y '123' son cédulas distintas
+            if dedup:
+                if cedula in vistas:
+                    continue
+                vistas.add(cedula)
+            yield cedula
+
+    if lineas is not None:
+        yield from validar(_iter_lines(lineas))
+        return
+    with open_source(fuente) as f:
+        es_csv = fuente != '-' and fuente.lower().endswith('.csv')
+        yield from validar(_iter_csv(f, columna) if es_csv else _iter_lines(f))
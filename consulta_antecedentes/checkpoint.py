@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class Checkpoint:
+    """
+    Diario de progreso de un lote, de sólo agregado (JSON lines).
+
+    Cada cédula procesada se agrega al archivo apenas termina, así que si el
+    proceso se interrumpe, la siguiente ejecución con el mismo diario retoma
+    desde la primera cédula que no alcanzó a completarse. Cuenta la última
+    línea de cada cédula: las que terminaron fallidas (incluidas las diferidas
+    por el CAPTCHA) se vuelven a consultar.
+
+    Las cédulas completadas se guardan en memoria para consultarlas rápido:
+    la memoria crece con las cédulas completadas, no con el tamaño de la entrada.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hechas = set()
+        self._file = None
+
+    def load(self):
+        """Lee el diario existente. Devuelve cuántas cédulas ya se procesaron con éxito."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for numero, linea in enumerate(f, 1):
+                    try:
+                        registro = json.loads(linea)
+                        cedula = str(registro['cedula'])
+                    except (ValueError, KeyError, TypeError):
+                        # Una línea truncada por una interrupción se ignora
+                        logging.warning(f"Línea {numero} del checkpoint {self.path} inválida; se ignora.")
+                        continue
+                    if registro.get('exitoso') is True:
+                        self._hechas.add(cedula)
+                    else:
+                        self._hechas.discard(cedula)
+        except FileNotFoundError:
+            pass
+        if self._hechas:
+            logging.info(f"Checkpoint {self.path}: {len(self._hechas)} cédula(s) ya procesadas se omitirán.")
+        return len(self._hechas)
+
+    def __contains__(self, cedula):
+        return str(cedula) in self._hechas
+
+    def mark(self, cedula, exitoso, detalle=None):
+        """Agrega una cédula procesada al diario y la escribe a disco de inmediato."""
+        registro = {'cedula': cedula, 'exitoso': exitoso, 'fecha': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        if detalle:
+            registro['detalle'] = detalle
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if exitoso:
+                self._hechas.add(str(cedula))
+            else:
+                self._hechas.discard(str(cedula))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,436 @@
+"""
+Línea de comandos de la consulta de antecedentes.
+
+Los comandos que no abren un navegador (`--validar`, `--reporte-indice`,
+`--dry-run`) no importan selenium, undetected-chromedriver ni los clientes de
+los proveedores de CAPTCHA, por lo que responden en milisegundos.
+"""
+import argparse
+import itertools
+import logging
+import os
+import sys
+import time
+
+from .cedula_input import iter_cedulas
+from .checkpoint import Checkpoint
+from .config import url_webjudicial, get_captcha_router, get_sitekey_cache
+from .manual_queue import ManualQueue, needs_manual
+from .metrics import metrics
+from .result_index import ResultIndex
+
+
+def build_parser(headless=False):
+    parser = argparse.ArgumentParser(description="Consulta automatizada de antecedentes judiciales.")
+    parser.add_argument('cedulas', nargs='*', help="Cédulas a consultar. Si no se indican, se piden por consola.")
+    parser.add_argument('--headless', action='store_true', default=headless,
+                        help="Ejecuta Chrome sin ventana visible.")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', '1')),
+                        help="Consultas simultáneas, cada una con su propio navegador.")
+    parser.add_argument('--rate-global', type=float, default=float(os.getenv('RATE_LIMIT_GLOBAL', '0')),
+                        help="Máximo de consultas por minuto hacia el sitio (0 = sin límite).")
+    parser.add_argument('--rate-worker', type=float, default=float(os.getenv('RATE_LIMIT_WORKER', '0')),
+                        help="Máximo de consultas por minuto por worker (0 = sin límite).")
+    parser.add_argument('--prefetch', type=int, default=int(os.getenv('CAPTCHA_PREFETCH', '-1')),
+                        help="Tokens de reCAPTCHA a resolver por adelantado (0 = desactivado; por defecto uno por worker).")
+    parser.add_argument('--motor', choices=['selenium', 'http', 'cdp'], default=os.getenv('MOTOR_CONSULTA', 'selenium'),
+                        help="selenium: navegador Chrome; http: formularios JSF enviados directamente, sin navegador; "
+                             "cdp: Chrome por DevTools con asyncio (--workers es el número de pestañas).")
+    parser.add_argument('--en-vuelo', type=int, default=int(os.getenv('CDP_EN_VUELO', '0')),
+                        help="Con --motor cdp, cédulas procesándose a la vez, incluidas las que esperan el CAPTCHA "
+                             "(por defecto 4 por pestaña).")
+    parser.add_argument('--liviano', action='store_true', default=os.getenv('NAVEGADOR_LIVIANO', '0') == '1',
+                        help="Perfil liviano de Chrome: bloquea imágenes, fuentes y recursos de terceros (no reCAPTCHA) "
+                             "y reutiliza el cache en disco entre navegadores.")
+    parser.add_argument('--force', action='store_true',
+                        help="Consulta de nuevo las cédulas aunque tengan un resultado vigente en el índice.")
+    parser.add_argument('--entrada',
+                        help="Archivo con las cédulas: CSV, texto con una por línea, o '-' para leer de stdin.")
+    parser.add_argument('--columna',
+                        help="Nombre o posición de la columna con la cédula en el CSV (por defecto 'cedula' o la primera).")
+    parser.add_argument('--sin-dedup', action='store_true', default=os.getenv('ENTRADA_DEDUP', '1') == '0',
+                        help="No quita las cédulas repetidas de la entrada: la lectura usa memoria constante y los "
+                             "repetidos sólo se omiten si el checkpoint o el índice ya los registran.")
+    parser.add_argument('--checkpoint', default=os.getenv('CHECKPOINT_FILE'),
+                        help="Diario de progreso para retomar un lote interrumpido "
+                             "(con --entrada, por defecto antecedentes/checkpoint_<archivo>.jsonl).")
+    parser.add_argument('--salida', default=os.getenv('RESULTADOS_SALIDA'),
+                        help="Archivo .jsonl o .csv con un registro por consulta exitosa: cédula, nombre, resultado, "
+                             "fecha de consulta y número de certificado.")
+    parser.add_argument('--sin-pdf', action='store_true', default=os.getenv('GUARDAR_PDF', '1') == '0',
+                        help="No imprime el PDF (ni guarda el HTML con --motor http); útil junto con --salida.")
+    parser.add_argument('--archivo-lote', default=os.getenv('ARTEFACTOS_ARCHIVO'),
+                        help="Guarda los PDFs y capturas del lote dentro de un único .zip, .tar o .tar.gz.")
+    parser.add_argument('--comprimir', action='store_true', default=os.getenv('ARTEFACTOS_COMPRIMIR', '0') == '1',
+                        help="Comprime los artefactos (gzip por archivo, o el .zip/.tar del lote).")
+    parser.add_argument('--dedup', action='store_true', default=os.getenv('ARTEFACTOS_DEDUP', '0') == '1',
+                        help="No vuelve a escribir artefactos con el mismo contenido (SHA-256).")
+    parser.add_argument('--no-interactivo', action='store_true', default=os.getenv('MODO_NO_INTERACTIVO', '0') == '1',
+                        help="Nunca pide resolver el CAPTCHA en la consola: las cédulas sin CAPTCHA automático se difieren "
+                             "(ya es así con --headless, varios workers o sin una consola).")
+    parser.add_argument('--pendientes', default=os.getenv('PENDIENTES_MANUAL'),
+                        help="Diario de cédulas diferidas para CAPTCHA manual (por defecto antecedentes/pendientes_manual.jsonl).")
+    parser.add_argument('--pendientes-al-final', action='store_true',
+                        help="Al terminar el lote, presenta las cédulas diferidas en un navegador visible para resolverlas a mano.")
+    parser.add_argument('--cola', default=os.getenv('COLA_TRABAJOS'),
+                        help="Cola de trabajos compartida por varios workers: archivo SQLite o URL redis://.")
+    comandos = parser.add_mutually_exclusive_group()
+    comandos.add_argument('--validar', action='store_true',
+                          help="Sólo valida la entrada y muestra cuántas cédulas válidas contiene.")
+    comandos.add_argument('--reporte-indice', action='store_true',
+                          help="Muestra el estado del índice de resultados y del cache del sitekey.")
+    comandos.add_argument('--dry-run', action='store_true',
+                          help="Muestra qué cédulas se consultarían y cuáles se omitirían, sin consultar.")
+    comandos.add_argument('--encolar', action='store_true',
+                          help="Agrega las cédulas a la cola de --cola en lugar de consultarlas.")
+    comandos.add_argument('--worker', action='store_true',
+                          help="Consulta las cédulas de la cola de --cola hasta vaciarla (se pueden lanzar varios).")
+    comandos.add_argument('--estado-cola', action='store_true',
+                          help="Muestra el estado de la cola de --cola; con --salida exporta los registros confirmados.")
+    comandos.add_argument('--resolver-pendientes', action='store_true',
+                          help="Presenta las cédulas diferidas una por una en un navegador visible para resolver el CAPTCHA a mano.")
+    comandos.add_argument('--exportar-pendientes', metavar='DIRECTORIO',
+                          help="Copia a DIRECTORIO las capturas de las cédulas diferidas y un pendientes.csv con su detalle.")
+    return parser
+
+
+def reporte_indice(index):
+    resumen = index.resumen()
+    horas = index.ttl / 3600
+    print(f"Índice de resultados: {index.path}")
+    print(f"  Consultas registradas: {resumen['total']} ({resumen['vigentes']} dentro del TTL de {horas:g} h)")
+    for resultado, cantidad in resumen['por_resultado'].items():
+        print(f"    {resultado:<20} {cantidad}")
+    cache = get_sitekey_cache()
+    entrada = cache.get()
+    if entrada:
+        print(f"Cache del sitekey: {entrada['sitekey']} ({entrada['estrategia']}, {entrada['encontrado_en']})")
+    else:
+        print("Cache del sitekey: vacío")
+    metricas = cache.metricas()
+    print(f"  Aciertos: {metricas['aciertos']}, invalidaciones: {metricas['invalidaciones']}")
+
+
+def main(argv=None, headless=False):
+    """
+    Punto de entrada de los scripts y de `python -m consulta_antecedentes`.
+
+    Args:
+        argv: Argumentos de la línea de comandos (por defecto sys.argv)
+        headless: Valor por defecto de --headless
+    """
+    from dotenv import load_dotenv
+
+    # --- Configuración Básica ---
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    load_dotenv()
+    metrics.configure_from_env()
+
+    parser = build_parser(headless)
+    args = parser.parse_args(argv)
+    if args.prefetch < 0:
+        args.prefetch = args.workers
+    trabajos = None
+    if args.encolar or args.worker or args.estado_cola:
+        if not args.cola:
+            parser.error("--encolar, --worker y --estado-cola requieren --cola (o COLA_TRABAJOS)")
+        from .work_queue import open_queue
+        trabajos = open_queue(args.cola)
+
+    index = ResultIndex()
+    try:
+        manuales = ManualQueue(args.pendientes)
+        if args.reporte_indice:
+            reporte_indice(index)
+            return
+        if args.estado_cola:
+            reporte_cola(trabajos, args.salida)
+            return
+        if args.exportar_pendientes:
+            exportadas = manuales.export(args.exportar_pendientes)
+            print(f"Cédulas pendientes de CAPTCHA manual exportadas: {exportadas} en {args.exportar_pendientes}")
+            return
+        if args.resolver_pendientes:
+            resolver_pendientes(args, index, manuales)
+            return
+        if args.worker:
+            run_worker(args, index, trabajos, manuales)
+            return
+
+        # Las cédulas se leen y validan de forma perezosa para soportar entradas grandes
+        if args.entrada:
+            fuente = iter_cedulas(fuente=args.entrada, columna=args.columna, dedup=not args.sin_dedup)
+        else:
+            cedulas_input = ','.join(args.cedulas) or input("Ingrese una o varias cédulas separadas por coma: ").strip()
+            fuente = iter_cedulas([cedulas_input], dedup=not args.sin_dedup)
+
+        if args.validar:
+            validas = sum(1 for _ in fuente)
+            print(f"Cédulas válidas y sin repetir: {validas}")
+            return
+
+        checkpoint_path = args.checkpoint
+        if not checkpoint_path and args.entrada and args.entrada != '-':
+            checkpoint_path = os.path.join('antecedentes', f"checkpoint_{os.path.basename(args.entrada)}.jsonl")
+        checkpoint = None
+        if checkpoint_path:
+            checkpoint = Checkpoint(checkpoint_path)
+            checkpoint.load()
+
+        # Las cédulas ya procesadas en el checkpoint o con un resultado vigente en el índice no se vuelven a consultar
+        omitidas = {'checkpoint': 0, 'indice': 0}
+
+        def pendientes():
+            for cedula in fuente:
+                if checkpoint and cedula in checkpoint:
+                    omitidas['checkpoint'] += 1
+                    continue
+                entrada = None if args.force else index.fresh(cedula)
+                if entrada:
+                    omitidas['indice'] += 1
+                    consultado_en = time.strftime('%Y-%m-%d %H:%M', time.localtime(entrada['consultado_en']))
+                    print(f"Cédula {cedula} con resultado vigente en el índice: {entrada['resultado']} ({consultado_en}) -> {entrada['archivo']}")
+                    continue
+                yield cedula
+
+        cola = pendientes()
+        if args.encolar:
+            agregadas = trabajos.enqueue(cola)
+            print(f"Cédulas agregadas a la cola {args.cola}: {agregadas}")
+            reporte_cola(trabajos)
+        elif args.dry_run:
+            por_consultar = 0
+            for cedula in cola:
+                por_consultar += 1
+                print(f"Se consultaría: {cedula}")
+            print(f"Por consultar: {por_consultar} con el motor {args.motor}")
+            if checkpoint:
+                checkpoint.close()
+        else:
+            primera = next(cola, None)
+            if primera is None and not any(omitidas.values()):
+                print("No se ingresaron cédulas válidas. El programa terminará.")
+            elif primera is None:
+                print("No hay cédulas pendientes por consultar. El programa terminará.")
+            else:
+                run(args, itertools.chain([primera], cola), index, checkpoint, pendientes=manuales)
+        if any(omitidas.values()):
+            print(f"Omitidas: {omitidas['checkpoint']} ya procesadas según el checkpoint, "
+                  f"{omitidas['indice']} con resultado vigente en el índice (use --force para consultarlas de nuevo).")
+    finally:
+        index.close()
+
+
+def reporte_cola(trabajos, salida=None):
+    estado = trabajos.stats()
+    print("Cola de trabajos: " + ", ".join(f"{n} {e}" for e, n in estado['estados'].items()))
+    ahora = time.time()
+    for worker, datos in sorted(estado['workers'].items()):
+        print(f"  {worker:<30} heartbeat hace {ahora - datos['heartbeat_en']:.0f} s, "
+              f"{datos['en_mano']} en mano, {datos['hechas']} hechas")
+    if salida:
+        from .result_record import RecordWriter
+        registros = RecordWriter(salida)
+        for registro in trabajos.iter_registros():
+            registros.write(registro)
+        registros.close()
+        print(f"Registros exportados: {registros.escritos} en {salida}")
+
+
+def resolver_pendientes(args, index, pendientes):
+    """Presenta las cédulas diferidas una por una en un navegador visible para resolver el CAPTCHA a mano."""
+    from .browser import create_driver_pool
+    from .flow import lookup
+    from .result_record import RecordWriter
+
+    entradas = pendientes.pending()
+    if not entradas:
+        print(f"No hay cédulas pendientes de CAPTCHA manual en {pendientes.path}.")
+        return
+    if not sys.stdin.isatty():
+        print(f"Hay {len(entradas)} cédulas pendientes de CAPTCHA manual, pero resolverlas requiere una consola "
+              f"interactiva. Use --exportar-pendientes para revisar sus capturas.")
+        return
+    salida = RecordWriter(args.salida) if args.salida else None
+    resueltas = 0
+    try:
+        with create_driver_pool(size=1, headless=False, liviano=args.liviano) as pool:
+            for numero, entrada in enumerate(entradas, 1):
+                print(f"\n[{numero}/{len(entradas)}] Cédula {entrada['cedula']}, diferida el {entrada['fecha']}: {entrada['error']}")
+                result = lookup(
+                    entrada['cedula'], pool=pool, index=index, headless=False, manual=True, guardar_pdf=not args.sin_pdf,
+                )
+                if result.exitoso:
+                    pendientes.resolve(entrada['cedula'], result.resultado)
+                    resueltas += 1
+                    if salida and result.registro:
+                        salida.write(result.registro)
+    finally:
+        if salida:
+            salida.close()
+        pendientes.close()
+    print(f"Cédulas resueltas a mano: {resueltas} de {len(entradas)}. Siguen pendientes: {len(pendientes.pending())}")
+
+
+def run_worker(args, index, trabajos, pendientes=None):
+    """
+    Consulta las cédulas de la cola hasta que no queden pendientes ni en curso.
+
+    Si sólo quedan cédulas en manos de otros workers se espera con el mismo
+    lote abierto (navegadores, prefetcher y writer siguen vivos): si alguno de
+    ellos se cae, su lease vence y las cédulas vuelven a la cola.
+    """
+    from .work_queue import QueueWorker
+
+    estados = trabajos.stats()['estados']
+    if not estados['pendiente'] and not estados['en_curso']:
+        print(f"No hay cédulas pendientes en la cola {args.cola}.")
+        return
+    worker = QueueWorker(trabajos).start()
+    logging.info(f"Worker {worker.id} consumiendo la cola {args.cola}")
+    try:
+        run(args, None, index, None, worker=worker, pendientes=pendientes)
+    finally:
+        worker.stop()
+    print(worker.report())
+    reporte_cola(trabajos)
+
+
+def run_cdp(args, lotes, index, policy, breaker, writer, guardar):
+    """Consulta los lotes con el motor asíncrono por DevTools, con un solo Chrome; `guardar` procesa cada Result."""
+    import asyncio
+    from .cdp_engine import AsyncEngine
+
+    async def consultar_lote():
+        engine = AsyncEngine(
+            tabs=max(1, args.workers), en_vuelo=args.en_vuelo or None, headless=args.headless,
+            index=index, policy=policy, breaker=breaker, rate_global=args.rate_global,
+            reusar_sesion=os.getenv('CDP_REUSAR_SESION', '1') == '1', writer=writer, guardar_pdf=not args.sin_pdf,
+            liviano=args.liviano,
+        )
+        async with engine:
+            loop = asyncio.get_running_loop()
+            pendientes = iter(lotes)
+            while True:
+                # La espera entre rondas de la cola ocurre en un hilo para no detener el loop
+                cedulas = await loop.run_in_executor(None, next, pendientes, None)
+                if cedulas is None:
+                    break
+                async for result in engine.run(cedulas):
+                    guardar(result)
+        print(engine.reporte_memoria())
+
+    asyncio.run(consultar_lote())
+
+
+def run(args, cedulas, index, checkpoint, worker=None, pendientes=None):
+    """
+    Consulta el lote con el motor elegido e imprime el resumen. Con `worker` confirma cada resultado en la cola.
+
+    Con `worker` las cédulas se toman de la cola en rondas (`cedulas` se
+    ignora) y el pool de navegadores, el prefetcher y el writer duran toda la
+    vida del worker. Las cédulas cuyo CAPTCHA no se resolvió automáticamente
+    se agregan a `pendientes` (ManualQueue) y el lote sigue con las demás.
+    """
+    from .artifacts import ArtifactWriter
+    from .batch import iter_batch, BatchSummary
+    from .result_record import RecordWriter
+    from .captcha_prefetch import TokenPrefetcher
+    from .result_detector import result_stats
+    from .retry_policy import RetryPolicy, CircuitBreaker
+
+    captcha_router = get_captcha_router()
+    workers = max(1, args.workers)
+    # Política de reintentos y circuit breaker compartidos por todos los workers del lote
+    policy = RetryPolicy.from_env()
+    breaker = CircuitBreaker.from_env()
+    # Los PDFs y capturas se escriben en un hilo aparte para devolver antes el navegador
+    writer = ArtifactWriter.from_env(archivo=args.archivo_lote, comprimir=args.comprimir, dedup=args.dedup)
+    if args.motor == 'cdp':
+        # El motor CDP ya resuelve el CAPTCHA sin ocupar pestañas: no usa el prefetcher
+        args.prefetch = 0
+    prefetcher = None
+    if args.prefetch > 0 and captcha_router.solvers:
+        prefetcher = TokenPrefetcher(captcha_router.solve, size=args.prefetch)
+        # Con un sitekey cacheado la resolución arranca antes de abrir el primer navegador
+        cached = get_sitekey_cache().get()
+        if cached:
+            prefetcher.warm(cached['sitekey'], cached['url'])
+    # Sólo se pide el CAPTCHA en la consola con el navegador visible, un solo worker y una persona
+    # frente a ella; en los demás casos la cédula se difiere y el lote sigue
+    interactivo = (args.motor == 'selenium' and not args.headless and workers == 1 and worker is None
+                   and not args.no_interactivo and sys.stdin.isatty())
+    pool = None
+    if args.motor == 'http':
+        from .jsf_client import HttpSessionPool, consultar_antecedentes_http
+        http_pool = HttpSessionPool(size=workers)
+        def consultar(cedula):
+            return consultar_antecedentes_http(
+                cedula, pool=http_pool, prefetcher=prefetcher, index=index, policy=policy, breaker=breaker,
+                writer=writer, guardar_pdf=not args.sin_pdf, base_url=url_webjudicial(), solve=captcha_router.solve,
+            )
+    elif args.motor == 'selenium':
+        from .browser import create_driver_pool
+        from .flow import lookup
+        pool = create_driver_pool(size=workers, headless=args.headless, liviano=args.liviano)
+        pool.start()
+        def consultar(cedula):
+            return lookup(
+                cedula, pool=pool, prefetcher=prefetcher, index=index, headless=args.headless,
+                policy=policy, breaker=breaker, writer=writer, guardar_pdf=not args.sin_pdf, manual=interactivo,
+            )
+    summary = BatchSummary()
+    salida = RecordWriter(args.salida) if args.salida else None
+
+    def guardar(result):
+        summary.add(result)
+        if salida and result.registro:
+            salida.write(result.registro)
+        if pendientes is not None and needs_manual(result):
+            pendientes.defer(result)
+        if checkpoint:
+            checkpoint.mark(result.cedula, result.exitoso, result.error)
+        if worker:
+            worker.ack(result)
+
+    lotes = worker.rondas() if worker else [cedulas]
+    writer.start()
+    try:
+        inicio = time.monotonic()
+        if args.motor == 'cdp':
+            run_cdp(args, lotes, index, policy, breaker, writer, guardar)
+        else:
+            for cedulas in lotes:
+                for result in iter_batch(
+                    cedulas, consultar,
+                    workers=workers, rate_global=args.rate_global, rate_worker=args.rate_worker,
+                ):
+                    guardar(result)
+        writer.close()
+        summary.print(time.monotonic() - inicio)
+        print(result_stats.report())
+        if captcha_router.solvers:
+            print(captcha_router.report())
+        print(breaker.report())
+        print(writer.report())
+        if salida:
+            print(f"Registros estructurados: {salida.escritos} en {salida.path}")
+        if pendientes is not None and pendientes.diferidas:
+            print(f"Cédulas diferidas para CAPTCHA manual: {pendientes.diferidas} en {pendientes.path}. "
+                  f"Resuélvalas con --resolver-pendientes o exporte sus capturas con --exportar-pendientes DIRECTORIO.")
+        metrics.flush()
+    finally:
+        writer.close()
+        if salida:
+            salida.close()
+        if pool:
+            pool.close()
+        if checkpoint:
+            checkpoint.close()
+        if pendientes is not None:
+            pendientes.close()
+        # Sin detener el prefetcher sus hilos seguirían pagando CAPTCHAs hasta que termine el proceso
+        if prefetcher:
+            prefetcher.stop()
+    if args.pendientes_al_final and worker is None and pendientes is not None and pendientes.diferidas:
+        resolver_pendientes(args, index, pendientes)
@@ -0,0 +1,50 @@
+import os
+import threading
+
+DEFAULT_URL = "https://antecedentes.policia.gov.co:7005/WebJudicial/"
+
+_lock = threading.Lock()
+_captcha_router = None
+_sitekey_cache = None
+_cache_slots = None
+
+
+def url_webjudicial():
+    """URL de la página inicial de WebJudicial (URL_WEBJUDICIAL o la del sitio real)."""
+    return os.getenv('URL_WEBJUDICIAL', DEFAULT_URL)
+
+
+def get_captcha_router():
+    """
+    Router de proveedores de CAPTCHA compartido por todo el proceso.
+
+    Se construye en el primer uso (y no al importar el paquete) para que las
+    variables de `.env` ya estén cargadas y para no importar los clientes de
+    los proveedores en comandos que nunca resuelven un CAPTCHA.
+    """
+    global _captcha_router
+    with _lock:
+        if _captcha_router is None:
+            from .captcha_solvers import build_router_from_env
+            _captcha_router = build_router_from_env()
+        return _captcha_router
+
+
+def get_sitekey_cache():
+    """Cache del sitekey compartido por todo el proceso, creado en el primer uso."""
+    global _sitekey_cache
+    with _lock:
+        if _sitekey_cache is None:
+            from .sitekey_cache import SitekeyCache
+            _sitekey_cache = SitekeyCache()
+        return _sitekey_cache
+
+
+def get_cache_slots():
+    """Slots de cache en disco de Chrome compartidos por los navegadores del proceso."""
+    global _cache_slots
+    with _lock:
+        if _cache_slots is None:
+            from .lean_profile import CacheSlots
+            _cache_slots = CacheSlots()
+        return _cache_slots
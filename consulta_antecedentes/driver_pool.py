@@ -0,0 +1,164 @@
+import logging
+import queue
+import threading
+from urllib.parse import urlsplit
+
+from .metrics import metrics
+
+
+class DriverPool:
+    """
+    Pool de navegadores pre-lanzados que se prestan por consulta.
+
+    Lanzar undetected-chromedriver (parcheo del binario + arranque de Chrome)
+    toma varios segundos, así que los navegadores se crean una sola vez y se
+    reutilizan. Cada préstamo verifica la salud del driver y limpia su estado
+    (cookies, storage y navegación a la página inicial); los drivers muertos se
+    reemplazan en segundo plano.
+    """
+
+    def __init__(self, factory, size=1, start_url=None, health_check=None, on_quit=None):
+        """
+        Args:
+            factory: Función sin argumentos que crea un nuevo driver
+            size: Número de navegadores a mantener calientes
+            start_url: URL a la que se navega al prestar un driver
+            health_check: Función driver -> bool para detectar drivers muertos
+            on_quit: Función driver -> None llamada después de cerrar cada driver
+        """
+        self.factory = factory
+        self.size = size
+        self.start_url = start_url
+        self.health_check = health_check or (lambda driver: driver is not None)
+        self.on_quit = on_quit
+        self._idle = queue.Queue()
+        self._all = set()
+        self._lock = threading.Lock()
+        # undetected-chromedriver parchea el mismo binario en cada arranque:
+        # los lanzamientos se serializan para evitar carreras sobre el archivo.
+        self._launch_lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Lanza los navegadores iniciales del pool."""
+        for _ in range(self.size):
+            self._launch()
+        logging.info(f"Pool de navegadores listo con {self.size} instancia(s).")
+
+    def _create(self):
+        """Crea un driver con los lanzamientos serializados. Devuelve None si el pool está cerrado."""
+        with self._launch_lock:
+            if self._closed:
+                return None
+            with metrics.span('inicio_chrome'):
+                driver = self.factory()
+        with self._lock:
+            self._all.add(driver)
+        return driver
+
+    def _launch(self):
+        driver = self._create()
+        if driver is not None:
+            self._idle.put(driver)
+        return driver
+
+    def _launch_in_background(self):
+        def run():
+            try:
+                self._launch()
+            except Exception as e:
+                logging.error(f"No se pudo reemplazar el navegador del pool: {e}")
+                # Se libera un hueco con None para que acquire() reintente el lanzamiento
+                self._idle.put(None)
+        threading.Thread(target=run, name="driver-pool-replace", daemon=True).start()
+
+    def _reset(self, driver):
+        """Limpia cookies y storage y deja el driver en la página inicial."""
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        if self.start_url:
+            parts = urlsplit(self.start_url)
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                'origin': f"{parts.scheme}://{parts.netloc}",
+                'storageTypes': 'all',
+            })
+            driver.get(self.start_url)
+
+    def acquire(self, timeout=None):
+        """
+        Presta un driver sano y con el estado limpio.
+
+        Raises:
+            queue.Empty: Si no hay drivers disponibles dentro del timeout
+        """
+        while True:
+            driver = self._idle.get(timeout=timeout)
+            if driver is None:
+                # Un reemplazo en segundo plano falló: se intenta de nuevo aquí
+                try:
+                    driver = self._create()
+                except Exception:
+                    # El hueco vuelve al pool para que el siguiente acquire reintente
+                    self._idle.put(None)
+                    raise
+                if driver is None:
+                    raise Exception("El pool de navegadores está cerrado")
+            if not self.health_check(driver):
+                logging.warning("Driver del pool no responde. Se reemplaza en segundo plano.")
+                self._drop(driver)
+                continue
+            try:
+                self._reset(driver)
+                return driver
+            except Exception as e:
+                logging.warning(f"No se pudo limpiar el driver del pool: {e}. Se reemplaza en segundo plano.")
+                self._drop(driver)
+
+    def release(self, driver):
+        """Devuelve un driver al pool, o lo reemplaza si ya no está vivo."""
+        with self._lock:
+            # Los drivers ya descartados no vuelven al pool
+            if driver not in self._all:
+                return
+        if self._closed:
+            self._quit(driver)
+        elif self.health_check(driver):
+            self._idle.put(driver)
+        else:
+            logging.warning("Driver devuelto al pool está dañado. Se reemplaza en segundo plano.")
+            self._drop(driver)
+
+    def discard(self, driver):
+        """Descarta un driver prestado y lanza su reemplazo en segundo plano."""
+        if driver is not None:
+            self._drop(driver)
+
+    def _drop(self, driver):
+        with self._lock:
+            self._all.discard(driver)
+        self._quit(driver)
+        if not self._closed:
+            self._launch_in_background()
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.error(f"Error al cerrar el driver: {e}")
+        if self.on_quit:
+            self.on_quit(driver)
+
+    def close(self):
+        """Cierra todos los navegadores del pool."""
+        self._closed = True
+        with self._launch_lock, self._lock:
+            drivers = list(self._all)
+            self._all.clear()
+        for driver in drivers:
+            self._quit(driver)
@@ -0,0 +1,383 @@
+"""
+Flujo de consulta con Selenium, común al modo visible y al modo headless.
+"""
+import json
+import logging
+import sys
+import time
+
+from .browser import (
+    create_driver_pool, extract_recaptcha_sitekey, is_driver_alive,
+    save_error_screenshot, save_result_as_pdf,
+)
+from .config import get_captcha_router
+from .metrics import metrics
+from .navigation import (
+    BOTON_HABILITADO_EXPR, CEDULA_VISIBLE_EXPR, CONSULTA_LISTA_EXPR, INSERTAR_TOKEN_JS, PANTALLA_EXPR,
+    PRELOADER_OCULTO, wait_js,
+)
+from .result_detector import wait_for_result
+from .result_record import TEXTO_RESULTADO_JS, extract_record
+from .retry_policy import (
+    BOTON_DESACTIVADO, NAVEGADOR, SIN_CIRCUITO, TIMEOUT_PAGINA, ConsultaError, RetryPolicy,
+    captcha_timeout, classify_failure, error_de_resultado,
+)
+
+
+class Result:
+    """
+    Resultado de una consulta.
+
+    Es verdadero en contexto booleano si la consulta entregó un veredicto, así
+    que puede usarse donde antes se esperaba el bool de `consultar_antecedentes`.
+    """
+
+    def __init__(self, cedula, exitoso, resultado=None, archivo=None, intentos=0, duracion=0.0, error=None,
+                 registro=None, clase=None, captura=None):
+        self.cedula = cedula
+        self.exitoso = exitoso
+        self.resultado = resultado
+        self.archivo = archivo
+        self.intentos = intentos
+        self.duracion = duracion
+        self.error = error
+        # Datos leídos de la página de resultados (ver result_record.CAMPOS)
+        self.registro = registro
+        # Clase del último fallo (ver retry_policy) y última captura de error, si la consulta falló
+        self.clase = clase
+        self.captura = captura
+
+    def __bool__(self):
+        return self.exitoso
+
+    def __repr__(self):
+        return (f"Result(cedula={self.cedula!r}, exitoso={self.exitoso}, resultado={self.resultado!r}, "
+                f"archivo={self.archivo!r}, intentos={self.intentos}, duracion={self.duracion:.1f})")
+
+
+# Estados de la navegación de una consulta, en orden
+TERMINOS = 'terminos'      # Página inicial con la aceptación de términos
+FORMULARIO = 'formulario'  # Formulario visible con la cédula escrita
+CAPTCHA = 'captcha'        # Token del reCAPTCHA insertado, listo para consultar
+ENVIADO = 'enviado'        # Consulta enviada, esperando la respuesta del sitio
+RESULTADO = 'resultado'    # La página mostró un veredicto
+
+# Segundos, contados desde que el proveedor resolvió el token, durante los que
+# un token insertado y no enviado se reutiliza al reanudar un intento
+# (reCAPTCHA acepta un token durante 120 s)
+TOKEN_VIGENCIA = 100
+
+
+class LookupNavigator:
+    """
+    Máquina de estados de la navegación de una consulta en un driver de Selenium.
+
+    Cada transición espera una condición precisa de la página
+    (navigation.wait_js) en lugar de pausas fijas. `estado` es el último
+    estado alcanzado: si un intento falla, `resume` retoma desde el formulario
+    cuando la página todavía lo muestra, sin recargar ni aceptar los términos
+    otra vez, y reutiliza el token si se insertó pero no se llegó a enviar.
+    """
+
+    def __init__(self, driver, cedula, captcha_router, prefetcher=None, manual=False):
+        self.driver = driver
+        self.cedula = cedula
+        self.captcha_router = captcha_router
+        self.prefetcher = prefetcher
+        # Sin consola interactiva el fallo del CAPTCHA se propaga y la cédula se difiere (ver manual_queue)
+        self.manual = manual
+        # El driver llega del pool limpio y en la página inicial
+        self.estado = TERMINOS
+        self.token = None
+        # time.monotonic() de la resolución del token, no de su inserción
+        self.token_en = 0.0
+        self.resultado = None
+
+    def run(self, timer):
+        """Avanza hasta RESULTADO y devuelve el DetectionResult con el veredicto."""
+        transiciones = {
+            TERMINOS: self._aceptar_terminos,
+            FORMULARIO: self._insertar_captcha,
+            CAPTCHA: self._enviar,
+            ENVIADO: self._esperar_resultado,
+        }
+        while self.estado != RESULTADO:
+            transiciones[self.estado](timer)
+        return self.resultado
+
+    def resume(self):
+        """
+        Prepara un nuevo intento en la misma página.
+
+        Returns:
+            bool: False si la página no respalda el último estado y hay que
+                empezar con un driver limpio del pool
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        if self.estado == TERMINOS or not is_driver_alive(self.driver):
+            return False
+        anterior = self.estado
+        try:
+            if wait_js(self.driver, PANTALLA_EXPR, timeout=5) != 'formulario':
+                return False
+            if not wait_js(self.driver, CEDULA_VISIBLE_EXPR, timeout=5):
+                return False
+            self._escribir_cedula()
+        except WebDriverException as e:
+            logging.warning(f"No se pudo reanudar la consulta en el mismo navegador: {e}")
+            return False
+        if anterior != CAPTCHA:
+            # Después de enviar la consulta el token ya se consumió
+            self.token = None
+        self.estado = FORMULARIO
+        self.resultado = None
+        logging.info(f"Se reanuda la consulta desde el formulario (último estado: '{anterior}').")
+        metrics.incr('reanudaciones', cedula=self.cedula, estado=anterior)
+        return True
+
+    def _escribir_cedula(self):
+        from selenium.webdriver.common.by import By
+
+        campo = self.driver.find_element(By.ID, "cedulaInput")
+        campo.clear()
+        campo.send_keys(self.cedula)
+
+    def _aceptar_terminos(self, timer):
+        from selenium.webdriver.common.by import By
+
+        if not wait_js(self.driver, PRELOADER_OCULTO):
+            raise ConsultaError(TIMEOUT_PAGINA, "La página inicial no terminó de cargar")
+        timer.lap('preloader')
+        pantalla = wait_js(self.driver, PANTALLA_EXPR)
+        if pantalla == 'terminos':
+            self.driver.find_element(By.ID, "aceptaOption:0").click()
+            # El JS de la página habilita 'Enviar' al marcar la aceptación
+            if not wait_js(self.driver, BOTON_HABILITADO_EXPR, timeout=5):
+                logging.warning("El botón 'Enviar' está desactivado. Reiniciando el flujo...")
+                raise ConsultaError(BOTON_DESACTIVADO, "Botón 'Enviar' desactivado")
+            self.driver.find_element(By.ID, "continuarBtn").click()
+        elif pantalla != 'formulario':
+            raise ConsultaError(TIMEOUT_PAGINA, "No apareció la aceptación de términos")
+        if not wait_js(self.driver, CEDULA_VISIBLE_EXPR):
+            raise ConsultaError(TIMEOUT_PAGINA, "No apareció el campo de la cédula")
+        self._escribir_cedula()
+        timer.lap('terminos')
+        self.estado = FORMULARIO
+
+    def _insertar_captcha(self, timer):
+        if self.token is None or time.monotonic() - self.token_en > TOKEN_VIGENCIA:
+            try:
+                self.token, self.token_en = self._resolver_captcha(timer)
+            except Exception as e:
+                if not self.manual:
+                    raise
+                self._modo_manual(e, timer)
+                return
+        self.driver.execute_script(INSERTAR_TOKEN_JS, self.token)
+        if not wait_js(self.driver, CONSULTA_LISTA_EXPR % json.dumps(self.token), timeout=5):
+            raise ConsultaError(TIMEOUT_PAGINA, "El formulario no quedó listo para consultar")
+        logging.info("reCAPTCHA resuelto automáticamente.")
+        self.estado = CAPTCHA
+
+    def _resolver_captcha(self, timer):
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        # Intento automático con los proveedores configurados
+        logging.info("Intentando resolver el reCAPTCHA automáticamente...")
+        if not self.captcha_router.solvers:
+            raise Exception("No hay proveedores de CAPTCHA configurados")
+        sitekey = extract_recaptcha_sitekey(self.driver, WebDriverWait(self.driver, 20))
+        timer.lap('sitekey')
+        # Con pre-resolución el token suele estar ya listo en la cola
+        if self.prefetcher:
+            token, resuelto_en = self.prefetcher.get_timed(sitekey, self.driver.current_url, timeout=captcha_timeout())
+        else:
+            token = self.captcha_router.solve(sitekey, self.driver.current_url)
+            resuelto_en = time.monotonic()
+        timer.lap('captcha')
+        return token, resuelto_en
+
+    def _modo_manual(self, error, timer):
+        # Flujo manual de respaldo: la persona resuelve el CAPTCHA y envía la consulta
+        logging.warning(f"No se pudo resolver el CAPTCHA automáticamente: {error}. Pasando a modo manual.")
+        metrics.incr('modo_manual', cedula=self.cedula)
+        input(
+            "\n❗ MODO MANUAL ACTIVADO:\n"
+            "   1. Resuelve el CAPTCHA en el navegador.\n"
+            "   2. HAZ CLIC en el botón 'Consultar'.\n"
+            "   3. Cuando veas los resultados, presiona 'Enter' aquí para continuar...\n"
+        )
+        timer.lap('captcha_manual')
+        self.estado = ENVIADO
+
+    def _enviar(self, timer):
+        from selenium.webdriver.common.by import By
+
+        self.driver.find_element(By.ID, "j_idt17").click()
+        self.token = None
+        timer.lap('envio')
+        self.estado = ENVIADO
+
+    def _esperar_resultado(self, timer):
+        logging.info("Esperando los resultados de la consulta...")
+        self.resultado = wait_for_result(self.driver)
+        timer.lap('resultado', ok=self.resultado.exitoso)
+        if not self.resultado.exitoso:
+            # CAPTCHA rechazado, error del sitio o sin respuesta: no se guarda un PDF vacío
+            raise error_de_resultado(self.resultado.outcome)
+        self.estado = RESULTADO
+
+
+def lookup(cedula, headless=True, pool=None, prefetcher=None, index=None, policy=None, breaker=None, writer=None,
+           guardar_pdf=True, manual=None):
+    """
+    Consulta los antecedentes de una cédula con reinicios automáticos si el flujo falla.
+
+    Los navegadores se toman prestados de `pool`; si no se indica, se crea
+    uno temporal (visible o headless según `headless`) para esta consulta. Si
+    se pasa un `prefetcher`, el token del reCAPTCHA se toma de su cola de tokens
+    pre-resueltos. Con un `index` (ResultIndex) el resultado queda registrado
+    para no repetir la consulta.
+
+    Cada fallo se clasifica y `policy` (RetryPolicy, por defecto la de
+    MAX_RETRIES) decide si se reintenta y cuánto esperar antes. Con un
+    `breaker` (CircuitBreaker) compartido, los intentos esperan mientras el
+    circuito del lote esté abierto. Los PDFs y capturas se entregan a
+    `writer` (ArtifactWriter del lote) y el navegador vuelve al pool sin
+    esperar la escritura; sin `writer` se escriben en el mismo hilo.
+
+    Los datos de la página de resultados (nombre, certificado, etc.) quedan en
+    `Result.registro`. Con `guardar_pdf=False` no se imprime el PDF, que es uno
+    de los pasos más caros de cada consulta.
+
+    Si el CAPTCHA no se resuelve automáticamente, con `manual` se pide a la
+    persona que lo resuelva en el navegador; sin `manual` el fallo queda en
+    `Result.clase` para diferir la cédula (ver manual_queue). Por defecto el
+    modo manual sólo se usa con el navegador visible y una consola interactiva.
+
+    Returns:
+        Result: veredicto, archivo generado e intentos usados
+    """
+    from selenium.common.exceptions import NoSuchWindowException
+
+    captcha_router = get_captcha_router()
+    if manual is None:
+        manual = not headless and sys.stdin.isatty()
+    reintentos = (policy or RetryPolicy.from_env()).start()
+    breaker = breaker or SIN_CIRCUITO
+    own_pool = pool is None
+    if own_pool:
+        pool = create_driver_pool(size=1, headless=headless)
+
+    inicio_consulta = time.monotonic()
+    intentos = 0
+    result = Result(cedula, False)
+    driver = None
+    nav = None
+
+    try:
+        if own_pool:
+            pool.start()
+
+        # --- BUCLE PRINCIPAL DE REINTENTOS ---
+        while not result.exitoso:
+            intentos += 1
+            error = None
+            if intentos > 1:
+                metrics.incr('reintentos', cedula=cedula)
+            prueba = breaker.wait()
+            timer = metrics.timer(cedula=cedula, intento=intentos)
+
+            try:
+                logging.info(f"--- Iniciando Intento #{intentos} de {reintentos.intentos_max} ---")
+
+                # 1. Se retoma desde el último estado bueno o se toma un driver del pool
+                #    (ya limpio y en la página inicial); uno dañado se reemplaza al devolverlo
+                if nav is not None and nav.resume():
+                    timer.lap('reanudacion')
+                else:
+                    if driver is not None:
+                        pool.release(driver)
+                        driver = None
+                    driver = pool.acquire()
+                    timer.lap('prestamo_driver')
+                    nav = LookupNavigator(driver, cedula, captcha_router, prefetcher, manual=manual)
+
+                # 2. Términos, cédula, CAPTCHA, envío y espera del resultado
+                resultado = nav.run(timer)
+
+                # 3. Registro y PDF
+                texto = driver.execute_script(f"return {TEXTO_RESULTADO_JS}")
+                timer.lap('extraccion')
+
+                filepath = None
+                if guardar_pdf:
+                    # El índice se actualiza cuando el archivo queda escrito, con su hash
+                    registrar = None
+                    if index:
+                        outcome = resultado.outcome
+                        registrar = lambda ruta, sha256: index.record(cedula, outcome, ruta, sha256=sha256)
+                    filepath = save_result_as_pdf(driver, cedula, writer=writer, callback=registrar)
+                    timer.lap('pdf', ok=filepath is not None)
+                elif index:
+                    index.record(cedula, resultado.outcome)
+                result.registro = extract_record(texto, cedula, resultado.outcome, filepath)
+
+                result.exitoso = True # Marcamos como exitoso para salir del bucle
+                result.archivo = filepath
+                result.error = result.clase = None
+                breaker.record(prueba=prueba)
+                print("\n✅ Proceso completado exitosamente.")
+
+            except NoSuchWindowException as e:
+                logging.error(f"NoSuchWindowException capturada en el intento #{intentos}: {e}")
+                metrics.incr('no_such_window', cedula=cedula)
+                result.error = f"NoSuchWindowException: {e}"
+                error = ConsultaError(NAVEGADOR, result.error)
+                # No se puede hacer mucho si la ventana ya no existe, solo pasar al siguiente intento
+            except Exception as e:
+                logging.error(f"Ocurrió un error en el intento #{intentos}: {e}")
+                result.error = str(e)
+                error = e
+                # Guardar screenshot solo si el driver está vivo
+                if driver:
+                    result.captura = save_error_screenshot(driver, cedula, intentos, writer=writer) or result.captura
+
+            if nav is not None and nav.resultado is not None:
+                result.resultado = nav.resultado.outcome
+
+            if error is not None:
+                # Cada clase de fallo tiene su propio presupuesto de reintentos y backoff
+                clase = result.clase = classify_failure(error)
+                breaker.record(clase, prueba)
+                metrics.incr(f'fallo_{clase}', cedula=cedula)
+                espera = reintentos.siguiente(clase)
+                if espera is None:
+                    logging.warning(f"Sin reintentos disponibles para el fallo '{clase}'.")
+                    break
+                logging.info(f"Fallo '{clase}': se reintenta en {espera:.1f} s.")
+                time.sleep(espera)
+    finally:
+        # Devuelve el driver al pool (si quedó dañado se reemplaza en segundo plano) y
+        # cierra el pool propio aunque una excepción escape del bucle de reintentos
+        if driver is not None:
+            pool.release(driver)
+        if own_pool:
+            pool.close()
+
+    result.intentos = intentos
+    result.duracion = time.monotonic() - inicio_consulta
+    metrics.incr('consultas_exitosas' if result.exitoso else 'consultas_fallidas', cedula=cedula)
+    if not result.exitoso:
+        print(f"\n❌ El proceso falló después de {intentos} intentos.")
+    return result
+
+
+def consultar_antecedentes(cedula, pool=None, prefetcher=None, index=None, headless=False, policy=None, breaker=None,
+                           writer=None, guardar_pdf=True, manual=None):
+    """Versión de `lookup` que devuelve sólo si la consulta fue exitosa (interfaz de los scripts)."""
+    return lookup(
+        cedula, headless=headless, pool=pool, prefetcher=prefetcher, index=index, policy=policy, breaker=breaker,
+        writer=writer, guardar_pdf=guardar_pdf, manual=manual,
+    ).exitoso
@@ -0,0 +1,330 @@
+import logging
+import os
+import re
+import time
+from html import unescape
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from .artifacts import default_writer
+from .config import url_webjudicial, get_captcha_router
+from .flow import Result
+from .result_detector import classify_text, DetectionResult, SIN_RESPUESTA, result_stats
+from .metrics import metrics
+from .result_record import extract_record
+from .retry_policy import SIN_CIRCUITO, RetryPolicy, captcha_timeout, classify_failure, error_de_resultado
+
+VIEWSTATE_FIELD = 'javax.faces.ViewState'
+# Cabecera con la que PrimeFaces marca sus envíos AJAX; el servidor responde un <partial-response>
+AJAX_HEADERS = {'Faces-Request': 'partial/ajax', 'X-Requested-With': 'XMLHttpRequest'}
+
+
+class _FormParser(HTMLParser):
+    """Extrae los formularios de una página JSF con sus campos y el texto visible."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms = []
+        self.sitekey = None
+        self._text = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ('script', 'style'):
+            self._skip += 1
+        if attrs.get('data-sitekey') and not self.sitekey:
+            self.sitekey = attrs['data-sitekey']
+        if tag == 'form':
+            self.forms.append({'id': attrs.get('id'), 'action': attrs.get('action'), 'fields': []})
+        elif tag in ('input', 'button', 'textarea', 'select') and self.forms:
+            attrs.setdefault('type', 'submit' if tag == 'button' else 'text')
+            attrs['tag'] = tag
+            self.forms[-1]['fields'].append(attrs)
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style') and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._text.append(data)
+
+    @property
+    def text(self):
+        return ' '.join(self._text)
+
+
+class JSFPage:
+    """Página JSF ya analizada: formularios, sitekey y texto visible."""
+
+    def __init__(self, url, html):
+        self.url = url
+        self.html = html
+        parser = _FormParser()
+        parser.feed(html)
+        self.forms = parser.forms
+        self.sitekey = parser.sitekey
+        self.text = parser.text
+
+    def form_with(self, element_id):
+        """Devuelve el formulario que contiene el elemento con ese id."""
+        for form in self.forms:
+            if any(field.get('id') == element_id for field in form['fields']):
+                return form
+        raise Exception(f"No se encontró el elemento '{element_id}' en la página {self.url}")
+
+    def form_data(self, form, submit_id, values=None):
+        """
+        Arma el cuerpo del POST de un formulario JSF.
+
+        Incluye los campos ocultos (identificador del formulario y ViewState),
+        el botón de envío `submit_id` y los valores indicados en `values`,
+        cuyas claves son ids de elementos.
+        """
+        values = values or {}
+        data = {}
+        for field in form['fields']:
+            name = field.get('name')
+            if not name:
+                continue
+            field_id = field.get('id')
+            if field_id in values:
+                data[name] = values[field_id]
+            elif field['type'] == 'hidden':
+                data[name] = field.get('value', '')
+            elif field_id == submit_id:
+                data[name] = field.get('value', '')
+        return data
+
+
+class HttpSessionPool:
+    """
+    Conexiones HTTP compartidas entre consultas.
+
+    Cada consulta necesita su propia sesión JSF (cookies y ViewState), pero
+    todas reutilizan el mismo pool de conexiones keep-alive hacia el sitio.
+    """
+
+    def __init__(self, size=4):
+        from requests.adapters import HTTPAdapter
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+
+    def new_session(self):
+        import requests
+        session = requests.Session()
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+        session.headers['User-Agent'] = (
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+            '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+        )
+        return session
+
+    def close(self):
+        self.adapter.close()
+
+
+class WebJudicialClient:
+    """
+    Cliente HTTP del flujo JSF de WebJudicial, sin navegador.
+
+    Reproduce los pasos de la versión con Selenium: aceptar términos
+    (`aceptaOption:0` + `continuarBtn`), llenar `cedulaInput`, inyectar el
+    token del reCAPTCHA y enviar con `j_idt17`.
+
+    Los botones se envían como los envía PrimeFaces al hacer clic (petición
+    AJAX parcial con `javax.faces.source`); con `ajax=False` (o `JSF_AJAX=0`)
+    se envía el formulario completo como un POST normal.
+    """
+
+    def __init__(self, base_url, session, timeout=30, ajax=None):
+        self.base_url = base_url
+        self.session = session
+        self.timeout = timeout
+        self.ajax = os.getenv('JSF_AJAX', '1') != '0' if ajax is None else ajax
+        self.viewstate = None
+
+    def _load(self, response):
+        if response.status_code >= 400:
+            # Las páginas de error del sitio también se analizan para clasificar el resultado
+            logging.warning(f"El sitio respondió HTTP {response.status_code} en {response.url}")
+        html = response.text
+        viewstate = None
+        if '<partial-response' in html:
+            html, viewstate = self._apply_partial_response(response.url, html)
+        page = JSFPage(response.url, html)
+        match = re.search(r'name="javax\.faces\.ViewState"[^>]*value="([^"]*)"', html)
+        if match:
+            self.viewstate = unescape(match.group(1))
+        # La actualización del ViewState manda sobre el campo que quedó dentro de los fragmentos
+        if viewstate is not None:
+            self.viewstate = viewstate
+        return page
+
+    def _apply_partial_response(self, url, xml):
+        """
+        Procesa una respuesta AJAX de JSF: sigue redirecciones o junta los fragmentos actualizados.
+
+        Returns:
+            tuple: (HTML de los fragmentos, ViewState actualizado o None)
+        """
+        redirect = re.search(r'<redirect url="([^"]+)"', xml)
+        if redirect:
+            return self._load(self.session.get(urljoin(url, unescape(redirect.group(1))), timeout=self.timeout)).html, None
+        fragments = []
+        viewstate = None
+        for update_id, content in re.findall(r'<update id="([^"]+)"><!\[CDATA\[(.*?)\]\]></update>', xml, re.S):
+            if VIEWSTATE_FIELD in update_id:
+                viewstate = content
+            else:
+                fragments.append(content)
+        return '\n'.join(fragments), viewstate
+
+    def get(self, url):
+        return self._load(self.session.get(url, timeout=self.timeout))
+
+    def submit(self, page, form, data, source=None):
+        """Envía el formulario; `source` es el id del botón que dispara el envío AJAX."""
+        if self.viewstate is not None:
+            data[VIEWSTATE_FIELD] = self.viewstate
+        headers = None
+        if self.ajax and source:
+            data.update({
+                'javax.faces.partial.ajax': 'true',
+                'javax.faces.source': source,
+                'javax.faces.partial.execute': '@all',
+                'javax.faces.partial.render': '@all',
+            })
+            headers = AJAX_HEADERS
+        action = urljoin(page.url, form['action'] or page.url)
+        return self._load(self.session.post(action, data=data, headers=headers, timeout=self.timeout))
+
+    def accept_terms(self):
+        """Abre la página inicial y acepta los términos. Devuelve la página del formulario."""
+        page = self.get(self.base_url)
+        form = page.form_with('continuarBtn')
+        acepta = next(f for f in form['fields'] if f.get('id') == 'aceptaOption:0')
+        data = page.form_data(form, 'continuarBtn', {'aceptaOption:0': acepta.get('value', 'true')})
+        return self.submit(page, form, data, source='continuarBtn')
+
+    def submit_cedula(self, page, cedula, token):
+        """Envía la cédula con el token del reCAPTCHA y devuelve la página de resultados."""
+        form = page.form_with('cedulaInput')
+        data = page.form_data(form, 'j_idt17', {'cedulaInput': cedula})
+        data['g-recaptcha-response'] = token
+        return self.submit(page, form, data, source='j_idt17')
+
+
+def save_result_as_html(page, cedula, writer=None, callback=None):
+    """Guarda la página de resultados como HTML en la carpeta 'antecedentes'. Devuelve la ruta o None."""
+    writer = writer or default_writer()
+    try:
+        filepath = writer.submit(
+            "antecedentes", f"antecedentes_{cedula}.html", data=page.html.encode('utf-8'), callback=callback,
+        )
+        logging.info(f"Antecedentes de la cédula {cedula} enviados a guardar en: {filepath}")
+        return filepath
+    except Exception as e:
+        logging.error(f"No se pudo guardar el archivo HTML: {e}")
+        return None
+
+
+def consultar_antecedentes_http(cedula, headless=True, pool=None, prefetcher=None, index=None, policy=None, breaker=None,
+                                writer=None, guardar_pdf=True, manual=None, base_url=None, solve=None):
+    """
+    Consulta los antecedentes enviando los formularios JSF directamente por HTTP.
+
+    Tiene la misma firma y el mismo resultado que `lookup`, así que puede usarse
+    en su lugar. Las diferencias: `pool` es un HttpSessionPool, el resultado se
+    guarda como HTML (no hay navegador para imprimir un PDF) y `headless` y
+    `manual` se aceptan pero no tienen efecto, porque no hay navegador ni modo
+    manual para el CAPTCHA.
+
+    Args:
+        cedula: Número de cédula a consultar
+        headless: Sin efecto; se acepta por compatibilidad con `lookup`
+        pool: HttpSessionPool con las conexiones compartidas
+        prefetcher: TokenPrefetcher opcional con tokens pre-resueltos
+        index: ResultIndex opcional donde registrar el resultado
+        policy: RetryPolicy que decide los reintentos (por defecto la de MAX_RETRIES)
+        breaker: CircuitBreaker compartido por el lote
+        writer: ArtifactWriter del lote que escribe el HTML en segundo plano
+        guardar_pdf: False para quedarse sólo con el registro estructurado (sin HTML)
+        manual: Sin efecto; se acepta por compatibilidad con `lookup`
+        base_url: URL de la página inicial (por defecto URL_WEBJUDICIAL)
+        solve: Función (sitekey, url) -> token (por defecto el router de proveedores de CAPTCHA)
+
+    Returns:
+        Result: verdadero si se obtuvo un veredicto; `registro` lleva los datos de la página
+    """
+    pool = pool or HttpSessionPool(size=1)
+    base_url = base_url or url_webjudicial()
+    solve = solve or get_captcha_router().solve
+    reintentos = (policy or RetryPolicy.from_env()).start()
+    breaker = breaker or SIN_CIRCUITO
+    inicio_consulta = time.monotonic()
+    result = Result(cedula, False)
+    intento = 0
+    while True:
+        intento += 1
+        logging.info(f"--- Iniciando Intento HTTP #{intento} de {reintentos.intentos_max} ---")
+        if intento > 1:
+            metrics.incr('reintentos', cedula=cedula, motor='http')
+        prueba = breaker.wait()
+        timer = metrics.timer(cedula=cedula, intento=intento, motor='http')
+        session = pool.new_session()
+        try:
+            client = WebJudicialClient(base_url, session)
+            page = client.accept_terms()
+            timer.lap('terminos')
+            if not page.sitekey:
+                raise Exception("No se encontró el sitekey del reCAPTCHA en el formulario")
+            if prefetcher:
+                token = prefetcher.get(page.sitekey, page.url, timeout=captcha_timeout())
+            else:
+                token = solve(page.sitekey, page.url)
+            timer.lap('captcha')
+            inicio = time.monotonic()
+            page = client.submit_cedula(page, cedula, token)
+            outcome, marcador = classify_text(page.text) or (SIN_RESPUESTA, None)
+            resultado = DetectionResult(outcome, time.monotonic() - inicio, marcador)
+            result_stats.record(resultado)
+            timer.lap('resultado', ok=resultado.exitoso)
+            logging.info(f"Resultado detectado: {outcome} en {resultado.elapsed:.1f} s")
+            if not resultado.exitoso:
+                raise error_de_resultado(outcome)
+            filepath = None
+            if guardar_pdf:
+                registrar = None
+                if index:
+                    registrar = lambda ruta, sha256: index.record(cedula, outcome, ruta, sha256=sha256)
+                filepath = save_result_as_html(page, cedula, writer=writer, callback=registrar)
+                timer.lap('guardar', ok=filepath is not None)
+            elif index:
+                index.record(cedula, outcome)
+            result.exitoso, result.resultado, result.archivo, result.error, result.clase = True, outcome, filepath, None, None
+            result.registro = extract_record(page.text, cedula, outcome, filepath)
+            breaker.record(prueba=prueba)
+            metrics.incr('consultas_exitosas', cedula=cedula, motor='http')
+            print("\n✅ Proceso completado exitosamente.")
+            break
+        except Exception as e:
+            # La sesión no se cierra explícitamente: cerrarla cerraría también el pool compartido
+            logging.error(f"Ocurrió un error en el intento HTTP #{intento}: {e}")
+            result.error = str(e)
+            clase = result.clase = classify_failure(e)
+            breaker.record(clase, prueba)
+            metrics.incr(f'fallo_{clase}', cedula=cedula, motor='http')
+            espera = reintentos.siguiente(clase)
+            if espera is None:
+                logging.warning(f"Sin reintentos disponibles para el fallo '{clase}'.")
+                break
+            logging.info(f"Fallo '{clase}': se reintenta en {espera:.1f} s.")
+            time.sleep(espera)
+    result.intentos = intento
+    result.duracion = time.monotonic() - inicio_consulta
+    if not result.exitoso:
+        metrics.incr('consultas_fallidas', cedula=cedula, motor='http')
+        print(f"\n❌ El proceso falló después de {intento} intentos.")
+    return result
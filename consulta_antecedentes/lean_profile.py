@@ -0,0 +1,149 @@
+"""
+Perfil liviano de Chrome para las consultas.
+
+La consulta sólo necesita el HTML de WebJudicial, sus scripts y reCAPTCHA: las
+imágenes, fuentes y recursos de terceros (analítica, publicidad, fuentes web)
+se bloquean con `Network.setBlockedURLs`, y el cache en disco se guarda fuera
+del perfil temporal para que los navegadores siguientes del pool lo hereden.
+"""
+import fnmatch
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+
+from .config import url_webjudicial
+
+# Imágenes, fuentes y multimedia del propio sitio
+EXTENSIONES_BLOQUEADAS = (
+    'png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'ico', 'bmp',
+    'woff', 'woff2', 'ttf', 'otf', 'eot', 'mp4', 'webm', 'mp3',
+)
+
+# Terceros que no intervienen en la consulta
+DOMINIOS_BLOQUEADOS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'facebook.net', 'facebook.com/tr', 'hotjar.com', 'clarity.ms',
+    'fonts.googleapis.com', 'fonts.gstatic.com', 'youtube.com', 'ytimg.com',
+)
+
+# URLs representativas de lo que carga el widget de reCAPTCHA (incluidas sus
+# imágenes del desafío). setBlockedURLs no tiene reglas de excepción, así que
+# se descarta cualquier patrón que alcance alguna de ellas.
+RECAPTCHA_PERMITIDAS = (
+    'https://www.google.com/recaptcha/api.js?hl=es',
+    'https://www.google.com/recaptcha/api2/anchor?ar=1&k=sitekey&hl=es',
+    'https://www.google.com/recaptcha/api2/bframe?hl=es&k=sitekey',
+    'https://www.google.com/recaptcha/api2/payload?p=x&k=sitekey',
+    'https://www.gstatic.com/recaptcha/releases/v1/recaptcha__es.js',
+    'https://www.gstatic.com/recaptcha/api2/logo_48.png',
+    'https://www.gstatic.com/recaptcha/api2/refresh_2x.png',
+    'https://www.recaptcha.net/recaptcha/api.js',
+)
+
+# Flags que evitan tráfico y trabajo de Chrome que no aporta a la consulta
+CHROME_ARGS_LIVIANO = (
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-domain-reliability',
+    '--disable-client-side-phishing-detection',
+    '--disable-features=Translate,OptimizationHints,MediaRouter',
+    '--metrics-recording-only',
+    '--no-pings',
+    '--mute-audio',
+)
+
+
+def lean_enabled():
+    """True si NAVEGADOR_LIVIANO=1."""
+    return os.getenv('NAVEGADOR_LIVIANO', '0') == '1'
+
+
+def blocked_patterns(url=None):
+    """
+    Patrones para `Network.setBlockedURLs` (comodín `*`).
+
+    Las extensiones bloqueadas se limitan al host del sitio (`url` o
+    URL_WEBJUDICIAL) y se agregan los patrones de LEAN_BLOQUEAR, separados por
+    comas. Los que bloquearían reCAPTCHA se descartan con una advertencia.
+    """
+    host = urlsplit(url or url_webjudicial()).netloc
+    patrones = [f"*{host}/*.{ext}*" for ext in EXTENSIONES_BLOQUEADAS]
+    patrones += [f"*{dominio}*" for dominio in DOMINIOS_BLOQUEADOS]
+    patrones += [p.strip() for p in os.getenv('LEAN_BLOQUEAR', '').split(',') if p.strip()]
+    permitidos = []
+    for patron in patrones:
+        afectadas = [u for u in RECAPTCHA_PERMITIDAS if fnmatch.fnmatchcase(u, patron)]
+        if afectadas:
+            logging.warning(f"Se ignora el patrón '{patron}': bloquearía reCAPTCHA ({afectadas[0]}).")
+            continue
+        permitidos.append(patron)
+    return permitidos
+
+
+def apply_blocking(send, url=None):
+    """
+    Activa el bloqueo en un target. `send(method, params)` es
+    `driver.execute_cdp_cmd` o el `send` de una pestaña CDP.
+    """
+    patrones = blocked_patterns(url)
+    send('Network.enable', {})
+    send('Network.setBlockedURLs', {'urls': patrones})
+    return patrones
+
+
+class CacheSlots:
+    """
+    Directorios de cache en disco que se heredan entre navegadores.
+
+    Dos procesos de Chrome no pueden usar el mismo cache a la vez, así que cada
+    navegador vivo toma un subdirectorio libre (`slot_<n>`) y lo devuelve al
+    cerrarse; el que lo toma después arranca con el cache ya caliente. En
+    sistemas con `fcntl` un bloqueo de archivo coordina también a varios
+    procesos del proyecto en la misma máquina (por ejemplo, workers de la cola).
+    """
+
+    def __init__(self, base=None):
+        self.base = base or os.getenv('CHROME_CACHE_DIR', '.chrome_cache')
+        self._lock = threading.Lock()
+        self._en_uso = {}
+
+    def acquire(self):
+        """Toma un slot libre y devuelve su ruta absoluta."""
+        with self._lock:
+            n = 0
+            while True:
+                ruta = os.path.abspath(os.path.join(self.base, f"slot_{n}"))
+                if ruta not in self._en_uso:
+                    os.makedirs(ruta, exist_ok=True)
+                    bloqueo = self._bloquear(ruta)
+                    if bloqueo is not None:
+                        self._en_uso[ruta] = bloqueo
+                        return ruta
+                n += 1
+
+    @staticmethod
+    def _bloquear(ruta):
+        f = open(os.path.join(ruta, '.lock'), 'w')
+        try:
+            import fcntl
+        except ImportError:
+            # Sin fcntl sólo se coordinan los navegadores de este proceso
+            return f
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None
+        return f
+
+    def release(self, ruta):
+        if not ruta:
+            return
+        with self._lock:
+            bloqueo = self._en_uso.pop(ruta, None)
+        if bloqueo is not None:
+            bloqueo.close()
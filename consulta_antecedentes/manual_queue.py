@@ -0,0 +1,138 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+from .artifacts import read_artifact
+from .retry_policy import CAPTCHA, CONFIGURACION
+
+# Fallos que una persona puede destrabar resolviendo el CAPTCHA en un navegador visible
+CLASES_MANUALES = (CAPTCHA, CONFIGURACION)
+
+
+def needs_manual(result):
+    """True si la consulta falló por el CAPTCHA y debe quedar para resolución manual."""
+    return not result.exitoso and getattr(result, 'clase', None) in CLASES_MANUALES
+
+
+class ManualQueue:
+    """
+    Cédulas cuyo CAPTCHA no se pudo resolver automáticamente.
+
+    En lugar de detener el lote esperando a una persona, la cédula se agrega a
+    este diario (JSON lines de sólo agregado, como el Checkpoint) y el lote
+    sigue. Después se resuelven una por una en un navegador visible
+    (`--resolver-pendientes`) o se exportan sus capturas de error
+    (`--exportar-pendientes`); cada cédula resuelta agrega una línea que la
+    saca de la lista.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('PENDIENTES_MANUAL', os.path.join('antecedentes', 'pendientes_manual.jsonl'))
+        self.diferidas = 0
+        self._lock = threading.Lock()
+        self._pendientes = None
+        self._file = None
+
+    def _cargar(self):
+        pendientes = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for numero, linea in enumerate(f, 1):
+                    try:
+                        entrada = json.loads(linea)
+                        cedula = str(entrada['cedula'])
+                    except (ValueError, KeyError):
+                        logging.warning(f"Línea {numero} de {self.path} inválida; se ignora.")
+                        continue
+                    if entrada.get('evento') == 'resuelta':
+                        pendientes.pop(cedula, None)
+                    else:
+                        pendientes[cedula] = entrada
+        except FileNotFoundError:
+            pass
+        return pendientes
+
+    def _agregar(self, entrada):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def defer(self, result):
+        """Agrega la cédula de un Result fallido por el CAPTCHA."""
+        entrada = {
+            'cedula': str(result.cedula), 'evento': 'diferida', 'clase': result.clase, 'error': result.error,
+            'captura': getattr(result, 'captura', None), 'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with self._lock:
+            if self._pendientes is None:
+                self._pendientes = self._cargar()
+            self._agregar(entrada)
+            self._pendientes[entrada['cedula']] = entrada
+            self.diferidas += 1
+        logging.warning(f"Cédula {result.cedula} diferida para resolver el CAPTCHA a mano ({self.path}).")
+
+    def resolve(self, cedula, resultado):
+        """Saca la cédula de las pendientes tras resolverla a mano."""
+        with self._lock:
+            if self._pendientes is None:
+                self._pendientes = self._cargar()
+            self._agregar({
+                'cedula': str(cedula), 'evento': 'resuelta', 'resultado': resultado,
+                'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+            self._pendientes.pop(str(cedula), None)
+
+    def pending(self):
+        """Entradas de las cédulas diferidas y aún sin resolver, en el orden en que se difirieron."""
+        with self._lock:
+            if self._pendientes is None:
+                self._pendientes = self._cargar()
+            return list(self._pendientes.values())
+
+    def export(self, directorio):
+        """
+        Copia las capturas de error de las pendientes a `directorio` y escribe
+        `pendientes.csv` con la cédula, el error y la captura de cada una.
+
+        Returns:
+            int: Cédulas exportadas
+        """
+        os.makedirs(directorio, exist_ok=True)
+        pendientes = self.pending()
+        with open(os.path.join(directorio, 'pendientes.csv'), 'w', encoding='utf-8', newline='') as f:
+            filas = csv.DictWriter(f, fieldnames=('cedula', 'clase', 'error', 'fecha', 'captura'), extrasaction='ignore')
+            filas.writeheader()
+            for entrada in pendientes:
+                fila = dict(entrada)
+                if entrada.get('captura'):
+                    fila['captura'] = self._copiar_captura(entrada, directorio)
+                filas.writerow(fila)
+        return len(pendientes)
+
+    @staticmethod
+    def _copiar_captura(entrada, directorio):
+        try:
+            data = read_artifact(entrada['captura'])
+        except OSError as e:
+            logging.warning(f"No se encontró la captura de la cédula {entrada['cedula']}: {e}")
+            return None
+        if entrada['captura'].endswith('.gz'):
+            data = gzip.decompress(data)
+        nombre = f"pendiente_{entrada['cedula']}.png"
+        with open(os.path.join(directorio, nombre), 'wb') as f:
+            f.write(data)
+        return nombre
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
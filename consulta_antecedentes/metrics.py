@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (en segundos) de los buckets de los histogramas por etapa
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value):
+        for i, limite in enumerate(BUCKETS):
+            if value <= limite:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.n += 1
+
+
+class Metrics:
+    """
+    Registro de tiempos por etapa y contadores del flujo de consulta.
+
+    Cada etapa medida se agrega a un histograma y, si se configuró
+    `jsonl_path`, se escribe como una línea JSON con la cédula, la etapa, la
+    duración y si terminó bien. Los histogramas y contadores se pueden exportar
+    en formato de texto de Prometheus a un archivo o por HTTP.
+    """
+
+    def __init__(self, jsonl_path=None, prom_path=None):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._jsonl = None
+
+    def configure_from_env(self):
+        """Activa las salidas indicadas en METRICAS_JSONL, METRICAS_PROM_FILE y METRICAS_PROM_PORT."""
+        self.jsonl_path = os.getenv('METRICAS_JSONL', self.jsonl_path)
+        self.prom_path = os.getenv('METRICAS_PROM_FILE', self.prom_path)
+        port = os.getenv('METRICAS_PROM_PORT')
+        if port:
+            self.serve(int(port))
+
+    def _emit(self, record):
+        if not self.jsonl_path:
+            return
+        with self._lock:
+            if self._jsonl is None:
+                self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8')
+            self._jsonl.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._jsonl.flush()
+
+    def observe(self, etapa, segundos, ok=True, **labels):
+        """Registra la duración de una etapa."""
+        motor = labels.get('motor', 'selenium')
+        with self._lock:
+            self._histograms.setdefault((etapa, motor), _Histogram()).observe(segundos)
+        self._emit({'ts': time.time(), 'tipo': 'etapa', 'etapa': etapa, 'segundos': round(segundos, 4), 'ok': ok, **labels})
+
+    def incr(self, contador, n=1, **labels):
+        """Incrementa un contador (reintentos, modo manual, NoSuchWindowException...)."""
+        with self._lock:
+            self._counters[contador] = self._counters.get(contador, 0) + n
+        self._emit({'ts': time.time(), 'tipo': 'contador', 'contador': contador, 'n': n, **labels})
+
+    @contextmanager
+    def span(self, etapa, **labels):
+        """Mide la duración del bloque como una etapa; si lanza una excepción se marca ok=False."""
+        inicio = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.observe(etapa, time.monotonic() - inicio, ok=False, **labels)
+            raise
+        self.observe(etapa, time.monotonic() - inicio, **labels)
+
+    def timer(self, **labels):
+        """Crea un StageTimer para medir etapas consecutivas de una consulta."""
+        return StageTimer(self, labels)
+
+    def prometheus(self):
+        """Devuelve los histogramas y contadores en formato de texto de Prometheus."""
+        lines = [
+            "# HELP antecedentes_etapa_segundos Duración de cada etapa de la consulta.",
+            "# TYPE antecedentes_etapa_segundos histogram",
+        ]
+        with self._lock:
+            for (etapa, motor), hist in sorted(self._histograms.items()):
+                labels = f'etapa="{etapa}",motor="{motor}"'
+                acumulado = 0
+                for limite, count in zip(BUCKETS, hist.counts):
+                    acumulado += count
+                    lines.append(f'antecedentes_etapa_segundos_bucket{{{labels},le="{limite}"}} {acumulado}')
+                lines.append(f'antecedentes_etapa_segundos_bucket{{{labels},le="+Inf"}} {hist.n}')
+                lines.append(f'antecedentes_etapa_segundos_sum{{{labels}}} {hist.total:.6f}')
+                lines.append(f'antecedentes_etapa_segundos_count{{{labels}}} {hist.n}')
+            for contador, valor in sorted(self._counters.items()):
+                lines.append(f"# TYPE antecedentes_{contador}_total counter")
+                lines.append(f"antecedentes_{contador}_total {valor}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Escribe el archivo de Prometheus, si está configurado."""
+        if not self.prom_path:
+            return
+        tmp_path = f"{self.prom_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, self.prom_path)
+
+    def serve(self, port):
+        """Expone /metrics en formato Prometheus desde un hilo de fondo."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registro = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                data = registro.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+        threading.Thread(target=server.serve_forever, name="metricas-http", daemon=True).start()
+        logging.info(f"Métricas Prometheus disponibles en http://localhost:{port}/metrics")
+        return server
+
+
+class StageTimer:
+    """
+    Mide etapas consecutivas de una consulta.
+
+    Cada llamada a `lap(etapa)` registra el tiempo transcurrido desde la
+    etapa anterior (o desde la creación del timer).
+    """
+
+    def __init__(self, metrics, labels):
+        self.metrics = metrics
+        self.labels = labels
+        self._inicio = time.monotonic()
+
+    def lap(self, etapa, ok=True):
+        ahora = time.monotonic()
+        self.metrics.observe(etapa, ahora - self._inicio, ok=ok, **self.labels)
+        self._inicio = ahora
+
+
+def process_tree_rss_mb(pid=None):
+    """
+    RSS en MB de un proceso y todos sus descendientes (Chrome, chromedriver y sus renderers).
+
+    Usa psutil si está instalado; si no, recorre /proc (Linux). Devuelve None
+    si no hay forma de medirlo en el sistema.
+    """
+    pid = pid or os.getpid()
+    try:
+        import psutil
+    except ImportError:
+        return _proc_tree_rss_mb(pid)
+    try:
+        proc = psutil.Process(pid)
+        procs = [proc] + proc.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for p in procs:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def _proc_tree_rss_mb(pid):
+    if not os.path.isdir('/proc'):
+        return None
+    hijos = {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as f:
+                # El nombre del proceso va entre paréntesis y puede tener espacios
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        hijos.setdefault(ppid, []).append(int(entrada))
+    total_kb = 0
+    pendientes = [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        pendientes.extend(hijos.get(actual, []))
+        try:
+            with open(f'/proc/{actual}/status') as f:
+                for linea in f:
+                    if linea.startswith('VmRSS:'):
+                        total_kb += int(linea.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+# Registro compartido por todos los módulos; las salidas se activan con configure_from_env()
+metrics = Metrics()
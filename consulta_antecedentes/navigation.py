@@ -0,0 +1,101 @@
+"""
+Esperas precisas sobre las páginas de WebJudicial, comunes a Selenium y CDP.
+
+Cada espera es una promesa que corre en la página: revisa la condición en cada
+mutación del DOM con un MutationObserver y se resuelve en cuanto se cumple, en
+lugar de pausas fijas o de sondear desde Python.
+"""
+import logging
+import time
+
+# Promesa que se resuelve con el primer valor verdadero de la expresión, revisándola
+# en cada mutación del DOM, o con null al vencer el timeout. Si la expresión falla
+# en la primera revisión la promesa se rechaza: es un error del script, no del sitio.
+ESPERAR_JS = """
+new Promise((resolve, reject) => {
+    const revisar = (estricto) => { try { return (%s); } catch (e) { if (estricto) throw e; return null; } };
+    let inicial;
+    try { inicial = revisar(true); } catch (e) { reject(e); return; }
+    if (inicial) { resolve(inicial); return; }
+    let timer = null;
+    const observer = new MutationObserver(() => {
+        const valor = revisar();
+        if (valor) { observer.disconnect(); clearTimeout(timer); resolve(valor); }
+    });
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    timer = setTimeout(() => { observer.disconnect(); resolve(revisar() || null); }, %d);
+})
+"""
+
+PRELOADER_OCULTO = (
+    "(() => { const p = document.querySelector('.preloader');"
+    " return document.readyState !== 'loading' && (!p || getComputedStyle(p).display === 'none'"
+    " || getComputedStyle(p).visibility === 'hidden' || p.getClientRects().length === 0); })()"
+)
+
+PANTALLA_EXPR = (
+    "document.getElementById('cedulaInput') ? 'formulario'"
+    " : (document.getElementById('aceptaOption:0') ? 'terminos' : null)"
+)
+
+BOTON_HABILITADO_EXPR = "(() => { const b = document.getElementById('continuarBtn'); return b && !b.disabled; })()"
+
+CEDULA_VISIBLE_EXPR = "(() => { const c = document.getElementById('cedulaInput'); return c && c.offsetParent !== null; })()"
+
+# Con %s = token en JSON: el token quedó en el campo y el botón de consulta se puede usar
+CONSULTA_LISTA_EXPR = (
+    "(() => { const r = document.getElementById('g-recaptcha-response'); const b = document.getElementById('j_idt17');"
+    " return !!r && r.value === %s && !!b && !b.disabled; })()"
+)
+
+INSERTAR_TOKEN_JS = (
+    "const r = document.getElementById('g-recaptcha-response');"
+    " r.style.display = 'block'; r.value = arguments[0]; r.dispatchEvent(new Event('change'));"
+)
+
+
+def wait_js(driver, expression, timeout=20):
+    """
+    Espera en la página de un driver de Selenium a que `expression` sea verdadera.
+
+    Usa `execute_async_script` con ESPERAR_JS. Si la página navega mientras
+    se espera, el script se pierde con el documento y se vuelve a lanzar en el
+    nuevo. Un error de la propia expresión se propaga de inmediato en lugar de
+    parecer un sitio lento.
+
+    Returns:
+        El valor de la expresión, o None si venció el timeout
+    """
+    from selenium.common.exceptions import (
+        JavascriptException, ScriptTimeoutException, StaleElementReferenceException, TimeoutException,
+    )
+
+    limite = time.monotonic() + timeout
+    while True:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return None
+        # El timeout de scripts del driver debe cubrir la espera completa
+        if getattr(driver, 'script_timeout_espera', 0) < restante + 5:
+            driver.set_script_timeout(restante + 5)
+            driver.script_timeout_espera = restante + 5
+        try:
+            valor = driver.execute_async_script(
+                "const listo = arguments[arguments.length - 1];"
+                f" ({ESPERAR_JS % (expression, int(restante * 1000))})"
+                ".then(listo, (e) => listo({error_espera: String(e)}));"
+            )
+        except JavascriptException as e:
+            # chromedriver informa la navegación como un error de JavaScript
+            if 'document unloaded' not in str(e):
+                raise
+            logging.debug(f"Reintentando la espera tras una navegación: {e}")
+            time.sleep(0.1)
+            continue
+        except (TimeoutException, ScriptTimeoutException, StaleElementReferenceException) as e:
+            logging.debug(f"Reintentando la espera tras una navegación: {e}")
+            time.sleep(0.1)
+            continue
+        if isinstance(valor, dict) and 'error_espera' in valor:
+            raise JavascriptException(f"La expresión de espera falló: {valor['error_espera']}")
+        return valor
@@ -0,0 +1,177 @@
+import json
+import logging
+import threading
+import time
+import unicodedata
+
+from .navigation import wait_js
+
+# --- Posibles resultados de una consulta ---
+ENCONTRADO = 'encontrado'                # La persona registra antecedentes
+NO_ENCONTRADO = 'no_encontrado'          # La persona no registra antecedentes
+ERROR_SITIO = 'error_sitio'              # El sitio mostró un error
+CAPTCHA_RECHAZADO = 'captcha_rechazado'  # El sitio no aceptó el token del reCAPTCHA
+SIN_RESPUESTA = 'sin_respuesta'          # No apareció ningún resultado dentro del timeout
+
+# Textos (en minúsculas y sin tildes) que identifican cada resultado en la página.
+# Se evalúan en este orden: los mensajes de "no registra" contienen la palabra
+# "registra", así que deben revisarse antes que los de ENCONTRADO.
+MARCADORES = [
+    (NO_ENCONTRADO, [
+        'no tiene asuntos pendientes con las autoridades judiciales',
+        'no es requerido por autoridad judicial',
+        'no registra antecedentes',
+    ]),
+    (ENCONTRADO, [
+        'tiene asuntos pendientes con las autoridades judiciales',
+        'registra antecedentes',
+        'es requerido por autoridad judicial',
+    ]),
+    (CAPTCHA_RECHAZADO, [
+        'captcha invalido',
+        'captcha no valido',
+        'debe validar el captcha',
+    ]),
+    (ERROR_SITIO, [
+        'servicio no disponible',
+        'intente mas tarde',
+        'ha ocurrido un error',
+        'error interno',
+    ]),
+]
+
+# Recuadro donde el sitio escribe el veredicto (el mismo que lee result_record.TEXTO_RESULTADO_JS)
+CONTENEDOR_RESULTADO = '[id$="mensajeCiudadano"]'
+# Mensajes de PrimeFaces donde llegan el rechazo del CAPTCHA y los errores del sitio
+CONTENEDOR_MENSAJES = '.ui-messages, .ui-message, .ui-growl, .ui-messages-error'
+
+# Los veredictos sólo se buscan en el recuadro de resultados y los errores en los
+# mensajes: así el texto fijo de la página no se confunde con la respuesta antes
+# de que llegue la actualización AJAX. Una página sin formulario (una página de
+# error del servidor) se revisa completa.
+_CLASIFICAR_JS = """
+const [marcadores_por_resultado, contenedor, mensajes, veredictos] = arguments;
+const normalizar = t => t.toLowerCase().normalize('NFD').replace(/[\\u0300-\\u036f]/g, '').replace(/\\s+/g, ' ');
+const texto = selector => normalizar(Array.from(document.querySelectorAll(selector)).map(el => el.innerText).join(' '));
+const veredicto = texto(contenedor);
+const avisos = !document.querySelector('form') && document.body
+    ? normalizar(document.body.innerText) : veredicto + ' ' + texto(mensajes);
+for (const [resultado, marcadores] of marcadores_por_resultado) {
+    const zona = veredictos.includes(resultado) ? veredicto : avisos;
+    for (const marcador of marcadores) {
+        if (zona.includes(marcador)) return [resultado, marcador];
+    }
+}
+return null;
+"""
+
+# La misma clasificación como expresión, para las esperas de navigation.wait_js y del motor CDP
+CLASIFICAR_EXPR = "(function () {%s}).apply(null, %s)" % (_CLASIFICAR_JS, json.dumps(
+    [MARCADORES, CONTENEDOR_RESULTADO, CONTENEDOR_MENSAJES, [ENCONTRADO, NO_ENCONTRADO]]))
+
+
+def classify_text(texto):
+    """
+    Clasifica el texto de una página de resultados con los MARCADORES.
+
+    Equivale a la revisión que hace `wait_for_result` en el navegador y la usan
+    los motores que no tienen un DOM (por ejemplo el cliente HTTP).
+
+    Returns:
+        tuple: (resultado, marcador) o None si el texto no contiene ningún marcador
+    """
+    texto = unicodedata.normalize('NFD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = ' '.join(texto.split())
+    for resultado, marcadores in MARCADORES:
+        for marcador in marcadores:
+            if marcador in texto:
+                return resultado, marcador
+    return None
+
+
+class DetectionResult:
+    """Resultado estructurado de la espera por la respuesta del sitio."""
+
+    def __init__(self, outcome, elapsed, marcador=None):
+        self.outcome = outcome
+        self.elapsed = elapsed
+        self.marcador = marcador
+
+    @property
+    def exitoso(self):
+        """True si el sitio entregó un veredicto (con o sin antecedentes)."""
+        return self.outcome in (ENCONTRADO, NO_ENCONTRADO)
+
+    def __repr__(self):
+        return f"DetectionResult({self.outcome!r}, {self.elapsed:.2f}s)"
+
+
+class LatencyStats:
+    """Acumula los tiempos de espera del resultado para reportar p50/p95."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, result):
+        with self._lock:
+            self._samples.setdefault(result.outcome, []).append(result.elapsed)
+
+    def counts(self):
+        """Devuelve cuántas veces se detectó cada resultado."""
+        with self._lock:
+            return {outcome: len(values) for outcome, values in self._samples.items()}
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+
+    @staticmethod
+    def _percentile(values, p):
+        values = sorted(values)
+        index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+        return values[index]
+
+    def report(self):
+        """Devuelve una tabla de texto con conteo, p50 y p95 por resultado."""
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+        if not samples:
+            return "Sin tiempos de resultado registrados."
+        lines = [f"{'Resultado':<20} {'N':>5} {'p50 (s)':>9} {'p95 (s)':>9}"]
+        todos = []
+        for outcome, values in sorted(samples.items()):
+            todos.extend(values)
+            lines.append(f"{outcome:<20} {len(values):>5} {self._percentile(values, 50):>9.2f} {self._percentile(values, 95):>9.2f}")
+        lines.append(f"{'total':<20} {len(todos):>5} {self._percentile(todos, 50):>9.2f} {self._percentile(todos, 95):>9.2f}")
+        return "\n".join(lines)
+
+
+result_stats = LatencyStats()
+
+
+def wait_for_result(driver, timeout=60, stats=result_stats):
+    """
+    Espera a que la página de resultados muestre un veredicto, un error o el rechazo del CAPTCHA.
+
+    En lugar de una pausa fija, la página revisa su texto en cada cambio del
+    DOM (navigation.wait_js) y la espera termina en cuanto aparece alguno de
+    los MARCADORES.
+
+    Args:
+        driver: Instancia del WebDriver
+        timeout: Segundos máximos de espera
+        stats: LatencyStats donde registrar el tiempo (None para no registrarlo)
+
+    Returns:
+        DetectionResult: Resultado detectado y tiempo que tomó
+    """
+    inicio = time.monotonic()
+    clasificacion = wait_js(driver, CLASIFICAR_EXPR, timeout)
+    outcome, marcador = clasificacion or (SIN_RESPUESTA, None)
+    result = DetectionResult(outcome, time.monotonic() - inicio, marcador)
+    logging.info(f"Resultado detectado: {outcome} en {result.elapsed:.1f} s" + (f" ('{marcador}')" if marcador else ""))
+    if stats is not None:
+        stats.record(result)
+    return result
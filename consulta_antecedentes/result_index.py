@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .artifacts import SEPARADOR_MIEMBRO, container_open, read_artifact
+
+
+def file_sha256(filepath):
+    """Calcula el hash SHA-256 de un archivo."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_sha256(ruta):
+    """Hash SHA-256 de un artefacto, sea un archivo suelto o un miembro de un tar/zip del lote."""
+    if SEPARADOR_MIEMBRO in ruta:
+        return hashlib.sha256(read_artifact(ruta)).hexdigest()
+    return file_sha256(ruta)
+
+
+class ResultIndex:
+    """
+    Índice local (SQLite) de las consultas ya realizadas.
+
+    Por cada cédula guarda el momento de la consulta, el resultado detectado,
+    el archivo generado y su hash. Las cédulas consultadas hace menos de
+    `ttl_horas` cuyo archivo sigue intacto se consideran vigentes y no se
+    vuelven a consultar, lo que ahorra créditos de 2Captcha y tiempo de
+    navegador en las listas que se re-ejecutan a diario.
+    """
+
+    def __init__(self, path=None, ttl_horas=None):
+        self.path = path or os.getenv('RESULT_INDEX_FILE', os.path.join('antecedentes', 'indice.sqlite3'))
+        self.ttl = float(ttl_horas if ttl_horas is not None else os.getenv('RESULT_TTL_HORAS', '24')) * 3600
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS consultas ("
+                " cedula TEXT PRIMARY KEY,"
+                " consultado_en REAL NOT NULL,"
+                " resultado TEXT NOT NULL,"
+                " archivo TEXT,"
+                " sha256 TEXT)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, cedula):
+        """Devuelve la última consulta registrada de la cédula como dict, o None."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT cedula, consultado_en, resultado, archivo, sha256 FROM consultas WHERE cedula = ?",
+                (cedula,),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('cedula', 'consultado_en', 'resultado', 'archivo', 'sha256'), row))
+
+    def fresh(self, cedula):
+        """
+        Devuelve la consulta registrada si sigue vigente, o None si hay que consultar de nuevo.
+
+        Una consulta deja de estar vigente cuando supera el TTL o cuando su
+        archivo se borró o cambió desde que se registró. Los artefactos de un
+        tar/zip que este proceso todavía está escribiendo no se pueden leer
+        hasta que se cierre, así que se confía en la entrada del índice.
+        """
+        entrada = self.get(cedula)
+        if not entrada or time.time() - entrada['consultado_en'] > self.ttl:
+            return None
+        archivo = entrada['archivo']
+        if archivo and not container_open(archivo):
+            try:
+                if artifact_sha256(archivo) != entrada['sha256']:
+                    logging.warning(f"El archivo {archivo} cambió desde la última consulta. Se consultará de nuevo.")
+                    return None
+            except OSError:
+                return None
+        return entrada
+
+    def record(self, cedula, resultado, archivo=None, sha256=None):
+        """
+        Registra el resultado de una consulta recién hecha.
+
+        `sha256` lo entrega el ArtifactWriter al terminar de escribir; sin él se
+        calcula leyendo el archivo.
+        """
+        if sha256 is None and archivo and os.path.exists(archivo):
+            sha256 = file_sha256(archivo)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO consultas (cedula, consultado_en, resultado, archivo, sha256) VALUES (?, ?, ?, ?, ?)",
+                (cedula, time.time(), resultado, archivo, sha256),
+            )
+            conn.commit()
+
+    def resumen(self):
+        """
+        Devuelve un dict con el total de consultas registradas, cuántas siguen
+        dentro del TTL y el conteo por resultado (sin recalcular hashes).
+        """
+        limite = time.time() - self.ttl
+        with self._lock:
+            conn = self._connect()
+            total, vigentes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(consultado_en >= ?), 0) FROM consultas", (limite,),
+            ).fetchone()
+            por_resultado = dict(conn.execute(
+                "SELECT resultado, COUNT(*) FROM consultas GROUP BY resultado ORDER BY COUNT(*) DESC"
+            ).fetchall())
+        return {'total': total, 'vigentes': vigentes, 'por_resultado': por_resultado}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
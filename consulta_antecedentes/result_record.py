@@ -0,0 +1,116 @@
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# Columnas del registro estructurado, en el orden en que se escriben en el CSV
+CAMPOS = ('cedula', 'nombre', 'resultado', 'consultado_en', 'certificado', 'hora_sitio', 'archivo')
+
+# Texto visible del recuadro de resultados (o de toda la página si no se encuentra)
+TEXTO_RESULTADO_JS = (
+    "(() => { const el = document.querySelector('[id$=\"mensajeCiudadano\"]') || document.body;"
+    " return el ? el.innerText : ''; })()"
+)
+
+_CEDULA = re.compile(r"c[eé]dula[^\d]{0,40}?(\d{5,12})", re.IGNORECASE)
+# El nombre termina en un salto de línea o donde empieza el veredicto (el cliente HTTP entrega el texto en una línea)
+_NOMBRE = re.compile(
+    r"nombres?\s*:?\s*(.+?)\s*(?=\n|(?:no\s+)?(?:tiene\s+asuntos|es\s+requerid|registra)|$)", re.IGNORECASE,
+)
+_CERTIFICADO = re.compile(
+    r"(?:certificado|consecutivo|n[uú]mero\s+de\s+consulta|c[oó]digo\s+de\s+verificaci[oó]n)"
+    r"\s*(?:n[º°o.]*)?\s*:?\s*([A-Z0-9-]*\d[A-Z0-9-]*)",
+    re.IGNORECASE,
+)
+_HORA_SITIO = re.compile(
+    r"siendo\s+las\s+(\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]\.?\s?m\.?)?)(?:\s+horas)?(?:\s+del\s+(\d{1,2}/\d{1,2}/\d{4}))?",
+    re.IGNORECASE,
+)
+
+
+def extract_record(texto, cedula, resultado, archivo=None):
+    """
+    Arma el registro estructurado de una consulta a partir del texto de la página de resultados.
+
+    Los campos que la página no muestra quedan en None; la cédula consultada se
+    usa si la página no la repite.
+
+    Args:
+        texto: Texto visible del resultado (TEXTO_RESULTADO_JS o el texto de la página JSF)
+        cedula: Cédula consultada
+        resultado: Veredicto detectado (ENCONTRADO o NO_ENCONTRADO)
+        archivo: PDF o HTML guardado, si se guardó
+
+    Returns:
+        dict: Registro con las claves de CAMPOS
+    """
+    texto = texto or ''
+    registro = dict.fromkeys(CAMPOS)
+    coincidencia = _CEDULA.search(texto)
+    registro['cedula'] = coincidencia.group(1) if coincidencia else str(cedula)
+    if registro['cedula'] != str(cedula):
+        logging.warning(f"La página de resultados muestra la cédula {registro['cedula']} en lugar de {cedula}.")
+    coincidencia = _NOMBRE.search(texto)
+    if coincidencia:
+        registro['nombre'] = ' '.join(coincidencia.group(1).split()).strip(' .,:') or None
+    coincidencia = _CERTIFICADO.search(texto)
+    if coincidencia:
+        registro['certificado'] = coincidencia.group(1)
+    coincidencia = _HORA_SITIO.search(texto)
+    if coincidencia:
+        registro['hora_sitio'] = ' '.join(filter(None, coincidencia.groups()))
+    registro['resultado'] = resultado
+    registro['consultado_en'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    registro['archivo'] = archivo
+    return registro
+
+
+class RecordWriter:
+    """
+    Archivo de salida con un registro estructurado por consulta exitosa.
+
+    El formato sale de la extensión: `.jsonl` (un objeto JSON por línea) o
+    `.csv` (columnas fijas de CAMPOS con encabezado, UTF-8 y celdas vacías
+    para los valores ausentes, listo para cargar en pandas o convertir a
+    Parquet). Si el archivo ya existe los registros se agregan al final.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.formato = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+        self.escritos = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._csv = None
+
+    def _abrir(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        nuevo = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', encoding='utf-8', newline='')
+        if self.formato == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=CAMPOS, extrasaction='ignore')
+            if nuevo:
+                self._csv.writeheader()
+
+    def write(self, registro):
+        with self._lock:
+            if self._file is None:
+                self._abrir()
+            if self._csv:
+                self._csv.writerow(registro)
+            else:
+                self._file.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            self._file.flush()
+            self.escritos += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._csv = None
@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from .metrics import metrics
+from .result_detector import CAPTCHA_RECHAZADO, ERROR_SITIO, SIN_RESPUESTA
+
+# --- Clases de fallo de un intento de consulta ---
+BOTON_DESACTIVADO = 'boton_desactivado'  # 'continuarBtn' no se habilitó tras aceptar los términos
+TIMEOUT_PAGINA = 'timeout_pagina'        # Preloader, formulario o resultado que no aparecieron a tiempo
+CAPTCHA = 'captcha'                      # Token rechazado por el sitio o proveedor que no lo resolvió
+SITIO_CAIDO = 'sitio_caido'              # El sitio respondió con error o no se pudo conectar
+NAVEGADOR = 'navegador'                  # Ventana cerrada, driver o conexión DevTools caídos
+CONFIGURACION = 'configuracion'          # API key de ejemplo o sin proveedores: reintentar no sirve
+DESCONOCIDO = 'desconocido'
+
+# Fallos que indican que el sitio está degradado y alimentan el circuit breaker
+FALLOS_DEL_SITIO = (SITIO_CAIDO, TIMEOUT_PAGINA)
+
+# Reintentos permitidos por clase y espera base (s) del backoff exponencial
+PRESUPUESTOS = {
+    BOTON_DESACTIVADO: 2,
+    TIMEOUT_PAGINA: 2,
+    CAPTCHA: 2,
+    SITIO_CAIDO: 2,
+    NAVEGADOR: 2,
+    CONFIGURACION: 0,
+    DESCONOCIDO: 1,
+}
+ESPERAS_BASE = {
+    BOTON_DESACTIVADO: 1.0,
+    TIMEOUT_PAGINA: 3.0,
+    CAPTCHA: 0.5,
+    SITIO_CAIDO: 10.0,
+    NAVEGADOR: 1.0,
+    CONFIGURACION: 0.0,
+    DESCONOCIDO: 2.0,
+}
+
+_CLASES_POR_EXCEPCION = {
+    'TimeoutException': TIMEOUT_PAGINA,
+    'TimeoutError': TIMEOUT_PAGINA,
+    'NoSuchWindowException': NAVEGADOR,
+    'InvalidSessionIdException': NAVEGADOR,
+    'WebDriverException': NAVEGADOR,
+    'CDPError': NAVEGADOR,
+    'ConnectionError': SITIO_CAIDO,
+    'ConnectTimeout': SITIO_CAIDO,
+    'ReadTimeout': SITIO_CAIDO,
+    'SSLError': SITIO_CAIDO,
+}
+
+_CLASES_POR_RESULTADO = {
+    CAPTCHA_RECHAZADO: CAPTCHA,
+    ERROR_SITIO: SITIO_CAIDO,
+    SIN_RESPUESTA: TIMEOUT_PAGINA,
+}
+
+
+def captcha_timeout():
+    """Segundos máximos para obtener un token de reCAPTCHA (TIMEOUT_CAPTCHA, por defecto 180)."""
+    return float(os.getenv('TIMEOUT_CAPTCHA', '180'))
+
+
+class ConsultaError(Exception):
+    """Fallo de un intento de consulta con su clase ya conocida."""
+
+    def __init__(self, clase, mensaje):
+        super().__init__(mensaje)
+        self.clase = clase
+
+
+def error_de_resultado(outcome):
+    """ConsultaError para un resultado sin veredicto (CAPTCHA rechazado, error del sitio, sin respuesta)."""
+    return ConsultaError(_CLASES_POR_RESULTADO.get(outcome, DESCONOCIDO), f"La consulta no entregó un veredicto: {outcome}")
+
+
+def classify_failure(exc):
+    """
+    Clasifica la excepción de un intento fallido.
+
+    Se reconocen por nombre las excepciones de selenium, requests y asyncio
+    para no tener que importarlas aquí.
+    """
+    if isinstance(exc, ConsultaError):
+        return exc.clase
+    mensaje = str(exc)
+    if 'TU_API_KEY' in mensaje or 'No hay proveedores de CAPTCHA' in mensaje:
+        return CONFIGURACION
+    if 'reCAPTCHA' in mensaje or 'CAPTCHA' in mensaje:
+        return CAPTCHA
+    for cls in type(exc).__mro__:
+        if cls.__name__ in _CLASES_POR_EXCEPCION:
+            return _CLASES_POR_EXCEPCION[cls.__name__]
+    return DESCONOCIDO
+
+
+def _parse_presupuestos(texto):
+    presupuestos = {}
+    for item in filter(None, (p.strip() for p in texto.split(','))):
+        clase, _, valor = item.partition('=')
+        try:
+            presupuestos[clase.strip()] = int(valor)
+        except ValueError:
+            logging.warning(f"Presupuesto de reintentos inválido ignorado: {item!r}")
+    return presupuestos
+
+
+class RetryPolicy:
+    """
+    Política de reintentos por clase de fallo.
+
+    Cada clase tiene su propio presupuesto de reintentos y su espera base; la
+    espera crece de forma exponencial con los reintentos de esa clase y lleva
+    jitter para que los workers no reintenten todos a la vez. `max_retries`
+    limita el total de reintentos de una consulta.
+    """
+
+    def __init__(self, max_retries=1, presupuestos=None, esperas=None, factor=2.0, espera_max=120.0):
+        self.max_retries = max_retries
+        self.presupuestos = dict(PRESUPUESTOS, **(presupuestos or {}))
+        self.esperas = dict(ESPERAS_BASE, **(esperas or {}))
+        self.factor = factor
+        self.espera_max = espera_max
+
+    @classmethod
+    def from_env(cls):
+        """
+        Lee MAX_RETRIES y, opcionalmente, RETRY_PRESUPUESTOS (por ejemplo 'captcha=3,sitio_caido=1').
+
+        MAX_RETRIES vale 1 por defecto: dos intentos en total, como el script original.
+        """
+        return cls(
+            max_retries=int(os.getenv('MAX_RETRIES', '1')),
+            presupuestos=_parse_presupuestos(os.getenv('RETRY_PRESUPUESTOS', '')),
+        )
+
+    def start(self):
+        """Crea el estado de reintentos de una consulta."""
+        return RetryState(self)
+
+    def espera(self, clase, n):
+        """Espera antes del reintento número `n` de una clase: mitad fija y mitad aleatoria."""
+        base = self.esperas.get(clase, ESPERAS_BASE[DESCONOCIDO])
+        espera = min(self.espera_max, base * self.factor ** (n - 1))
+        return espera / 2 + random.uniform(0, espera / 2)
+
+
+class RetryState:
+    """Reintentos consumidos por una consulta, por clase y en total."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.reintentos = 0
+        self.por_clase = {}
+
+    @property
+    def intentos_max(self):
+        return self.policy.max_retries + 1
+
+    def siguiente(self, clase):
+        """
+        Registra un fallo y decide si reintentar.
+
+        Returns:
+            float: Segundos a esperar antes del reintento, o None si no se reintenta
+        """
+        usados = self.por_clase.get(clase, 0)
+        if self.reintentos >= self.policy.max_retries or usados >= self.policy.presupuestos.get(clase, 0):
+            return None
+        self.reintentos += 1
+        self.por_clase[clase] = usados + 1
+        return self.policy.espera(clase, usados + 1)
+
+
+class CircuitBreaker:
+    """
+    Pausa todo el lote cuando la tasa de fallos del sitio se dispara.
+
+    Lleva una ventana con los últimos intentos: cada fallo de `FALLOS_DEL_SITIO`
+    cuenta como error y cada éxito como sano; los demás fallos (navegador,
+    CAPTCHA, configuración...) no dicen nada del sitio y no se cuentan. Si con
+    al menos `min_muestras` la tasa de error llega a `umbral`, el circuito se
+    abre y ningún worker empieza un intento durante `pausa` segundos. Después
+    se deja pasar un único intento de prueba, identificado por el número que
+    devuelve `wait()`: sólo su resultado cuenta. Si sale bien el circuito se
+    cierra; si falla por el sitio se abre otra vez con el doble de pausa (hasta
+    `pausa_max`); con cualquier otro fallo se envía una nueva prueba.
+    """
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    PRUEBA = 'prueba'
+
+    def __init__(self, umbral=0.5, ventana=20, min_muestras=6, pausa=60.0, pausa_max=600.0):
+        self.umbral = umbral
+        self.min_muestras = min_muestras
+        self.pausa_inicial = pausa
+        self.pausa_max = pausa_max
+        self.pausa = pausa
+        self.estado = self.CERRADO
+        self.aperturas = 0
+        self._muestras = deque(maxlen=ventana)
+        self._hasta = 0.0
+        self._prueba_en_curso = False
+        self._prueba = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        """Lee CIRCUITO_UMBRAL (0 lo desactiva), CIRCUITO_VENTANA y CIRCUITO_PAUSA."""
+        return cls(
+            umbral=float(os.getenv('CIRCUITO_UMBRAL', '0.5')),
+            ventana=int(os.getenv('CIRCUITO_VENTANA', '20')),
+            pausa=float(os.getenv('CIRCUITO_PAUSA', '60')),
+        )
+
+    def _turno(self):
+        """
+        Devuelve `(espera, prueba)`: los segundos a esperar antes de volver a
+        preguntar (0 si el intento puede empezar) y el número de prueba si el
+        intento es la consulta de prueba del circuito medio abierto.
+        """
+        if self.estado == self.CERRADO:
+            return 0.0, None
+        ahora = time.monotonic()
+        if self.estado == self.ABIERTO:
+            if ahora < self._hasta:
+                return self._hasta - ahora, None
+            self.estado = self.PRUEBA
+            logging.info("Circuito medio abierto: se envía una consulta de prueba al sitio.")
+        if self._prueba_en_curso:
+            return 1.0, None
+        self._prueba_en_curso = True
+        self._prueba += 1
+        return 0.0, self._prueba
+
+    def wait(self):
+        """
+        Bloquea el hilo mientras el circuito esté abierto.
+
+        Returns:
+            int: El número de prueba si el intento es la consulta de prueba,
+            None en caso contrario. Se pasa tal cual a `record`.
+        """
+        with self._cond:
+            while True:
+                espera, prueba = self._turno()
+                if not espera:
+                    return prueba
+                self._cond.wait(espera)
+
+    async def wait_async(self):
+        """Igual que `wait`, sin bloquear el loop de asyncio."""
+        while True:
+            with self._cond:
+                espera, prueba = self._turno()
+            if not espera:
+                return prueba
+            await asyncio.sleep(min(espera, 1.0))
+
+    def record(self, clase=None, prueba=None):
+        """
+        Registra el resultado de un intento: None si terminó bien, o su clase de fallo.
+
+        `prueba` es lo que devolvió `wait()` para ese intento; mientras el
+        circuito no está cerrado sólo cuenta el resultado de la prueba vigente.
+        """
+        error = clase in FALLOS_DEL_SITIO
+        with self._cond:
+            if self.estado != self.CERRADO:
+                if self.estado != self.PRUEBA or prueba is None or prueba != self._prueba:
+                    # Intentos que empezaron antes de abrirse el circuito
+                    return
+                self._prueba_en_curso = False
+                if error:
+                    self.pausa = min(self.pausa_max, self.pausa * 2)
+                    self._abrir()
+                elif clase is None:
+                    logging.info("Circuito cerrado: el sitio respondió a la consulta de prueba.")
+                    self.estado = self.CERRADO
+                    self.pausa = self.pausa_inicial
+                    self._muestras.clear()
+                else:
+                    logging.info(f"La consulta de prueba falló por '{clase}', ajeno al sitio. Se envía otra.")
+                self._cond.notify_all()
+                return
+            if self.umbral <= 0 or (clase is not None and not error):
+                return
+            self._muestras.append(error)
+            errores = sum(self._muestras)
+            if len(self._muestras) >= self.min_muestras and errores / len(self._muestras) >= self.umbral:
+                self._abrir()
+
+    def _abrir(self):
+        self.estado = self.ABIERTO
+        self.aperturas += 1
+        self._hasta = time.monotonic() + self.pausa
+        self._muestras.clear()
+        metrics.incr('circuito_abierto')
+        logging.warning(f"Circuito abierto: demasiados errores del sitio. Se pausa el lote {self.pausa:.0f} s.")
+
+    def report(self):
+        return f"Circuit breaker: {self.aperturas} apertura(s), estado final {self.estado}."
+
+
+class _SinCircuito:
+    """Circuit breaker nulo para las consultas que se usan fuera de un lote."""
+
+    def wait(self):
+        return None
+
+    async def wait_async(self):
+        return None
+
+    def record(self, clase=None, prueba=None):
+        pass
+
+
+SIN_CIRCUITO = _SinCircuito()
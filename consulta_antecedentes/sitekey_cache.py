@@ -0,0 +1,127 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from .metrics import metrics
+
+# El sitekey cacheado sigue en la página: en el widget, en el iframe o script
+# de reCAPTCHA, o en un script inline que llama a grecaptcha.render
+SITEKEY_PRESENTE_JS = (
+    "const k = arguments[0];"
+    " return document.querySelector("
+    "'[data-sitekey=\"' + CSS.escape(k) + '\"], iframe[src*=\"' + CSS.escape(k) + '\"], script[src*=\"' + CSS.escape(k) + '\"]'"
+    ") !== null || Array.from(document.scripts).some(s => !s.src && s.text.indexOf(k) !== -1);"
+)
+
+
+class SitekeyCache:
+    """
+    Cache en disco del sitekey del reCAPTCHA.
+
+    Guarda el sitekey junto con la URL donde se encontró, el momento del
+    hallazgo y la estrategia que funcionó. En las siguientes consultas basta
+    una verificación rápida en el DOM; sólo si falla se repite la búsqueda
+    completa. Los contadores `aciertos` e `invalidaciones` se guardan en el
+    mismo archivo para saber con qué frecuencia cambia el sitekey; los aciertos
+    se acumulan en memoria y se escriben con la siguiente invalidación o al
+    terminar el proceso, no en cada consulta.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SITEKEY_CACHE_FILE', '.sitekey_cache.json')
+        self._lock = threading.Lock()
+        self._data = None
+        self._aciertos_pendientes = 0
+        self._atexit = False
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self._data = {}
+            except (OSError, ValueError) as e:
+                logging.warning(f"No se pudo leer el cache de sitekey {self.path}: {e}")
+                self._data = {}
+            self._data.setdefault('metricas', {'aciertos': 0, 'invalidaciones': 0})
+        return self._data
+
+    def _save(self):
+        self._data['metricas']['aciertos'] += self._aciertos_pendientes
+        self._aciertos_pendientes = 0
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self):
+        """Devuelve la entrada cacheada (sitekey, url, encontrado_en, estrategia) o None."""
+        with self._lock:
+            return self._load().get('entrada')
+
+    def validate(self, driver):
+        """
+        Comprueba con una sola consulta al DOM que el sitekey cacheado sigue en la página.
+
+        Returns:
+            str: El sitekey si sigue siendo válido, None en caso contrario
+        """
+        entrada = self.get()
+        if not entrada:
+            return None
+        try:
+            presente = driver.execute_script(SITEKEY_PRESENTE_JS, entrada['sitekey'])
+        except Exception as e:
+            logging.warning(f"No se pudo validar el sitekey cacheado: {e}")
+            presente = False
+        if presente:
+            with self._lock:
+                self._aciertos_pendientes += 1
+                if not self._atexit:
+                    atexit.register(self.flush)
+                    self._atexit = True
+            return entrada['sitekey']
+        with self._lock:
+            metricas = self._load()['metricas']
+            metricas['invalidaciones'] += 1
+            self._save()
+        logging.warning(
+            f"El sitekey cacheado ya no está en la página "
+            f"(invalidaciones acumuladas: {metricas['invalidaciones']})."
+        )
+        metrics.incr('sitekey_invalidado', sitekey=entrada['sitekey'])
+        return None
+
+    def store(self, sitekey, url, estrategia):
+        """Guarda un sitekey recién descubierto."""
+        with self._lock:
+            data = self._load()
+            anterior = data.get('entrada')
+            if anterior and anterior['sitekey'] == sitekey and anterior['estrategia'] == estrategia:
+                return
+            data['entrada'] = {
+                'sitekey': sitekey,
+                'url': url,
+                'encontrado_en': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'estrategia': estrategia,
+            }
+            self._save()
+        logging.info(f"Sitekey guardado en cache ({estrategia}): {self.path}")
+
+    def flush(self):
+        """Escribe los aciertos acumulados en memoria."""
+        with self._lock:
+            if self._aciertos_pendientes:
+                self._load()
+                self._save()
+
+    def metricas(self):
+        """Devuelve los contadores de aciertos e invalidaciones del cache."""
+        with self._lock:
+            metricas = dict(self._load()['metricas'])
+            metricas['aciertos'] += self._aciertos_pendientes
+            return metricas
@@ -0,0 +1,489 @@
+"""
+Cola de trabajos para repartir un lote entre varios procesos o máquinas.
+
+Un coordinador encola las cédulas y cada worker las toma con un *lease*: la
+cédula queda asignada a ese worker hasta `visibilidad` segundos. El worker
+renueva sus leases con heartbeats mientras consulta y, al terminar, confirma el
+resultado. Si un worker se cae, sus leases vencen y las cédulas vuelven a
+entregarse a otro; después de `max_entregas` entregas sin confirmación la
+cédula se marca como fallida para no bloquear el lote.
+
+- SQLiteQueue: archivo local, para varios procesos en la misma máquina.
+- RedisQueue: servidor Redis (o compatible), para workers en varias máquinas.
+  Requiere el paquete `redis`.
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+PENDIENTE = 'pendiente'
+EN_CURSO = 'en_curso'
+HECHO = 'hecho'
+FALLIDO = 'fallido'
+
+
+def open_queue(destino, visibilidad=None, max_entregas=None):
+    """Abre la cola indicada: una URL `redis://` o `rediss://`, o la ruta de un archivo SQLite."""
+    if destino.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisQueue(destino, visibilidad=visibilidad, max_entregas=max_entregas)
+    return SQLiteQueue(destino, visibilidad=visibilidad, max_entregas=max_entregas)
+
+
+def _opciones(visibilidad, max_entregas):
+    visibilidad = float(visibilidad if visibilidad is not None else os.getenv('COLA_VISIBILIDAD', '300'))
+    max_entregas = int(max_entregas if max_entregas is not None else os.getenv('COLA_MAX_ENTREGAS', '5'))
+    return visibilidad, max_entregas
+
+
+class SQLiteQueue:
+    """
+    Cola de trabajos en un archivo SQLite.
+
+    Cada operación es una transacción `BEGIN IMMEDIATE`, así que varios
+    procesos pueden tomar leases del mismo archivo sin entregarse la misma
+    cédula. No conviene ponerla en un disco de red: el bloqueo de SQLite no es
+    confiable sobre NFS. Para varias máquinas está RedisQueue.
+    """
+
+    def __init__(self, path, visibilidad=None, max_entregas=None):
+        self.path = path
+        self.visibilidad, self.max_entregas = _opciones(visibilidad, max_entregas)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS trabajos ("
+                " cedula TEXT PRIMARY KEY,"
+                " estado TEXT NOT NULL,"
+                " entregas INTEGER NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " lease_hasta REAL,"
+                " creado_en REAL NOT NULL,"
+                " terminado_en REAL,"
+                " resultado TEXT,"
+                " registro TEXT,"
+                " error TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, creado_en)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                " worker TEXT PRIMARY KEY,"
+                " heartbeat_en REAL NOT NULL,"
+                " en_mano INTEGER NOT NULL)"
+            )
+        return self._conn
+
+    @contextmanager
+    def _transaccion(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, cedulas, tamano_lote=500):
+        """
+        Agrega las cédulas que no estén pendientes ni en curso. Devuelve cuántas se agregaron.
+
+        Una cédula que ya terminó (hecha o fallida) en un lote anterior de la
+        misma cola vuelve a quedar pendiente, con sus entregas en cero.
+        """
+        agregadas = 0
+        cedulas = iter(cedulas)
+        while True:
+            lote = [(str(c), PENDIENTE, time.time(), HECHO, FALLIDO) for _, c in zip(range(tamano_lote), cedulas)]
+            if not lote:
+                return agregadas
+            with self._transaccion() as conn:
+                antes = conn.total_changes
+                conn.executemany(
+                    "INSERT INTO trabajos (cedula, estado, creado_en) VALUES (?, ?, ?)"
+                    " ON CONFLICT (cedula) DO UPDATE SET estado = excluded.estado, creado_en = excluded.creado_en,"
+                    " entregas = 0, worker = NULL, lease_hasta = NULL, terminado_en = NULL, resultado = NULL,"
+                    " registro = NULL, error = NULL WHERE trabajos.estado IN (?, ?)",
+                    lote,
+                )
+                agregadas += conn.total_changes - antes
+
+    def lease(self, worker, n=1):
+        """Asigna hasta `n` cédulas al worker por `visibilidad` segundos. Devuelve la lista de cédulas."""
+        ahora = time.time()
+        with self._transaccion() as conn:
+            # Leases vencidos que ya se entregaron demasiadas veces: la cédula falla en vez de bloquear el lote
+            conn.execute(
+                "UPDATE trabajos SET estado = ?, error = ?, terminado_en = ?"
+                " WHERE estado = ? AND lease_hasta < ? AND entregas >= ?",
+                (FALLIDO, f"Lease vencido después de {self.max_entregas} entregas", ahora,
+                 EN_CURSO, ahora, self.max_entregas),
+            )
+            cedulas = [fila[0] for fila in conn.execute(
+                "SELECT cedula FROM trabajos WHERE estado = ? OR (estado = ? AND lease_hasta < ?)"
+                " ORDER BY creado_en LIMIT ?",
+                (PENDIENTE, EN_CURSO, ahora, n),
+            )]
+            conn.executemany(
+                "UPDATE trabajos SET estado = ?, worker = ?, lease_hasta = ?, entregas = entregas + 1 WHERE cedula = ?",
+                [(EN_CURSO, worker, ahora + self.visibilidad, c) for c in cedulas],
+            )
+        return cedulas
+
+    def heartbeat(self, worker, cedulas):
+        """Renueva los leases del worker sobre `cedulas` y registra que sigue vivo. Devuelve cuántos renovó."""
+        ahora = time.time()
+        cedulas = list(cedulas)
+        with self._transaccion() as conn:
+            antes = conn.total_changes
+            conn.executemany(
+                "UPDATE trabajos SET lease_hasta = ? WHERE cedula = ? AND worker = ? AND estado = ?",
+                [(ahora + self.visibilidad, c, worker, EN_CURSO) for c in cedulas],
+            )
+            renovados = conn.total_changes - antes
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker, heartbeat_en, en_mano) VALUES (?, ?, ?)",
+                (worker, ahora, len(cedulas)),
+            )
+        return renovados
+
+    def ack(self, cedula, worker, exitoso, registro=None, error=None):
+        """
+        Confirma el resultado de una cédula.
+
+        Returns:
+            bool: False si el worker ya no tenía el lease (venció y la cédula se
+            entregó a otro); en ese caso el resultado se descarta
+        """
+        resultado = registro.get('resultado') if registro else None
+        with self._transaccion() as conn:
+            cursor = conn.execute(
+                "UPDATE trabajos SET estado = ?, terminado_en = ?, resultado = ?, registro = ?, error = ?,"
+                " lease_hasta = NULL WHERE cedula = ? AND worker = ? AND estado = ?",
+                (HECHO if exitoso else FALLIDO, time.time(), resultado,
+                 json.dumps(registro, ensure_ascii=False) if registro else None, error,
+                 str(cedula), worker, EN_CURSO),
+            )
+        return cursor.rowcount == 1
+
+    def en_curso(self):
+        """Cédulas asignadas a algún worker en este momento."""
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM trabajos WHERE estado = ?", (EN_CURSO,)).fetchone()[0]
+
+    def release(self, cedula, worker):
+        """Devuelve a la cola una cédula que el worker no alcanzó a consultar."""
+        with self._transaccion() as conn:
+            conn.execute(
+                "UPDATE trabajos SET estado = ?, worker = NULL, lease_hasta = NULL, entregas = MAX(0, entregas - 1)"
+                " WHERE cedula = ? AND worker = ? AND estado = ?",
+                (PENDIENTE, str(cedula), worker, EN_CURSO),
+            )
+
+    def stats(self):
+        """Cédulas por estado y workers con su último heartbeat."""
+        with self._lock:
+            conn = self._connect()
+            estados = dict.fromkeys((PENDIENTE, EN_CURSO, HECHO, FALLIDO), 0)
+            estados.update(conn.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado").fetchall())
+            hechas = dict(conn.execute(
+                "SELECT worker, COUNT(*) FROM trabajos WHERE estado = ? GROUP BY worker", (HECHO,),
+            ).fetchall())
+            workers = {
+                worker: {'heartbeat_en': heartbeat_en, 'en_mano': en_mano, 'hechas': hechas.get(worker, 0)}
+                for worker, heartbeat_en, en_mano in conn.execute("SELECT worker, heartbeat_en, en_mano FROM workers")
+            }
+        return {'estados': estados, 'workers': workers}
+
+    def iter_registros(self):
+        """Registros estructurados de las cédulas confirmadas como exitosas."""
+        with self._lock:
+            filas = self._connect().execute(
+                "SELECT registro FROM trabajos WHERE estado = ? AND registro IS NOT NULL ORDER BY terminado_en", (HECHO,),
+            ).fetchall()
+        for (registro,) in filas:
+            yield json.loads(registro)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Scripts Lua: cada operación sobre varias claves es atómica en el servidor
+_ENQUEUE_LUA = """
+local agregadas = 0
+for _, c in ipairs(ARGV) do
+    if redis.call('SADD', KEYS[1], c) == 1 then
+        redis.call('HDEL', KEYS[2], c)
+        redis.call('HDEL', KEYS[3], c)
+        redis.call('RPUSH', KEYS[4], c)
+        agregadas = agregadas + 1
+    end
+end
+return agregadas
+"""
+
+_LEASE_LUA = """
+local ahora, hasta, n, worker, max_entregas = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4], tonumber(ARGV[5])
+for _, c in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ahora)) do
+    redis.call('ZREM', KEYS[2], c)
+    redis.call('HDEL', KEYS[3], c)
+    if tonumber(redis.call('HGET', KEYS[4], c) or '0') >= max_entregas then
+        redis.call('HSET', KEYS[5], c, cjson.encode({estado='fallido', error='Lease vencido después de ' .. max_entregas .. ' entregas'}))
+        redis.call('SREM', KEYS[6], c)
+    else
+        redis.call('LPUSH', KEYS[1], c)
+    end
+end
+local tomadas = {}
+for i = 1, n do
+    local c = redis.call('LPOP', KEYS[1])
+    if not c then break end
+    redis.call('ZADD', KEYS[2], hasta, c)
+    redis.call('HSET', KEYS[3], c, worker)
+    redis.call('HINCRBY', KEYS[4], c, 1)
+    table.insert(tomadas, c)
+end
+return tomadas
+"""
+
+_HEARTBEAT_LUA = """
+local renovados = 0
+for i = 3, #ARGV do
+    if redis.call('HGET', KEYS[2], ARGV[i]) == ARGV[1] then
+        redis.call('ZADD', KEYS[1], 'XX', ARGV[2], ARGV[i])
+        renovados = renovados + 1
+    end
+end
+return renovados
+"""
+
+_ACK_LUA = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+redis.call('SREM', KEYS[4], ARGV[1])
+return 1
+"""
+
+_RELEASE_LUA = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HINCRBY', KEYS[4], ARGV[1], -1)
+redis.call('RPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+
+
+class RedisQueue:
+    """
+    Cola de trabajos en Redis, con la misma interfaz que SQLiteQueue.
+
+    Claves (con el prefijo `nombre`): `pendientes` (lista), `leases` (zset con
+    el vencimiento de cada lease), `duenos` (hash cédula -> worker),
+    `entregas`, `conocidas` (set de las cédulas pendientes o en curso, para no
+    encolarlas dos veces), `terminados` (hash cédula -> resultado en JSON) y
+    `workers` (heartbeats). Al terminar, la cédula sale de `conocidas` y se
+    puede volver a encolar en otro lote.
+    """
+
+    def __init__(self, url, nombre=None, visibilidad=None, max_entregas=None):
+        import redis
+
+        self.url = url
+        self.visibilidad, self.max_entregas = _opciones(visibilidad, max_entregas)
+        nombre = nombre or os.getenv('COLA_NOMBRE', 'antecedentes')
+        self.claves = {k: f"{nombre}:{k}" for k in (
+            'pendientes', 'leases', 'duenos', 'entregas', 'conocidas', 'terminados', 'workers')}
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._enqueue = self._redis.register_script(_ENQUEUE_LUA)
+        self._lease = self._redis.register_script(_LEASE_LUA)
+        self._heartbeat = self._redis.register_script(_HEARTBEAT_LUA)
+        self._ack = self._redis.register_script(_ACK_LUA)
+        self._release = self._redis.register_script(_RELEASE_LUA)
+
+    def enqueue(self, cedulas, tamano_lote=500):
+        agregadas = 0
+        cedulas = iter(cedulas)
+        while True:
+            lote = [str(c) for _, c in zip(range(tamano_lote), cedulas)]
+            if not lote:
+                return agregadas
+            c = self.claves
+            agregadas += self._enqueue(
+                keys=[c['conocidas'], c['terminados'], c['entregas'], c['pendientes']], args=lote,
+            )
+
+    def lease(self, worker, n=1):
+        ahora = time.time()
+        c = self.claves
+        return self._lease(
+            keys=[c['pendientes'], c['leases'], c['duenos'], c['entregas'], c['terminados'], c['conocidas']],
+            args=[ahora, ahora + self.visibilidad, n, worker, self.max_entregas],
+        )
+
+    def heartbeat(self, worker, cedulas):
+        ahora = time.time()
+        cedulas = list(cedulas)
+        self._redis.hset(self.claves['workers'], worker, json.dumps({'heartbeat_en': ahora, 'en_mano': len(cedulas)}))
+        return self._heartbeat(
+            keys=[self.claves['leases'], self.claves['duenos']], args=[worker, ahora + self.visibilidad, *cedulas],
+        )
+
+    def ack(self, cedula, worker, exitoso, registro=None, error=None):
+        terminado = {
+            'estado': HECHO if exitoso else FALLIDO, 'worker': worker, 'terminado_en': time.time(),
+            'registro': registro, 'error': error,
+        }
+        c = self.claves
+        return self._ack(
+            keys=[c['leases'], c['duenos'], c['terminados'], c['conocidas']],
+            args=[str(cedula), worker, json.dumps(terminado, ensure_ascii=False)],
+        ) == 1
+
+    def en_curso(self):
+        return self._redis.zcard(self.claves['leases'])
+
+    def release(self, cedula, worker):
+        c = self.claves
+        self._release(keys=[c['leases'], c['duenos'], c['pendientes'], c['entregas']], args=[str(cedula), worker])
+
+    def _terminados(self):
+        return (json.loads(v) for v in self._redis.hvals(self.claves['terminados']))
+
+    def stats(self):
+        c = self.claves
+        estados = {PENDIENTE: self._redis.llen(c['pendientes']), EN_CURSO: self._redis.zcard(c['leases']),
+                   HECHO: 0, FALLIDO: 0}
+        hechas = {}
+        for terminado in self._terminados():
+            estados[terminado['estado']] += 1
+            if terminado['estado'] == HECHO:
+                hechas[terminado['worker']] = hechas.get(terminado['worker'], 0) + 1
+        workers = {}
+        for worker, datos in self._redis.hgetall(c['workers']).items():
+            workers[worker] = dict(json.loads(datos), hechas=hechas.get(worker, 0))
+        return {'estados': estados, 'workers': workers}
+
+    def iter_registros(self):
+        for terminado in self._terminados():
+            if terminado['estado'] == HECHO and terminado.get('registro'):
+                yield terminado['registro']
+
+    def close(self):
+        self._redis.close()
+
+
+class QueueWorker:
+    """
+    Lado worker de la cola: toma cédulas con lease, mantiene los leases vivos
+    con un heartbeat en segundo plano y confirma cada resultado.
+
+    `cedulas()` es un generador que se puede pasar a `iter_batch` o al motor
+    CDP; termina cuando la cola no tiene cédulas pendientes. `rondas()`
+    entrega esos generadores uno tras otro mientras otros workers tengan
+    cédulas en curso, para consumir la cola con un mismo lote abierto.
+    """
+
+    def __init__(self, cola, worker_id=None, intervalo=None):
+        self.cola = cola
+        self.id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.intervalo = intervalo or max(1.0, cola.visibilidad / 3)
+        self.en_mano = set()
+        self.confirmadas = 0
+        self.descartadas = 0
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def start(self):
+        self._latido()
+        self._hilo = threading.Thread(target=self._run, name="cola-heartbeat", daemon=True)
+        self._hilo.start()
+        return self
+
+    def _latido(self):
+        with self._lock:
+            cedulas = list(self.en_mano)
+        try:
+            self.cola.heartbeat(self.id, cedulas)
+        except Exception as e:
+            logging.warning(f"No se pudo enviar el heartbeat a la cola: {e}")
+
+    def _run(self):
+        while not self._parar.wait(self.intervalo):
+            self._latido()
+
+    def cedulas(self):
+        """
+        Cédulas tomadas de la cola, una por lease.
+
+        Cada paso del generador es un `lease()` bloqueante (transacción SQLite
+        o ida y vuelta a Redis): desde asyncio se pide en un hilo, como hace
+        `AsyncEngine.run`.
+        """
+        while True:
+            tomadas = self.cola.lease(self.id, 1)
+            if not tomadas:
+                return
+            with self._lock:
+                self.en_mano.update(tomadas)
+            yield from tomadas
+
+    def rondas(self):
+        """
+        Generadores de `cedulas()` sucesivos.
+
+        Se pide la siguiente ronda cuando la anterior terminó y se confirmaron
+        sus resultados; si para entonces otros workers siguen con cédulas en
+        curso, se espera y se vuelve a sondear la cola: si alguno se cae, su
+        lease vence y sus cédulas llegan en la ronda siguiente.
+        """
+        while True:
+            yield self.cedulas()
+            if not self.cola.en_curso():
+                return
+            self._parar.wait(min(30.0, self.intervalo))
+
+    def ack(self, result):
+        """Confirma el resultado (Result o BatchResult) de una cédula tomada de la cola."""
+        with self._lock:
+            self.en_mano.discard(result.cedula)
+        if self.cola.ack(result.cedula, self.id, result.exitoso, registro=result.registro, error=result.error):
+            self.confirmadas += 1
+        else:
+            self.descartadas += 1
+            logging.warning(f"El lease de la cédula {result.cedula} venció y se entregó a otro worker; "
+                            f"el resultado de este worker se descarta.")
+
+    def stop(self):
+        """Detiene el heartbeat y devuelve a la cola las cédulas que no se alcanzaron a consultar."""
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        with self._lock:
+            pendientes, self.en_mano = list(self.en_mano), set()
+        for cedula in pendientes:
+            self.cola.release(cedula, self.id)
+
+    def report(self):
+        return (f"Worker {self.id}: {self.confirmadas} resultado(s) confirmados en la cola, "
+                f"{self.descartadas} descartados por lease vencido.")
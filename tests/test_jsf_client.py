@@ -0,0 +1,89 @@
+import os
+
+from consulta_antecedentes.jsf_client import AJAX_HEADERS, VIEWSTATE_FIELD, WebJudicialClient
+from consulta_antecedentes.result_detector import NO_ENCONTRADO, classify_text
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BASE_URL = 'https://antecedentes.policia.gov.co:7005/WebJudicial/'
+
+# ViewState de cada respuesta de las fixtures
+VIEWSTATE_TERMINOS = '-4715261869421863410:-2297374631263457187'
+VIEWSTATE_FORMULARIO = '8154472920634561402:3378046181299151126'
+VIEWSTATE_RESULTADO = '-6627191833870471520:5120867433094771945'
+
+
+def _fixture(nombre):
+    with open(os.path.join(FIXTURES, nombre), encoding='utf-8') as f:
+        return f.read()
+
+
+class Respuesta:
+    def __init__(self, url, text, status_code=200):
+        self.url, self.text, self.status_code = url, text, status_code
+
+
+class SesionGrabada:
+    """Sesión de requests que responde con las fixtures en orden y guarda lo que se envió."""
+
+    def __init__(self, *respuestas):
+        self.respuestas = list(respuestas)
+        self.enviados = []
+
+    def get(self, url, timeout=None):
+        self.enviados.append(('GET', url, None, None))
+        return Respuesta(url, self.respuestas.pop(0))
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.enviados.append(('POST', url, dict(data), headers))
+        return Respuesta(url, self.respuestas.pop(0))
+
+
+def _cliente(*fixtures):
+    sesion = SesionGrabada(*(_fixture(nombre) for nombre in fixtures))
+    return WebJudicialClient(BASE_URL, sesion, ajax=True), sesion
+
+
+def test_pagina_de_terminos():
+    cliente, _ = _cliente('webjudicial_terminos.html')
+    page = cliente.get(BASE_URL)
+    assert cliente.viewstate == VIEWSTATE_TERMINOS
+    form = page.form_with('continuarBtn')
+    assert form['id'] == 'aceptaForm'
+    assert page.form_data(form, 'continuarBtn', {'aceptaOption:0': 'true'}) == {
+        'aceptaForm': 'aceptaForm',
+        'aceptaOption': 'true',
+        'continuarBtn': '',
+        VIEWSTATE_FIELD: VIEWSTATE_TERMINOS,
+    }
+    assert 'Términos de uso' in page.text and 'PrimeFaces' not in page.text
+    assert page.sitekey is None
+
+
+def test_aceptar_terminos_devuelve_el_ultimo_viewstate():
+    cliente, sesion = _cliente('webjudicial_terminos.html', 'webjudicial_parcial_formulario.xml')
+    page = cliente.accept_terms()
+    metodo, url, data, headers = sesion.enviados[1]
+    assert (metodo, url, headers) == ('POST', BASE_URL + 'index.xhtml', AJAX_HEADERS)
+    assert data[VIEWSTATE_FIELD] == VIEWSTATE_TERMINOS
+    assert data['aceptaOption'] == 'true'
+    assert data['javax.faces.source'] == 'continuarBtn' and data['javax.faces.partial.ajax'] == 'true'
+    # La actualización del ViewState manda sobre el campo que trae la vista re-renderizada
+    assert cliente.viewstate == VIEWSTATE_FORMULARIO
+    assert page.sitekey == '6LcsIwQaAAAAAFCsaI-dkR6hgKsZwwJRsmE0tIJH'
+    assert page.form_with('cedulaInput')['action'] == '/WebJudicial/antecedentes.xhtml'
+
+
+def test_consulta_envia_el_viewstate_de_la_respuesta_parcial():
+    cliente, sesion = _cliente(
+        'webjudicial_terminos.html', 'webjudicial_parcial_formulario.xml', 'webjudicial_parcial_resultado.xml',
+    )
+    page = cliente.submit_cedula(cliente.accept_terms(), '1234567890', 'token')
+    metodo, url, data, headers = sesion.enviados[2]
+    assert (metodo, url, headers) == ('POST', BASE_URL + 'antecedentes.xhtml', AJAX_HEADERS)
+    assert data[VIEWSTATE_FIELD] == VIEWSTATE_FORMULARIO
+    assert data['form'] == 'form' and data['j_idt17'] == ''
+    assert data['cedulaInput'] == '1234567890' and data['g-recaptcha-response'] == 'token'
+    # La respuesta sólo trae los fragmentos actualizados y el nuevo ViewState
+    assert cliente.viewstate == VIEWSTATE_RESULTADO
+    assert 'validationFailed' not in page.text
+    assert classify_text(page.text)[0] == NO_ENCONTRADO
@@ -0,0 +1,143 @@
+import time
+
+import pytest
+
+from consulta_antecedentes.result_detector import CAPTCHA_RECHAZADO, ERROR_SITIO, SIN_RESPUESTA
+from consulta_antecedentes.retry_policy import (
+    CAPTCHA, CONFIGURACION, DESCONOCIDO, NAVEGADOR, SITIO_CAIDO, TIMEOUT_PAGINA,
+    CircuitBreaker, ConsultaError, RetryPolicy, classify_failure, error_de_resultado,
+)
+
+
+# Excepciones con los mismos nombres que las de selenium y requests, sin importarlas
+class TimeoutException(Exception):
+    pass
+
+
+class WebDriverException(Exception):
+    pass
+
+
+class NoSuchWindowException(WebDriverException):
+    pass
+
+
+class ConnectionError(OSError):
+    pass
+
+
+@pytest.mark.parametrize('exc, clase', [
+    (ConsultaError(SITIO_CAIDO, "caído"), SITIO_CAIDO),
+    (TimeoutException("preloader"), TIMEOUT_PAGINA),
+    (NoSuchWindowException("ventana cerrada"), NAVEGADOR),
+    (ConnectionError("sin conexión"), SITIO_CAIDO),
+    (Exception("No se pudo resolver el reCAPTCHA"), CAPTCHA),
+    (Exception("API key TU_API_KEY de ejemplo"), CONFIGURACION),
+    (Exception("No hay proveedores de CAPTCHA configurados"), CONFIGURACION),
+    (ValueError("otra cosa"), DESCONOCIDO),
+])
+def test_classify_failure(exc, clase):
+    assert classify_failure(exc) == clase
+
+
+def test_error_de_resultado():
+    assert classify_failure(error_de_resultado(CAPTCHA_RECHAZADO)) == CAPTCHA
+    assert classify_failure(error_de_resultado(ERROR_SITIO)) == SITIO_CAIDO
+    assert classify_failure(error_de_resultado(SIN_RESPUESTA)) == TIMEOUT_PAGINA
+
+
+def test_max_retries_por_defecto(monkeypatch):
+    monkeypatch.delenv('MAX_RETRIES', raising=False)
+    monkeypatch.delenv('RETRY_PRESUPUESTOS', raising=False)
+    estado = RetryPolicy.from_env().start()
+    assert estado.intentos_max == 2
+    assert estado.siguiente(CAPTCHA) is not None
+    assert estado.siguiente(CAPTCHA) is None
+
+
+def test_presupuesto_por_clase():
+    estado = RetryPolicy(max_retries=10, presupuestos={CAPTCHA: 2, SITIO_CAIDO: 1}).start()
+    assert estado.siguiente(SITIO_CAIDO) is not None
+    assert estado.siguiente(SITIO_CAIDO) is None
+    # Agotar una clase no consume el presupuesto de las demás
+    assert estado.siguiente(CAPTCHA) is not None
+    assert estado.siguiente(CAPTCHA) is not None
+    assert estado.siguiente(CAPTCHA) is None
+    assert estado.reintentos == 3
+
+
+def test_configuracion_no_se_reintenta():
+    assert RetryPolicy(max_retries=5).start().siguiente(CONFIGURACION) is None
+
+
+def test_max_retries_limita_el_total():
+    estado = RetryPolicy(max_retries=2).start()
+    assert estado.siguiente(CAPTCHA) is not None
+    assert estado.siguiente(NAVEGADOR) is not None
+    assert estado.siguiente(TIMEOUT_PAGINA) is None
+
+
+def test_espera_con_backoff_y_jitter():
+    policy = RetryPolicy(esperas={CAPTCHA: 2.0}, espera_max=5.0)
+    for _ in range(20):
+        assert 1.0 <= policy.espera(CAPTCHA, 1) <= 2.0
+        assert 2.0 <= policy.espera(CAPTCHA, 2) <= 4.0
+        assert 2.5 <= policy.espera(CAPTCHA, 5) <= 5.0
+
+
+def _circuito_abierto(pausa=0.05):
+    breaker = CircuitBreaker(umbral=0.5, ventana=4, min_muestras=2, pausa=pausa)
+    breaker.record(SITIO_CAIDO)
+    breaker.record(SITIO_CAIDO)
+    assert breaker.estado == CircuitBreaker.ABIERTO
+    return breaker
+
+
+def test_circuito_ignora_fallos_ajenos_al_sitio():
+    breaker = CircuitBreaker(umbral=0.5, ventana=4, min_muestras=2)
+    for _ in range(4):
+        breaker.record(NAVEGADOR)
+        breaker.record(CAPTCHA)
+    assert breaker.estado == CircuitBreaker.CERRADO
+    breaker.record(TIMEOUT_PAGINA)
+    breaker.record(None)
+    assert breaker.estado == CircuitBreaker.ABIERTO
+
+
+def test_prueba_exitosa_cierra_el_circuito():
+    breaker = _circuito_abierto()
+    time.sleep(0.06)
+    prueba = breaker.wait()
+    assert prueba is not None and breaker.estado == CircuitBreaker.PRUEBA
+    breaker.record(prueba=prueba)
+    assert breaker.estado == CircuitBreaker.CERRADO
+    assert breaker.wait() is None
+
+
+def test_resultados_ajenos_a_la_prueba_se_ignoran():
+    breaker = _circuito_abierto()
+    time.sleep(0.06)
+    prueba = breaker.wait()
+    # Intentos que empezaron antes de abrirse el circuito
+    breaker.record(None)
+    breaker.record(SITIO_CAIDO, None)
+    breaker.record(None, prueba + 1)
+    assert breaker.estado == CircuitBreaker.PRUEBA
+    breaker.record(SITIO_CAIDO, prueba)
+    assert breaker.estado == CircuitBreaker.ABIERTO
+    assert breaker.pausa == pytest.approx(0.1)
+
+
+def test_prueba_con_fallo_ajeno_al_sitio_envia_otra():
+    breaker = _circuito_abierto()
+    time.sleep(0.06)
+    prueba = breaker.wait()
+    breaker.record(NAVEGADOR, prueba)
+    assert breaker.estado == CircuitBreaker.PRUEBA
+    otra = breaker.wait()
+    assert otra is not None and otra != prueba
+    # El resultado tardío de la prueba anterior ya no decide
+    breaker.record(None, prueba)
+    assert breaker.estado == CircuitBreaker.PRUEBA
+    breaker.record(prueba=otra)
+    assert breaker.estado == CircuitBreaker.CERRADO
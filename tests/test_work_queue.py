@@ -0,0 +1,123 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from consulta_antecedentes.work_queue import EN_CURSO, FALLIDO, HECHO, PENDIENTE, QueueWorker, RedisQueue, SQLiteQueue
+
+VISIBILIDAD = 0.2
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def cola(request, tmp_path):
+    if request.param == 'sqlite':
+        cola = SQLiteQueue(str(tmp_path / 'cola.sqlite3'), visibilidad=VISIBILIDAD, max_entregas=3)
+    else:
+        # RedisQueue se prueba sólo si hay un servidor: COLA_REDIS_PRUEBAS=redis://localhost:6379/15
+        url = os.getenv('COLA_REDIS_PRUEBAS')
+        if not url:
+            pytest.skip("COLA_REDIS_PRUEBAS no está definida")
+        pytest.importorskip('redis')
+        cola = RedisQueue(url, nombre=f"pruebas-{uuid.uuid4().hex}", visibilidad=VISIBILIDAD, max_entregas=3)
+    yield cola
+    if isinstance(cola, RedisQueue):
+        cola._redis.delete(*cola.claves.values())
+    cola.close()
+
+
+def _vencer():
+    time.sleep(VISIBILIDAD * 1.5)
+
+
+def test_lease_no_entrega_dos_veces(cola):
+    assert cola.enqueue(['1', '2', '3']) == 3
+    assert cola.enqueue(['1', '2']) == 0
+    a = cola.lease('a', 2)
+    b = cola.lease('b', 2)
+    assert len(a) == 2 and b == [c for c in ['1', '2', '3'] if c not in a]
+    assert cola.lease('c', 1) == []
+    assert cola.en_curso() == 3
+
+
+def test_lease_vencido_se_entrega_de_nuevo(cola):
+    cola.enqueue(['1'])
+    assert cola.lease('a') == ['1']
+    assert cola.lease('b') == []
+    _vencer()
+    assert cola.lease('b') == ['1']
+
+
+def test_heartbeat_mantiene_el_lease(cola):
+    cola.enqueue(['1'])
+    cola.lease('a')
+    for _ in range(3):
+        time.sleep(VISIBILIDAD / 2)
+        assert cola.heartbeat('a', ['1']) == 1
+    assert cola.lease('b') == []
+    # Un heartbeat de otro worker no renueva un lease ajeno
+    assert cola.heartbeat('b', ['1']) == 0
+
+
+def test_ack_de_un_dueno_vencido_se_rechaza(cola):
+    cola.enqueue(['1'])
+    cola.lease('a')
+    _vencer()
+    assert cola.lease('b') == ['1']
+    assert cola.ack('1', 'a', True) is False
+    assert cola.heartbeat('a', ['1']) == 0
+    assert cola.ack('1', 'b', True, registro={'cedula': '1', 'resultado': 'no_encontrado'}) is True
+    # No hay doble confirmación
+    assert cola.ack('1', 'b', True) is False
+    estados = cola.stats()['estados']
+    assert estados[HECHO] == 1 and estados[EN_CURSO] == 0
+    assert list(cola.iter_registros()) == [{'cedula': '1', 'resultado': 'no_encontrado'}]
+
+
+def test_max_entregas_marca_la_cedula_como_fallida(cola):
+    cola.enqueue(['1'])
+    for worker in ('a', 'b', 'c'):
+        assert cola.lease(worker) == ['1']
+        _vencer()
+    assert cola.lease('d') == []
+    estados = cola.stats()['estados']
+    assert estados[FALLIDO] == 1 and estados[EN_CURSO] == 0
+
+
+def test_release_devuelve_la_cedula(cola):
+    cola.enqueue(['1'])
+    cola.lease('a')
+    cola.release('1', 'b')
+    assert cola.lease('b') == []
+    cola.release('1', 'a')
+    assert cola.lease('b') == ['1']
+
+
+def test_cedula_terminada_se_puede_encolar_de_nuevo(cola):
+    cola.enqueue(['1', '2'])
+    for cedula in cola.lease('a', 2):
+        cola.ack(cedula, 'a', cedula == '1', error=None if cedula == '1' else "fallo")
+    assert cola.stats()['estados'][PENDIENTE] == 0
+    # Las dos vuelven a quedar pendientes, con sus entregas en cero
+    assert cola.enqueue(['1', '2', '3']) == 3
+    assert sorted(cola.lease('b', 3)) == ['1', '2', '3']
+    assert cola.enqueue(['1']) == 0
+    assert cola.ack('1', 'b', True) is True
+
+
+def test_queue_worker_confirma_y_descarta(cola):
+    cola.enqueue(['1', '2'])
+    worker = QueueWorker(cola, worker_id='w', intervalo=60)
+    cedulas = list(worker.cedulas())
+    assert sorted(cedulas) == ['1', '2'] and worker.en_mano == {'1', '2'}
+
+    class Resultado:
+        def __init__(self, cedula):
+            self.cedula, self.exitoso, self.registro, self.error = cedula, True, None, None
+
+    worker.ack(Resultado('1'))
+    _vencer()
+    cola.lease('otro')
+    worker.ack(Resultado('2'))
+    assert (worker.confirmadas, worker.descartadas) == (1, 1)
+    assert worker.en_mano == set()